@@ -0,0 +1,341 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from threading import Lock
+import numpy as np
+import pandas as pd
+import soundfile
+from lib.logger import Logger, SilentLogger
+from lib.clip_handler import ClipsHandler
+from lib.feature_store import FeatureStore
+from lib.knn_threading import KNearestNeighbours
+from lib.utils import calculate_information_gains
+
+# etykiety probek syntetycznych (obslugiwane przez map_label)
+_label_names_lst = ["teens", "twenties", "thirties", "fourties", "fifties", "nineties"]
+
+
+def check_classes_cnt(classes_cnt):
+    """
+    Funkcja sprawdzajaca, czy dla ilosci klas wystarczy etykiet probek syntetycznych
+    (przyrost informacji wymaga etykiet obslugiwanych przez map_label)
+    """
+    if not 1 <= classes_cnt <= len(_label_names_lst):
+        raise ValueError(
+            f"Ilosc klas probek syntetycznych musi byc z zakresu 1-{len(_label_names_lst)} "
+            f"(podano {classes_cnt})"
+        )
+
+
+def get_synthetic_feature_store(samples_cnt, features_cnt, classes_cnt, seed=0):
+    """
+    Funkcja tworzaca zbior probek o losowych wektorach cech (srodek rozkladu zalezy od klasy)
+    ze znormalizowanymi wektorami cech (classes_cnt co najwyzej 6)
+    """
+    check_classes_cnt(classes_cnt)
+    rng = np.random.default_rng(seed)
+    label_codes_arr = rng.integers(0, classes_cnt, samples_cnt)
+    features_arr = rng.normal(size=(samples_cnt, features_cnt)).astype(np.float32)
+    features_arr += 0.3 * label_codes_arr[:, None]
+    feature_store = FeatureStore.from_lists(
+        [f"synthetic_{i}.wav" for i in range(samples_cnt)],
+        [_label_names_lst[code] for code in label_codes_arr],
+        list(features_arr),
+    )
+    feature_store.normalize(*feature_store.get_min_max())
+    return feature_store
+
+
+def write_synthetic_clips(clips_path, clips_cnt, classes_cnt, seed=0, sr=16000):
+    """
+    Funkcja zapisujaca nagrania syntetyczne (sinusoida o czestotliwosci zaleznej od klasy z szumem,
+    otoczona cisza) oraz plik validated.tsv. Zwraca sciezke pliku validated.tsv
+    """
+    check_classes_cnt(classes_cnt)
+    rng = np.random.default_rng(seed)
+    os.makedirs(clips_path, exist_ok=True)
+    rows_lst = []
+    for i in range(clips_cnt):
+        label_code = i % classes_cnt
+        time_arr = np.arange(int(sr * rng.uniform(1.0, 2.0))) / sr
+        recording = 0.3 * np.sin(2 * np.pi * (150 + 50 * label_code) * time_arr)
+        recording += 0.05 * rng.normal(size=len(time_arr))
+        silence = np.zeros(sr // 4)
+        clip_name = f"synthetic_{i}.wav"
+        soundfile.write(
+            os.path.join(clips_path, clip_name),
+            np.concatenate([silence, recording, silence]).astype(np.float32),
+            sr,
+        )
+        rows_lst.append({"path": clip_name, "age": _label_names_lst[label_code]})
+
+    clip_data_csv = os.path.join(os.path.dirname(clips_path), "validated.tsv")
+    pd.DataFrame(rows_lst).to_csv(clip_data_csv, sep="\t", index=False)
+    return clip_data_csv
+
+
+class KNNBenchmark:
+    """
+    Mikrotesty wydajnosci najczesciej wykonywanych funkcji na danych syntetycznych.
+    Dla kazdego rozmiaru danych mierzony jest czas (mediana z repeats powtorzen), przepustowosc
+    oraz szczytowe zuzycie pamieci (tracemalloc - w osobnym przebiegu, bo spowalnia alokacje).
+    Wyniki zapisywane sa do pliku JSON i moga byc porownane z wczesniej zapisanymi wynikami
+    (baseline)
+    """
+
+    def __init__(
+        self,
+        samples_cnt_lst=(1000, 5000, 20000),
+        features_cnt=48,
+        classes_cnt=5,
+        repeats=3,
+        clips_cnt=20,
+        single_queries_cnt=50,
+    ):
+        check_classes_cnt(classes_cnt)
+        self.logger = Logger("knn_benchmark_")
+        self.samples_cnt_lst = samples_cnt_lst
+        self.features_cnt = features_cnt
+        self.classes_cnt = classes_cnt
+        self.repeats = repeats
+        self.clips_cnt = clips_cnt
+        self.single_queries_cnt = single_queries_cnt
+        self.results_lst = []
+
+    def measure(self, name, params_dict, items_cnt, func, setup=None):
+        """
+        Metoda mierzaca czas wykonania func (mediana z repeats powtorzen, setup wykonywany
+        przed kazdym powtorzeniem poza pomiarem), przepustowosc (items_cnt / czas)
+        oraz szczytowe zuzycie pamieci. Pamiec mierzona jest w dodatkowym przebiegu,
+        bo tracemalloc spowalnia kazda alokacje i zawyzalby czasy
+        """
+        times_lst = []
+        for _ in range(self.repeats):
+            if setup is not None:
+                setup()
+            start_time = time.perf_counter()
+            func()
+            times_lst.append(time.perf_counter() - start_time)
+
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        seconds = float(np.median(times_lst))
+        self.results_lst.append(
+            {
+                "name": name,
+                "params": params_dict,
+                "seconds": seconds,
+                "items_per_s": items_cnt / seconds if seconds > 0 else None,
+                "peak_mb": round(peak_bytes / 1024 / 1024, 3),
+            }
+        )
+        self.logger.save_log(
+            f"{name} {params_dict}: {round(seconds, 4)}s | {round(items_cnt / seconds, 1) if seconds > 0 else '-'} /s | {self.results_lst[-1]['peak_mb']} MB"
+        )
+
+    def run_features_benchmarks(self, samples_cnt):
+        """
+        Metoda mierzaca klasyfikacje, przyrost informacji i normalizacje dla samples_cnt probek
+        """
+        params_dict = {
+            "samples_cnt": samples_cnt,
+            "features_cnt": self.features_cnt,
+            "classes_cnt": self.classes_cnt,
+        }
+        learn_store = get_synthetic_feature_store(
+            samples_cnt, self.features_cnt, self.classes_cnt, seed=0
+        )
+        test_store = get_synthetic_feature_store(
+            max(1, samples_cnt // 4), self.features_cnt, self.classes_cnt, seed=1
+        )
+
+        # przyrost informacji
+        self.measure(
+            "calculate_information_gains",
+            params_dict,
+            samples_cnt,
+            lambda: calculate_information_gains(learn_store),
+        )
+
+        # normalizacja wektorow cech zbioru uczacego i testowego
+        clip_handler = ClipsHandler.__new__(ClipsHandler)
+        clip_handler.logger = SilentLogger()
+        clip_handler.profiler = None
+
+        def set_stores():
+            clip_handler.mfcc_learn_feature_store = learn_store
+            clip_handler.mfcc_test_feature_store = test_store
+
+        self.measure(
+            "normalize_mfcc",
+            params_dict,
+            samples_cnt + len(test_store),
+            clip_handler.normalize_mfcc,
+            setup=set_stores,
+        )
+
+        # klasyfikacja pojedynczych probek
+        learn_dict = learn_store.to_dict()
+        test_samples_lst = list(test_store.to_dict().values())[
+            : self.single_queries_cnt
+        ]
+        self.measure(
+            "get_knn_label",
+            params_dict,
+            len(test_samples_lst),
+            lambda: [
+                KNearestNeighbours.get_knn_label(test_sample, learn_dict, 3, True)
+                for test_sample in test_samples_lst
+            ],
+        )
+
+        # klasyfikacja blokowa wszystkich probek testowych
+        knn_model = KNearestNeighbours(learn_store, test_store, SilentLogger())
+        self.measure(
+            "get_all_test_points_labels",
+            params_dict,
+            len(test_store),
+            lambda: knn_model.get_all_test_points_labels(k_neighbours=3),
+        )
+
+    def run_recording_benchmarks(self):
+        """
+        Metoda mierzaca wyznaczanie wektorow cech nagran syntetycznych
+        """
+        params_dict = {"clips_cnt": self.clips_cnt, "number_of_features": 20}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            clips_path = os.path.join(tmp_dir, "clips")
+            clip_data_csv = write_synthetic_clips(
+                clips_path, self.clips_cnt, self.classes_cnt
+            )
+            clip_data_lst = pd.read_csv(clip_data_csv, sep="\t").values.tolist()
+
+            # obiekt bez wyznaczania cech przy tworzeniu (jak w normalize_mfcc), bez magazynu
+            # cech i nagran - mierzone jest jedynie wyznaczanie cech nagran z listy
+            clip_handler = ClipsHandler.__new__(ClipsHandler)
+            clip_handler.logger = SilentLogger()
+            clip_handler.locker = Lock()
+            clip_handler.profiler = None
+            clip_handler.feature_cache = None
+            clip_handler.pcm_store = None
+            clip_handler.top_db = 40
+
+            # puste zbiory przed kazdym powtorzeniem - probki dopisywane sa do zbioru testowego
+            def set_stores():
+                clip_handler.mfcc_learn_feature_store = FeatureStore.from_lists(
+                    [], [], []
+                )
+                clip_handler.mfcc_test_feature_store = FeatureStore.from_lists(
+                    [], [], []
+                )
+
+            self.measure(
+                "get_recordings_mfcc",
+                params_dict,
+                len(clip_data_lst),
+                lambda: clip_handler.get_recordings_mfcc(clips_path, clip_data_lst, 20),
+                setup=set_stores,
+            )
+
+    def run(self):
+        self.logger.save_log("")
+        self.logger.save_log("MIKROTESTY WYDAJNOSCI")
+        for samples_cnt in self.samples_cnt_lst:
+            self.run_features_benchmarks(samples_cnt)
+        if self.clips_cnt:
+            self.run_recording_benchmarks()
+        return self.results_lst
+
+    def save_results(self, output_path):
+        """
+        Metoda zapisujaca wyniki do pliku JSON
+        """
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "platform": platform.platform(),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "results": self.results_lst,
+                },
+                f,
+                indent=2,
+            )
+        self.logger.save_log(f"Zapisano wyniki: {output_path}")
+
+    def compare_with_baseline(self, baseline_path, tolerance=0.2):
+        """
+        Metoda porownujaca wyniki z wynikami zapisanymi w pliku baseline_path. Pomiar jest
+        oznaczany jako regresja, gdy czas wzrosl o wiecej niz tolerance (ulamek czasu bazowego).
+        Zwraca liste nazw pomiarow z regresja
+        """
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline_results_dict = {
+                (result["name"], json.dumps(result["params"], sort_keys=True)): result
+                for result in json.load(f)["results"]
+            }
+
+        comparison_dict = {}
+        regressions_lst = []
+        for result in self.results_lst:
+            params_key = json.dumps(result["params"], sort_keys=True)
+            baseline_result = baseline_results_dict.get((result["name"], params_key))
+            if baseline_result is None:
+                continue
+            ratio = result["seconds"] / baseline_result["seconds"]
+            regression = ratio > 1 + tolerance
+            if regression:
+                regressions_lst.append(f"{result['name']} {params_key}")
+            comparison_dict[f"{result['name']} {params_key}"] = {
+                "bazowy [s]": round(baseline_result["seconds"], 4),
+                "obecny [s]": round(result["seconds"], 4),
+                "stosunek": round(ratio, 3),
+                "regresja": "TAK" if regression else "",
+            }
+
+        self.logger.save_log("")
+        self.logger.save_log(
+            "Porownanie z wynikami bazowymi\n"
+            + pd.DataFrame(comparison_dict).transpose().to_string()
+        )
+        self.logger.save_log(f"Ilosc regresji: {len(regressions_lst)}")
+        return regressions_lst
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Mikrotesty wydajnosci na danych syntetycznych"
+    )
+    parser.add_argument("--sizes", default="1000,5000,20000")
+    parser.add_argument("--features", type=int, default=48)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--clips", type=int, default=20)
+    parser.add_argument("--output", default="knn_benchmark_results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    benchmark = KNNBenchmark(
+        samples_cnt_lst=[int(size) for size in args.sizes.split(",")],
+        features_cnt=args.features,
+        classes_cnt=args.classes,
+        repeats=args.repeats,
+        clips_cnt=args.clips,
+    )
+    benchmark.run()
+    benchmark.save_results(args.output)
+    if args.baseline:
+        regressions_lst = benchmark.compare_with_baseline(args.baseline, args.tolerance)
+        raise SystemExit(1 if regressions_lst else 0)
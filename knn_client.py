@@ -0,0 +1,32 @@
+import argparse
+import json
+import librosa
+from lib.classification_client import ClassificationClient
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Klient serwera klasyfikacji (knn_server.py)"
+    )
+    parser.add_argument("clip_paths", nargs="*")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None)
+    # --send-audio - nagrania dekodowane po stronie klienta i wysylane jako probki float32
+    parser.add_argument("--send-audio", action="store_true")
+    parser.add_argument("--stats", action="store_true")
+    args = parser.parse_args()
+
+    client = ClassificationClient(args.host, args.port, unix_socket=args.unix_socket)
+    if args.send_audio:
+        for clip_path in args.clip_paths:
+            recording, recording_sr = librosa.load(clip_path, sr=None)
+            print(f"{clip_path}: {client.classify_recording(recording, recording_sr)}")
+    elif args.clip_paths:
+        labels_lst, errors_lst = client.classify_paths(
+            args.clip_paths, return_errors=True
+        )
+        for clip_path, label, error in zip(args.clip_paths, labels_lst, errors_lst):
+            print(f"{clip_path}: {label if error is None else 'BLAD - ' + error}")
+    if args.stats:
+        print(json.dumps(client.get_stats(), indent=4))
+    client.close()
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import glob
+import json
+import os
+import time
+import numpy as np
+from lib.classification_client import ClassificationClient
+
+
+def run_client(client_kwargs, clip_paths_lst, requests_cnt, offset):
+    """
+    Funkcja watku klienta wysylajacego kolejno requests_cnt zapytan (po jednym nagraniu).
+    Zwraca liste czasow odpowiedzi w sekundach oraz ilosc bledow
+    """
+    client = ClassificationClient(**client_kwargs)
+    latencies_lst = []
+    errors_cnt = 0
+    for i in range(requests_cnt):
+        start_time = time.perf_counter()
+        try:
+            client.classify_path(clip_paths_lst[(offset + i) % len(clip_paths_lst)])
+        except Exception:
+            errors_cnt += 1
+            continue
+        latencies_lst.append(time.perf_counter() - start_time)
+    client.close()
+    return latencies_lst, errors_cnt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generator obciazenia serwera klasyfikacji - czasy odpowiedzi p50/p99"
+    )
+    parser.add_argument("clips_path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    clip_paths_lst = sorted(
+        path
+        for path in glob.glob(os.path.join(os.path.abspath(args.clips_path), "*"))
+        if os.path.isfile(path)
+    )
+    client_kwargs = {
+        "host": args.host,
+        "port": args.port,
+        "unix_socket": args.unix_socket,
+    }
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results_lst = list(
+            executor.map(
+                lambda client_idx: run_client(
+                    client_kwargs,
+                    clip_paths_lst,
+                    args.requests,
+                    client_idx * args.requests,
+                ),
+                range(args.clients),
+            )
+        )
+    elapsed = time.perf_counter() - start_time
+
+    latencies_arr = np.concatenate([latencies for latencies, _ in results_lst]) * 1000
+    errors_cnt = sum(errors for _, errors in results_lst)
+    print(
+        f"Klienci: {args.clients}, zapytania: {len(latencies_arr)}, bledy: {errors_cnt}"
+    )
+    print(f"Przepustowosc: {round(len(latencies_arr) / elapsed, 2)} zapytan/s")
+    if len(latencies_arr):
+        print(
+            f"Czas odpowiedzi: p50 {round(float(np.percentile(latencies_arr, 50)), 2)} ms, "
+            f"p99 {round(float(np.percentile(latencies_arr, 99)), 2)} ms, "
+            f"max {round(float(latencies_arr.max()), 2)} ms"
+        )
+
+    client = ClassificationClient(**client_kwargs)
+    print("Statystyki serwera: " + json.dumps(client.get_stats(), indent=4))
+    client.close()
@@ -0,0 +1,47 @@
+import argparse
+from lib.classification_server import (
+    MicroBatchClassifier,
+    create_classification_server,
+)
+from lib.knn_threading import KNearestNeighbours
+from lib.logger import Logger
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serwer klasyfikacji nagran modelem zapisanym przez save_model"
+    )
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--extraction-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logger = Logger(file_prefix="knn_server_log_", buffered=True)
+    knn_model = KNearestNeighbours.load_model(args.model, logger)
+    classifier = MicroBatchClassifier(
+        knn_model,
+        k_neighbours=args.k,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        extraction_workers_cnt=args.extraction_workers,
+    )
+    server = create_classification_server(
+        classifier, host=args.host, port=args.port, unix_socket=args.unix_socket
+    )
+    logger.save_log(
+        f"Serwer klasyfikacji: "
+        f"{args.unix_socket or f'http://{args.host}:{args.port}'} "
+        f"(paczki do {args.max_batch_size} zapytan, "
+        f"oczekiwanie do {args.max_wait_ms} ms)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.save_log(f"Statystyki serwera: {classifier.get_stats()}")
@@ -4,7 +4,8 @@ import os
 import pandas as pd
 from lib.logger import Logger
 from lib.clip_handler import ClipsHandler
-from lib.knn_threading import KNearestNeighbours
+from lib.cross_validation import CrossValidator
+from lib.grid_runner import GridRunner
 
 _test_path = os.path.join("D:", "msi_data", "cv-corpus-19.0-2024-09-13", "pl")
 _test_clip_path = os.path.join(_test_path, "clips")
@@ -38,7 +39,7 @@ all_func_args_possibilities_lst = [
 
 class KNNClassificatorFunctionTester:
     def __init__(self):
-        self.logger = Logger("test_cases_knn_")
+        self.logger = Logger("test_cases_knn_", buffered=True)
 
     def run_test(self):
         test_cases_summary_dict = {str(i): {} for i in range(1, 6)}
@@ -46,47 +47,45 @@ class KNNClassificatorFunctionTester:
 
         test_case = user_input(200, 80, 30, 20, 50)
 
-        for j in range(5):
-            clip_handler = ClipsHandler(
-                self.logger,
-                test_case,
-                os.path.join(_test_path, "validated.tsv"),
-                _test_clip_path,
+        # jedno wyznaczenie cech wszystkich probek (uczacych i testowych) - 5 losowych podzialow
+        # 80/20 oraz walidacja krzyzowa z jednej macierzy odleglosci dla kazdej konfiguracji
+        clip_handler = ClipsHandler(
+            self.logger,
+            test_case,
+            os.path.join(_test_path, "validated.tsv"),
+            _test_clip_path,
+        )
+        cross_validator = CrossValidator(
+            clip_handler.mfcc_learn_feature_store.concatenate(
+                clip_handler.mfcc_test_feature_store
+            ),
+            self.logger,
+        )
+        for func_kwargs in all_func_args_possibilities_lst:
+            test_type = ", ".join(f"{key}: {value}" for key, value in func_kwargs.items())
+            self.logger.save_log(f"")
+            self.logger.save_log(f"Ilosc sasiadow: 1-5 | {test_type}")
+            split_results_dict = cross_validator.holdout_validate(
+                test_case.percent_to_learn,
+                repeats_cnt=5,
+                k_neighbours_lst=range(1, 6),
+                **func_kwargs,
             )
-            knn_model = KNearestNeighbours(
-                clip_handler.mfcc_learn_clip_data_dict,
-                clip_handler.mfcc_test_clip_data_dict,
-                self.logger,
+            cross_validator.cross_validate(
+                folds_cnt=5, k_neighbours_lst=range(1, 6), **func_kwargs
             )
-            for n_neighbour in range(1, 6):
-                self.logger.save_log(f"")
-                self.logger.save_log(f"Ilosc sasiadow: {n_neighbour} | Proba {j}")
-                for func_kwargs in all_func_args_possibilities_lst:
-                    test_type, percent_guessed, guesses = (
-                        knn_model.get_all_test_points_labels(
-                            k_neighbours=n_neighbour, **func_kwargs
-                        )
-                    )
-                    if (
-                        test_type
-                        not in test_cases_summary_dict[str(n_neighbour)].keys()
-                    ):
-                        test_cases_summary_dict[str(n_neighbour)][test_type] = [
-                            percent_guessed
-                        ]
-                        test_cases_guesses_summary_dict[str(n_neighbour)][test_type] = [
-                            guesses
-                        ]
-                    else:
-                        test_cases_summary_dict[str(n_neighbour)][test_type].append(
-                            percent_guessed
-                        )
-                        test_cases_guesses_summary_dict[str(n_neighbour)][
-                            test_type
-                        ].append(guesses)
+            for n_neighbour, results_lst in split_results_dict.items():
+                test_cases_summary_dict[str(n_neighbour)][test_type] = [
+                    percent_guessed for percent_guessed, _ in results_lst
+                ]
+                test_cases_guesses_summary_dict[str(n_neighbour)][test_type] = [
+                    guesses for _, guesses in results_lst
+                ]
 
         for i in range(1, 6):
             summary_df = pd.DataFrame(test_cases_summary_dict[str(i)]).transpose()
+            summary_df["srednia"] = summary_df.mean(axis=1).round(2)
+            summary_df["odchylenie"] = summary_df.iloc[:, :-1].std(axis=1).round(2)
             self.logger.save_log(f"")
             self.logger.save_log(
                 f"Ilosc sasiadow {i} podsumowanie procentowe:\n"
@@ -103,53 +102,42 @@ class KNNClassificatorFunctionTester:
 
 
 class KNNClassificatorMFCCValuesTester:
-    def __init__(self):
-        self.logger = Logger("test_cases_knn_")
+    def __init__(self, workers_cnt=1):
+        self.logger = Logger("test_cases_knn_", buffered=True)
+
+        # przeglad siatki wznawiany po przerwaniu (wyniki w bazie SQLite obok danych)
+        self.grid_runner = GridRunner(
+            self.logger,
+            os.path.join(_test_path, "valid_not_empty_age.csv"),
+            _test_clip_path,
+            os.path.join(_test_path, "knn_grid_results.sqlite"),
+            workers_cnt=workers_cnt,
+        )
 
     def run_test(self):
-        test_cases_summary_dict = {}
-
         number_of_examples = [100, 500, 1000, 2000]
         percent_to_learn = [70, 80, 90]
         number_of_features = [12, 20, 30]
         frame_duration_ms = [i * 5 for i in range(4, 7, 1)]
         hop_duration = [25 * i for i in range(1, 4)]
 
-        all_test_cases_lst = list(
-            user_input(*test_case)
-            for test_case in product(
-                number_of_examples,
-                percent_to_learn,
-                number_of_features,
-                frame_duration_ms,
-                hop_duration,
-            )
+        # jedno losowanie probek dla wszystkich konfiguracji ekstrakcji i jedno wyznaczenie
+        # cech wszystkich konfiguracji dla kazdego losowania
+        results_df = self.grid_runner.run(
+            number_of_examples,
+            percent_to_learn,
+            list(product(number_of_features, frame_duration_ms, hop_duration)),
+            [{"normalized_mfcc": True, "information_gain_as_weight": True}],
+            k_neighbours_lst=[2],
         )
 
-        for test_case in all_test_cases_lst:
-            clip_handler = ClipsHandler(
-                self.logger,
-                test_case,
-                os.path.join(_test_path, "valid_not_empty_age.csv"),
-                _test_clip_path,
-            )
-            knn_model = KNearestNeighbours(
-                clip_handler.mfcc_learn_clip_data_dict,
-                clip_handler.mfcc_test_clip_data_dict,
-                self.logger,
-            )
-
-            test_type, percent_guessed, guesses = knn_model.get_all_test_points_labels(
-                k_neighbours=2,
-                normalized_mfcc=True,
-                information_gain_as_weight=True,
-            )
-
-            test_case_message = f"Ilosc przykladow: {test_case.number_of_examples}, procent uczacy: {test_case.percent_to_learn}, ilosc cehc: {test_case.number_of_features}, dlugosc ramki: {test_case.frame_duration_ms}, stopien przeplotu: {test_case.hop_duration}"
+        test_cases_summary_dict = {}
+        for result in results_df.itertuples():
+            test_case_message = f"Ilosc przykladow: {result.number_of_examples}, procent uczacy: {result.percent_to_learn}, ilosc cehc: {result.number_of_features}, dlugosc ramki: {result.frame_duration_ms}, stopien przeplotu: {result.hop_duration}"
 
             test_cases_summary_dict[test_case_message] = {
-                "Poprawne przewidywania procentowe": percent_guessed,
-                "Poprawne przewidywania": guesses,
+                "Poprawne przewidywania procentowe": result.percent_guessed,
+                "Poprawne przewidywania": result.guesses,
             }
 
         self.logger.save_log(
@@ -0,0 +1,93 @@
+from http.client import HTTPConnection
+import json
+import socket
+import numpy as np
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """
+    Polaczenie HTTP przez gniazdo Unix
+    """
+
+    def __init__(self, unix_socket, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_socket = unix_socket
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+
+class ClassificationClient:
+    """
+    Klient serwera klasyfikacji (knn_server.py) przez TCP lub gniazdo Unix (unix_socket).
+    Polaczenie jest utrzymywane pomiedzy zapytaniami - jeden klient na watek
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, unix_socket=None, timeout=60.0):
+        if unix_socket is not None:
+            self.connection = UnixHTTPConnection(unix_socket, timeout=timeout)
+        else:
+            self.connection = HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, path, body=None, headers=None):
+        self.connection.request(method, path, body=body, headers=headers or {})
+        response = self.connection.getresponse()
+        response_dict = json.loads(response.read())
+        # odpowiedz z bledami kolejnych nagran obslugiwana jest przez wywolujacego
+        if response.status != 200 and "errors" not in response_dict:
+            raise RuntimeError(
+                f"Blad serwera ({response.status}): {response_dict.get('error')}"
+            )
+        return response_dict
+
+    def classify_paths(self, clip_paths_lst, return_errors=False):
+        """
+        Metoda zwracajaca przewidziane etykiety nagran (sciezki dostepne dla serwera) - None
+        dla nagran, ktorych nie udalo sie sklasyfikowac. Dla return_errors=True zwraca takze
+        liste opisow bledow (None dla nagran bez bledu)
+        """
+        response_dict = self._request(
+            "POST",
+            "/classify",
+            body=json.dumps({"clip_paths": list(clip_paths_lst)}),
+            headers={"Content-Type": "application/json"},
+        )
+        if return_errors:
+            return response_dict["labels"], response_dict["errors"]
+        return response_dict["labels"]
+
+    def classify_path(self, clip_path):
+        """
+        Metoda zwracajaca przewidziana etykiete nagrania (sciezka dostepna dla serwera)
+        """
+        return self._get_label(*self.classify_paths([clip_path], return_errors=True))
+
+    def classify_recording(self, recording, recording_sr):
+        """
+        Metoda zwracajaca przewidziana etykiete zdekodowanego nagrania (probki mono)
+        """
+        response_dict = self._request(
+            "POST",
+            f"/classify?sr={int(recording_sr)}",
+            body=np.ascontiguousarray(recording, dtype="<f4").tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        return self._get_label(response_dict["labels"], response_dict["errors"])
+
+    @staticmethod
+    def _get_label(labels_lst, errors_lst):
+        if errors_lst[0] is not None:
+            raise RuntimeError(f"Blad klasyfikacji nagrania: {errors_lst[0]}")
+        return labels_lst[0]
+
+    def get_stats(self):
+        """
+        Metoda zwracajaca liczniki i czasy odpowiedzi serwera
+        """
+        return self._request("GET", "/stats")
+
+    def close(self):
+        self.connection.close()
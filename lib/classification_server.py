@@ -0,0 +1,390 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+import json
+import os
+import socket
+import time
+import audioread
+import numpy as np
+import soundfile
+from lib.clip_handler import get_recording_features_multi
+from lib.feature_store import FeatureStore
+
+# bledy odczytu lub dekodowania nagrania - bledy zapytania (422), a nie serwera
+RECORDING_ERRORS = (
+    FileNotFoundError,
+    IsADirectoryError,
+    EOFError,
+    ValueError,
+    soundfile.SoundFileError,
+    audioread.exceptions.DecodeError,
+)
+
+
+def get_error_message(error):
+    """
+    Funkcja zwracajaca opis bledu (nazwa typu bledu, jesli blad nie ma opisu, np. EOFError)
+    """
+    return str(error) or type(error).__name__
+
+
+def get_error_status(error):
+    """
+    Funkcja zwracajaca kod odpowiedzi HTTP dla bledu klasyfikacji nagrania
+    """
+    return 422 if isinstance(error, RECORDING_ERRORS) else 500
+
+
+class MicroBatchClassifier:
+    """
+    Klasyfikator zapytan laczonych w male paczki: zapytania (sciezka nagrania lub zdekodowane
+    nagranie) trafiaja do kolejki, a watek klasyfikujacy zbiera paczke do max_batch_size zapytan,
+    czekajac na kolejne zapytania co najwyzej max_wait_ms od pierwszego zapytania paczki.
+    Cechy nagran paczki wyznaczane sa w extraction_workers_cnt watkach, normalizowane zakresem
+    zapisanym w modelu, a paczka klasyfikowana jest jednym wywolaniem blokowego wyszukiwania
+    sasiadow (KNearestNeighbours.iter_stream_points_labels).
+    Zbierane sa liczniki zapytan, bledow, paczek oraz czasy odpowiedzi (od przyjecia zapytania)
+    """
+
+    def __init__(
+        self,
+        knn_model,
+        k_neighbours=3,
+        max_batch_size=32,
+        max_wait_ms=5.0,
+        extraction_workers_cnt=None,
+        latencies_cnt=10000,
+        **classification_kwargs,
+    ):
+        self.knn_model = knn_model
+        self.k_neighbours = k_neighbours
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.classification_kwargs = classification_kwargs
+
+        # parametry wyznaczania cech i zakres normalizacji z modelu
+        model_params = knn_model.model_params
+        mfcc_features_cnt, frame_duration_ms, hop_duration = model_params[
+            "extraction_config"
+        ]
+        self.extraction_config = (
+            mfcc_features_cnt,
+            frame_duration_ms / 1000,
+            hop_duration,
+        )
+        self.top_db = model_params["top_db"]
+        self.min_mfcc_arr = model_params["min_mfcc_arr"]
+        self.max_mfcc_arr = model_params["max_mfcc_arr"]
+
+        self.extraction_executor = ThreadPoolExecutor(
+            max_workers=extraction_workers_cnt or os.cpu_count() or 1
+        )
+        # liczniki, czasy odpowiedzi i czasy etapow paczek (ostatnie latencies_cnt wartosci)
+        self.locker = Lock()
+        self.start_time = time.perf_counter()
+        self.requests_cnt = 0
+        self.errors_cnt = 0
+        self.batches_cnt = 0
+        self.latencies_deque = deque(maxlen=latencies_cnt)
+        self.extraction_times_deque = deque(maxlen=latencies_cnt)
+        self.classification_times_deque = deque(maxlen=latencies_cnt)
+
+        self._requests_queue = Queue()
+        self._classifier_thread = Thread(target=self._classify_requests, daemon=True)
+        self._classifier_thread.start()
+
+    def submit(self, recording_path=None, recording=None, recording_sr=None):
+        """
+        Metoda dodajaca zapytanie do kolejki. Zwraca obiekt Future z przewidziana etykieta
+        """
+        future = Future()
+        self._requests_queue.put(
+            (future, time.perf_counter(), recording_path, recording, recording_sr)
+        )
+        return future
+
+    def classify(
+        self, recording_path=None, recording=None, recording_sr=None, timeout=None
+    ):
+        """
+        Metoda klasyfikujaca nagranie (oczekuje na wynik paczki, do ktorej trafilo zapytanie)
+        """
+        return self.submit(recording_path, recording, recording_sr).result(timeout)
+
+    def _get_batch(self):
+        """
+        Metoda zbierajaca paczke zapytan: pierwsze zapytanie oczekiwane jest bez ograniczenia
+        czasu, kolejne co najwyzej do uplywu max_wait_ms od jego odebrania
+        """
+        batch_lst = [self._requests_queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch_lst) < self.max_batch_size:
+            try:
+                batch_lst.append(
+                    self._requests_queue.get(
+                        timeout=max(0.0, deadline - time.perf_counter())
+                    )
+                )
+            except Empty:
+                break
+        return batch_lst
+
+    def _get_request_features(self, request):
+        _, _, recording_path, recording, recording_sr = request
+        return get_recording_features_multi(
+            recording_path,
+            [self.extraction_config],
+            top_db=self.top_db,
+            recording=recording,
+            recording_sr=recording_sr,
+        )[0]
+
+    def _iter_batches(self, pending_dict):
+        """
+        Generator paczek probek (FeatureStore, nazwy probek - identyfikatory zapytan) dla
+        iter_stream_points_labels. Zapytania, dla ktorych nie udalo sie wyznaczyc cech,
+        koncza sie bledem
+        """
+        while True:
+            batch_lst = self._get_batch()
+            start_time = time.perf_counter()
+            feature_futures_lst = [
+                self.extraction_executor.submit(self._get_request_features, request)
+                for request in batch_lst
+            ]
+            loaded_lst = []
+            for request, feature_future in zip(batch_lst, feature_futures_lst):
+                try:
+                    loaded_lst.append((request, feature_future.result()))
+                except Exception as error:
+                    self._finish_request(request, error=error)
+
+            with self.locker:
+                self.batches_cnt += 1
+                self.extraction_times_deque.append(time.perf_counter() - start_time)
+            if not loaded_lst:
+                continue
+
+            batch_feature_store = FeatureStore.from_lists(
+                [str(id(request[0])) for request, _ in loaded_lst],
+                [""] * len(loaded_lst),
+                [feature_arr for _, feature_arr in loaded_lst],
+            )
+            batch_feature_store.normalize(self.min_mfcc_arr, self.max_mfcc_arr)
+            for request, _ in loaded_lst:
+                pending_dict[str(id(request[0]))] = request
+
+            # generator wznawiany jest po sklasyfikowaniu calej paczki
+            start_time = time.perf_counter()
+            yield batch_feature_store
+            with self.locker:
+                self.classification_times_deque.append(time.perf_counter() - start_time)
+
+    def _classify_requests(self):
+        """
+        Metoda watku klasyfikujacego kolejne paczki zapytan. Blad klasyfikacji konczy
+        zapytania oczekujacej paczki, a klasyfikacja wznawiana jest dla kolejnych paczek
+        """
+        pending_dict = {}
+        while True:
+            try:
+                labels_iter = self.knn_model.iter_stream_points_labels(
+                    self._iter_batches(pending_dict),
+                    k_neighbours=self.k_neighbours,
+                    **self.classification_kwargs,
+                )
+                for request_id, _, knn_label in labels_iter:
+                    self._finish_request(pending_dict.pop(request_id), label=knn_label)
+            except Exception as error:
+                for request in pending_dict.values():
+                    self._finish_request(request, error=error)
+                pending_dict.clear()
+
+    def _finish_request(self, request, label=None, error=None):
+        future, submit_time = request[:2]
+        with self.locker:
+            self.requests_cnt += 1
+            self.latencies_deque.append(time.perf_counter() - submit_time)
+            if error is not None:
+                self.errors_cnt += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(label)
+
+    def get_stats(self):
+        """
+        Metoda zwracajaca liczniki zapytan i paczek, przepustowosc oraz czasy odpowiedzi
+        p50/p95/p99 i srednie czasy etapow paczki (z ostatnich latencies_cnt wartosci)
+        """
+        with self.locker:
+            elapsed = time.perf_counter() - self.start_time
+            stats_dict = {
+                "requests": self.requests_cnt,
+                "errors": self.errors_cnt,
+                "batches": self.batches_cnt,
+                "mean_batch_size": (
+                    round(self.requests_cnt / self.batches_cnt, 2)
+                    if self.batches_cnt
+                    else 0.0
+                ),
+                "requests_per_second": round(self.requests_cnt / elapsed, 2),
+            }
+            latencies_arr = np.array(self.latencies_deque) * 1000
+            stage_times_dict = {
+                "extraction": np.array(self.extraction_times_deque) * 1000,
+                "classification": np.array(self.classification_times_deque) * 1000,
+            }
+
+        for percentile in (50, 95, 99):
+            stats_dict[f"latency_p{percentile}_ms"] = (
+                round(float(np.percentile(latencies_arr, percentile)), 3)
+                if len(latencies_arr)
+                else None
+            )
+        for stage, times_arr in stage_times_dict.items():
+            stats_dict[f"{stage}_mean_ms"] = (
+                round(float(times_arr.mean()), 3) if len(times_arr) else None
+            )
+        return stats_dict
+
+
+class ClassificationRequestHandler(BaseHTTPRequestHandler):
+    """
+    Obsluga zapytan HTTP serwera klasyfikacji:
+        POST /classify - {"clip_path": sciezka} lub {"clip_paths": [sciezki]} (JSON) albo
+            zdekodowane nagranie float32 (application/octet-stream, czestotliwosc ?sr=).
+            Odpowiedz zawiera etykiety i bledy kolejnych nagran (null dla nagran bez bledu);
+            jesli zadne nagranie nie zostalo sklasyfikowane, kod 422 (blad odczytu nagrania)
+            lub 500
+        GET /stats - liczniki i czasy odpowiedzi
+        GET /health - stan serwera
+    """
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, response_dict):
+        response_bytes = json.dumps(response_dict).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/stats":
+            self._send_json(200, self.server.classifier.get_stats())
+        elif path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Nieznana sciezka: {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/classify":
+            self._send_json(404, {"error": f"Nieznana sciezka: {url.path}"})
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        classifier = self.server.classifier
+        start_time = time.perf_counter()
+        try:
+            if self.headers.get("Content-Type") == "application/octet-stream":
+                recording_sr = int(parse_qs(url.query)["sr"][0])
+                futures_lst = [
+                    classifier.submit(
+                        recording=np.frombuffer(body, dtype="<f4"),
+                        recording_sr=recording_sr,
+                    )
+                ]
+            else:
+                request_dict = json.loads(body)
+                if not isinstance(request_dict, dict):
+                    raise ValueError("zapytanie JSON musi byc obiektem")
+                clip_paths_lst = request_dict.get("clip_paths") or [
+                    request_dict["clip_path"]
+                ]
+                # nagrania jednego zapytania trafiaja do kolejki razem
+                futures_lst = [
+                    classifier.submit(recording_path=clip_path)
+                    for clip_path in clip_paths_lst
+                ]
+        except (KeyError, TypeError, ValueError) as error:
+            self._send_json(
+                400, {"error": f"Niepoprawne zapytanie: {get_error_message(error)}"}
+            )
+            return
+
+        # bledy zwracane sa osobno dla kazdego nagrania (etykieta null)
+        labels_lst = []
+        errors_lst = []
+        statuses_lst = []
+        for future in futures_lst:
+            try:
+                labels_lst.append(future.result())
+                errors_lst.append(None)
+            except Exception as error:
+                labels_lst.append(None)
+                errors_lst.append(get_error_message(error))
+                statuses_lst.append(get_error_status(error))
+
+        response_dict = {
+            "labels": labels_lst,
+            "errors": errors_lst,
+            "latency_ms": round((time.perf_counter() - start_time) * 1000, 3),
+        }
+        # zapytanie konczy sie bledem, jesli zadnego nagrania nie udalo sie sklasyfikowac
+        if len(statuses_lst) == len(futures_lst):
+            response_dict["error"] = next(filter(None, errors_lst))
+            self._send_json(max(statuses_lst), response_dict)
+        else:
+            self._send_json(200, response_dict)
+
+
+class ClassificationHTTPServer(ThreadingHTTPServer):
+    """
+    Serwer HTTP klasyfikacji (watek na polaczenie). Kolejka oczekujacych polaczen jest
+    dluzsza niz domyslna, bo gniazdo Unix odrzuca polaczenia po jej zapelnieniu
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, classifier):
+        super().__init__(server_address, ClassificationRequestHandler)
+        self.classifier = classifier
+
+
+class UnixHTTPServer(ClassificationHTTPServer):
+    """
+    Serwer HTTP klasyfikacji nasluchujacy na gniezdzie Unix
+    """
+
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def create_classification_server(
+    classifier, host="127.0.0.1", port=8765, unix_socket=None
+):
+    """
+    Funkcja tworzaca serwer HTTP klasyfikacji (na gniezdzie Unix, jesli podano unix_socket)
+    """
+    if unix_socket is not None:
+        return UnixHTTPServer(unix_socket, classifier)
+    return ClassificationHTTPServer((host, port), classifier)
@@ -1,11 +1,156 @@
 import numpy as np
 import librosa.feature
 import os
-import random
-import pandas as pd
-from lib.utils import get_min_max_mfcc_values
+from lib.clips_metadata import (
+    EXCLUDED_AGES,
+    get_grouped_sample_idx,
+    load_clips_metadata,
+)
+from lib.feature_store import FeatureStore
+from lib.pcm_store import decode_clips, open_pcm_store
+from lib.profiler import StageProfiler, profile_stage
+from lib.thread_limits import get_worker_threads_cnt, limit_worker_threads
 from threading import Lock
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+def get_recording_features_multi(
+    recording_path,
+    extraction_configs_lst,
+    top_db=40,
+    recording=None,
+    recording_sr=None,
+    profiler=None,
+):
+    """
+    Funkcja wyznaczajaca wektory cech nagrania (wartosci srednie i mediany wektora MFCC oraz jego
+    pochodnej) dla listy konfiguracji (ilosc cech MFCC, dlugosc ramki w sekundach, przeplot ramek).
+    Nagranie dekodowane jest raz (lub podane juz zdekodowane jako recording i recording_sr),
+    a spektrogram liczony raz dla kazdej pary (ramka, przeplot) - wektory MFCC o mniejszej ilosci
+    cech sa poczatkowymi wierszami wektora o najwiekszej ilosci cech.
+    Czasy kolejnych etapow zapisywane sa w profiler (StageProfiler), jesli go podano
+    """
+    # odczytanie probki w natywnej czestotliwosci probkowania
+    if recording is None:
+        with profile_stage(profiler, "librosa.load"):
+            recording, recording_sr = librosa.load(recording_path, sr=None)
+
+    # usuniecie ciszy z probki
+    with profile_stage(profiler, "librosa.effects.trim"):
+        recoding_trimmed, _ = librosa.effects.trim(y=recording, top_db=top_db)
+
+    # pogrupowanie konfiguracji wedlug dlugosci ramki i przeplotu
+    frame_configs_dict = {}
+    for i, (mfcc_features_cnt, frame_duration, hop_length) in enumerate(
+        extraction_configs_lst
+    ):
+        frame_configs_dict.setdefault((frame_duration, hop_length), []).append(
+            (i, mfcc_features_cnt)
+        )
+
+    features_lst = [None] * len(extraction_configs_lst)
+    for (frame_duration, hop_length), configs_lst in frame_configs_dict.items():
+        # okreslenie dlugosci ramki
+        frame_length = round(frame_duration * recording_sr)
+
+        # odczytanie wektora MFCC o najwiekszej ilosci cech
+        with profile_stage(profiler, "librosa.feature.mfcc"):
+            mfcc_features = librosa.feature.mfcc(
+                y=recoding_trimmed,
+                sr=recording_sr,
+                n_fft=frame_length,
+                hop_length=int(round(frame_length * hop_length / 100)),
+                n_mfcc=max(mfcc_features_cnt for _, mfcc_features_cnt in configs_lst),
+            )
+
+        # odczytanie pochodnych wektora MFCC
+        with profile_stage(profiler, "librosa.feature.delta"):
+            mfcc_derivative = librosa.feature.delta(mfcc_features)
+
+        # zebranie cech w jeden wektor dla kazdej ilosci cech MFCC
+        with profile_stage(profiler, "srednie i mediany"):
+            stats_lst = [
+                np.mean(mfcc_features, axis=1),
+                np.median(mfcc_features, axis=1),
+                np.mean(mfcc_derivative, axis=1),
+                np.median(mfcc_derivative, axis=1),
+            ]
+        for i, mfcc_features_cnt in configs_lst:
+            features_lst[i] = np.concatenate(
+                [stat[:mfcc_features_cnt] for stat in stats_lst]
+            )
+
+    return features_lst
+
+
+def get_recording_features(
+    recording_path, mfcc_features_cnt, frame_duration=0.02, hop_length=50, top_db=40
+):
+    """
+    Funkcja wyznaczajaca wektor cech nagrania: wartosci srednie i mediany wektora MFCC
+    oraz jego pochodnej
+    """
+    return get_recording_features_multi(
+        recording_path, [(mfcc_features_cnt, frame_duration, hop_length)], top_db=top_db
+    )[0]
+
+
+def get_clips_features(
+    clip_path,
+    clip_names_lst,
+    extraction_configs_lst,
+    top_db=40,
+    pcm_store_dir=None,
+    profiler=None,
+):
+    """
+    Funkcja wyznaczajaca wektory cech paczki nagran dla listy konfiguracji (uruchamiana w procesie
+    lub watku roboczym). Nagrania obecne w magazynie zdekodowanych probek (pcm_store_dir)
+    odczytywane sa z niego zamiast dekodowania. Zwraca liste krotek (nazwa nagrania,
+    lista wektorow cech kolejnych konfiguracji lub None, opis bledu lub None)
+    """
+    pcm_store = open_pcm_store(pcm_store_dir) if pcm_store_dir else None
+
+    clips_features_lst = []
+    for clip_name in clip_names_lst:
+        try:
+            with profile_stage(profiler, "nagranie", items=1):
+                recording_path = os.path.join(clip_path, clip_name)
+                with profile_stage(profiler, "odczyt z magazynu nagran"):
+                    recording, recording_sr = (
+                        pcm_store.get_recording(recording_path)
+                        if pcm_store is not None
+                        else (None, None)
+                    )
+                features_lst = get_recording_features_multi(
+                    recording_path,
+                    extraction_configs_lst,
+                    top_db=top_db,
+                    recording=recording,
+                    recording_sr=recording_sr,
+                    profiler=profiler,
+                )
+            clips_features_lst.append((clip_name, features_lst, None))
+        except Exception as e:
+            clips_features_lst.append((clip_name, None, f"{type(e).__name__}: {e}"))
+    return clips_features_lst
+
+
+def get_clips_features_profiled(clip_path, clip_names_lst, *args, **kwargs):
+    """
+    Funkcja get_clips_features z pomiarem czasu etapow (uruchamiana w procesie lub watku roboczym).
+    Zwraca krotke (wynik get_clips_features, dane profilera do dolaczenia w procesie glownym)
+    """
+    profiler = StageProfiler()
+    clips_features_lst = get_clips_features(
+        clip_path, clip_names_lst, *args, profiler=profiler, **kwargs
+    )
+    return clips_features_lst, profiler.get_data()
 
 
 class ClipsHandler:
@@ -13,144 +158,296 @@ class ClipsHandler:
     Klasa odpowiadająca za odczytanie plikow z nagraniami, okreslenie wektora MFCC nagrania i jego pochodnej,
     obliczenie wartosci sredniej i mediany dla kazdej cechy opisanej przez wektro i pochodna
 
-    UWAGA: KLASA KORZYSTA Z WIELOWATKOWOSCI!
+    UWAGA: KLASA KORZYSTA Z WIELOPROCESOWOSCI (extraction_backend="process")
+    LUB WIELOWATKOWOSCI (extraction_backend="thread")!
     """
 
-    def __init__(self, logger, user_input, clip_data_csv, clips_path):
+    def __init__(
+        self,
+        logger,
+        user_input,
+        clip_data_csv,
+        clips_path,
+        workers_cnt=None,
+        extraction_backend="process",
+        chunk_size=16,
+        feature_cache=None,
+        top_db=40,
+        extraction_configs_lst=None,
+        pcm_store=None,
+        stream_test_samples=False,
+        profiler=None,
+        seed=None,
+        model_params=None,
+        cores_cnt=None,
+    ):
         self.logger = logger
         self.locker = Lock()
 
+        # profiler czasu etapow wyznaczania cech (StageProfiler), dane z procesow i watkow
+        # roboczych dolaczane sa po zakonczeniu kazdej paczki nagran
+        self.profiler = profiler
+
+        # trwaly magazyn wektorow cech (FeatureCache), magazyn zdekodowanych nagran (PCMStore)
+        # oraz prog usuwania ciszy
+        self.feature_cache = feature_cache
+        self.pcm_store = pcm_store
+        self.top_db = top_db
+
+        # ustawienia rownoleglego wyznaczania cech (cores_cnt - ilosc rdzeni procesora
+        # do dyspozycji procesow roboczych, None - wszystkie)
+        self.cores_cnt = cores_cnt
+        self.workers_cnt = workers_cnt or cores_cnt or os.cpu_count() or 1
+        self.extraction_backend = extraction_backend
+        self.chunk_size = chunk_size
+        self.failed_clips_lst = []
+
+        # probki testowe wyznaczane strumieniowo (iter_test_mfcc) zamiast przy tworzeniu obiektu,
+        # normalizacja jedynie na podstawie probek uczacych
+        self.stream_test_samples = stream_test_samples
+
         # odczytanie informacji o nagraniach i podzial na zbior testowy i uczacy
+        # (seed - ziarno losowania probek, None - losowanie niepowtarzalne)
         self.learn_data_lst = []
         self.test_data_lst = []
         self.get_clips_data(
-            clip_data_csv, user_input.number_of_examples, user_input.percent_to_learn
+            clip_data_csv,
+            user_input.number_of_examples,
+            user_input.percent_to_learn,
+            seed=seed,
         )
 
-        # obliczenie wartosci sredniej i mediany wektorow MFCC i ich pochodnych
-        self.mfcc_learn_clip_data_dict = dict()
-        self.mfcc_test_clip_data_dict = dict()
-        self.get_all_files_mfcc(
-            clips_path,
-            user_input.number_of_features,
-            user_input.frame_duration_ms / 1000,
-            user_input.hop_duration,
-        )
+        # dla zapisanego modelu (model_params z KNearestNeighbours.load_model) probki uczace
+        # pochodza z modelu - wyznaczane sa jedynie cechy probek testowych spoza zbioru uczacego
+        # modelu dla konfiguracji ekstrakcji modelu, normalizowane wartosciami z modelu
+        if model_params is not None:
+            self.use_model_params(clips_path, model_params)
+        else:
+            # obliczenie wartosci sredniej i mediany wektorow MFCC i ich pochodnych
+            # oraz ich normalizacja dla kazdej konfiguracji ekstrakcji
+            # (ilosc cech MFCC, dlugosc ramki w milisekundach, stopien przeplotu ramek)
+            user_config = (
+                user_input.number_of_features,
+                user_input.frame_duration_ms,
+                user_input.hop_duration,
+            )
+            self.mfcc_learn_feature_store = FeatureStore.from_lists([], [], [])
+            self.mfcc_test_feature_store = FeatureStore.from_lists([], [], [])
+            self.mfcc_feature_stores_by_config_dict = dict()
+            self.mfcc_min_max_by_config_dict = dict()
+            self.get_all_files_mfcc_multi(
+                clips_path, extraction_configs_lst or [user_config]
+            )
+            self.select_extraction_config(
+                user_config
+                if user_config in self.mfcc_feature_stores_by_config_dict
+                else next(iter(self.mfcc_feature_stores_by_config_dict))
+            )
 
-        # normalizacja wektorow
-        self.normalize_mfcc()
+    def get_model_params(self):
+        """
+        Metoda zwracajaca parametry wyznaczania cech biezacej konfiguracji do zapisania z modelem
+        (KNearestNeighbours.save_model)
+        """
+        return {
+            "extraction_config": list(self.extraction_config),
+            "top_db": self.top_db,
+            "min_mfcc_arr": self.min_mfcc_arr,
+            "max_mfcc_arr": self.max_mfcc_arr,
+        }
 
-    def get_clips_data(
-        self, clips_data_path, example_in_class_cnt, learn_data_percentage
-    ):
+    def use_model_params(self, clips_path, model_params):
         """
-        Metoda odpowiadajaca za odczytanie danych o nagraniach, wyborze probek dla kazdej klasy,
-        podzial probek na uczace i testowe
-        """
-        # odczytanie informacji o probkach
-        clips_data_df = pd.read_csv(clips_data_path, sep="\t", low_memory=False)[["path", "age"]]
-        filtered_clips_data = clips_data_df[
-            (clips_data_df["age"] != "seventies")
-            & (clips_data_df["age"] != "sixties")
-            & (clips_data_df["age"].notna())
+        Metoda wyznaczajaca cechy probek testowych dla parametrow zapisanego modelu
+        (bez wyznaczania cech probek uczacych i wartosci minimalnych i maksymalnych)
+        """
+        learn_clip_names_set = set(model_params["learn_clip_names"])
+        self.test_data_lst = [
+            (clip, label)
+            for clip, label in self.learn_data_lst + self.test_data_lst
+            if clip not in learn_clip_names_set
         ]
+        self.learn_data_lst = []
+        self.top_db = model_params["top_db"]
+        self.extraction_config = tuple(model_params["extraction_config"])
+        self.min_mfcc_arr = model_params["min_mfcc_arr"]
+        self.max_mfcc_arr = model_params["max_mfcc_arr"]
+        self.mfcc_min_max_by_config_dict = {
+            self.extraction_config: (self.min_mfcc_arr, self.max_mfcc_arr)
+        }
 
-        # wybor reprezentantow klas
-        self.logger.save_log("")
-        self.logger.save_log("Ilosc probek na dany wiek:")
-        for age in filtered_clips_data["age"].unique():
-            # wybor plikow dla danej klasy
-            clip_lst = filtered_clips_data[filtered_clips_data["age"] == age][
-                "path"
-            ].tolist()
-
-            # losowe sortowanie probek probek
-            random.shuffle(clip_lst)
+        mfcc_features_cnt, frame_duration_ms, hop_duration = self.extraction_config
+        self.mfcc_learn_feature_store = FeatureStore.from_lists(
+            [], [], [], features_cnt=4 * mfcc_features_cnt
+        )
+        if self.stream_test_samples:
+            self.mfcc_test_feature_store = FeatureStore.from_lists(
+                [], [], [], features_cnt=4 * mfcc_features_cnt
+            )
+        else:
+            self.logger.save_log("")
+            self.logger.save_log("Wczytywanie probek testowyh (parametry modelu)...")
+            self.mfcc_test_feature_store = self._get_files_mfcc(
+                clips_path,
+                self.test_data_lst,
+                [(mfcc_features_cnt, frame_duration_ms / 1000, hop_duration)],
+            )[0]
+            self.mfcc_test_feature_store.normalize(self.min_mfcc_arr, self.max_mfcc_arr)
+            self.logger.save_log(
+                f"Wczytano wszystkie probki testowe ({len(self.mfcc_test_feature_store)})"
+            )
+        self.mfcc_feature_stores_by_config_dict = {
+            self.extraction_config: (
+                self.mfcc_learn_feature_store,
+                self.mfcc_test_feature_store,
+            )
+        }
 
-            # wybor reprezentantow
-            shuffled_clip_lst = clip_lst[:example_in_class_cnt]
+    def get_clips_data(
+        self, clips_data_path, example_in_class_cnt, learn_data_percentage, seed=None
+    ):
+        """
+        Metoda odpowiadajaca za odczytanie danych o nagraniach, wyborze probek dla kazdej klasy,
+        podzial probek na uczace i testowe (dla podanego seed losowanie jest powtarzalne,
+        kolejnosc probek - wedlug klasy)
+        """
+        # odczytanie informacji o probkach (kolumny path i age, indeks zapisany obok pliku)
+        paths_arr, age_codes_arr, age_names_arr = load_clips_metadata(clips_data_path)
 
-            # obliczenie ilosci prbboek uczacych dla danej klasy
-            learn_data_cnt = int(
-                round(len(shuffled_clip_lst) * learn_data_percentage / 100)
-            )
+        # pominiecie probek bez wieku (kod -1 - ostatni element) i z pomijanych klas wieku
+        excluded_arr = np.append(np.isin(age_names_arr, EXCLUDED_AGES), True)
+        age_codes_arr = np.where(excluded_arr[age_codes_arr], -1, age_codes_arr)
 
-            # wybor probek uczacych
-            self.learn_data_lst.extend(
-                [(clip, age) for clip in shuffled_clip_lst[:learn_data_cnt]]
+        # wybor reprezentantow klas i podzial na probki uczace i testowe
+        learn_idx_arr, test_idx_arr, learn_cnt_arr, test_cnt_arr = (
+            get_grouped_sample_idx(
+                age_codes_arr, example_in_class_cnt, learn_data_percentage, seed=seed
             )
-
-            # wybor probek testowych
-            self.test_data_lst.extend(
-                [(clip, age) for clip in shuffled_clip_lst[learn_data_cnt:]]
+        )
+        for idx_arr, data_lst in (
+            (learn_idx_arr, self.learn_data_lst),
+            (test_idx_arr, self.test_data_lst),
+        ):
+            data_lst.extend(
+                zip(
+                    np.char.decode(paths_arr[idx_arr], "utf-8").tolist(),
+                    age_names_arr[age_codes_arr[idx_arr]].tolist(),
+                )
             )
 
+        self.logger.save_log("")
+        self.logger.save_log("Ilosc probek na dany wiek:")
+        for age_code in np.flatnonzero(learn_cnt_arr + test_cnt_arr):
             self.logger.save_log(
-                f"{age}: uczace {learn_data_cnt} | testowe {len(shuffled_clip_lst) - learn_data_cnt}"
+                f"{age_names_arr[age_code]}: uczace {learn_cnt_arr[age_code]} "
+                f"| testowe {test_cnt_arr[age_code]}"
             )
 
     def get_recording_mfcc(
         self,
         clip_path,
         clip_name,
-        label,
         mfcc_features_cnt,
         frame_duration=0.02,
         hop_length=50,
-        test_data_flg=True,
+        cache_entries_dict=None,
     ):
         """
-        Klasa odpowiedzialna za wyznaczenie wartosci srednich i mediany wektora MFCC danej probki
+        Metoda wyznaczajaca wektor cech nagrania (wartosci srednie i mediany wektora MFCC
+        oraz jego pochodnej) - z magazynu cech, jesli wektor zostal juz zapisany. Nowy wektor
+        dopisywany jest do cache_entries_dict (zapisywanego w magazynie przez wywolujacego
+        jednym put_many), a bez niego zapisywany od razu
         """
         recording_path = os.path.join(clip_path, clip_name)
 
-        # odczytanie probki
-        recording_sr = librosa.get_samplerate(recording_path)
-        recording, _ = librosa.load(recording_path, sr=recording_sr)
-
-        # usuniecie ciszy z probki
-        recoding_trimmed, _ = librosa.effects.trim(y=recording, top_db=40)
-
-        # okreslenie dlugosci ramki
-        frame_length = round(frame_duration * recording_sr)
+        # odczytanie wektora cech z magazynu
+        cache_key = None
+        if self.feature_cache is not None:
+            cache_key = self.feature_cache.get_key(
+                recording_path,
+                mfcc_features_cnt,
+                frame_duration,
+                hop_length,
+                self.top_db,
+            )
+            with self.locker:
+                all_feature_val = self.feature_cache.get(cache_key)
+            if all_feature_val is not None:
+                return all_feature_val
 
-        # odczytanie wektora MFCC
-        mfcc_features = librosa.feature.mfcc(
-            y=recoding_trimmed,
-            sr=recording_sr,
-            n_fft=frame_length,
-            hop_length=int(round(frame_length * hop_length / 100)),
-            n_mfcc=mfcc_features_cnt,
+        recording, recording_sr = (
+            self.pcm_store.get_recording(recording_path)
+            if self.pcm_store is not None
+            else (None, None)
         )
+        all_feature_val = get_recording_features_multi(
+            recording_path,
+            [(mfcc_features_cnt, frame_duration, hop_length)],
+            top_db=self.top_db,
+            recording=recording,
+            recording_sr=recording_sr,
+            profiler=self.profiler,
+        )[0]
+        if cache_key is not None:
+            if cache_entries_dict is not None:
+                cache_entries_dict[cache_key] = all_feature_val
+            else:
+                with self.locker:
+                    self.feature_cache.put_many({cache_key: all_feature_val})
+        return all_feature_val
 
-        # odczytanie pochodnych wektora MFCC
-        mfcc_derivative = librosa.feature.delta(mfcc_features)
-
-        # zebranie cech w jeden wektor
-        mean_feature_val = np.mean(mfcc_features, axis=1)
-        median_feature_val = np.median(mfcc_features, axis=1)
-        mean_derivative_feature_val = np.mean(mfcc_derivative, axis=1)
-        median_derivative_feature_val = np.median(mfcc_derivative, axis=1)
-        all_feature_val = np.concatenate(
-            [
-                mean_feature_val,
-                median_feature_val,
-                mean_derivative_feature_val,
-                median_derivative_feature_val,
+    def get_recordings_mfcc(
+        self,
+        clip_path,
+        data_lst,
+        mfcc_features_cnt,
+        frame_duration=0.02,
+        hop_length=50,
+        test_data_flg=True,
+    ):
+        """
+        Metoda wyznaczajaca wektory cech nagran z listy (nazwa nagrania, etykieta) i dopisujaca
+        je do zbioru testowego lub uczacego - wiersze zbierane sa w listach, a zbior
+        rozszerzany jest raz dla calej listy. Nowe wektory zapisywane sa w magazynie cech
+        jedna paczka (rowniez przy bledzie w trakcie listy)
+        """
+        cache_entries_dict = {}
+        try:
+            features_lst = [
+                self.get_recording_mfcc(
+                    clip_path,
+                    clip_name,
+                    mfcc_features_cnt,
+                    frame_duration,
+                    hop_length,
+                    cache_entries_dict=cache_entries_dict,
+                )
+                for clip_name, _ in data_lst
             ]
+        finally:
+            if self.feature_cache is not None and cache_entries_dict:
+                with self.locker:
+                    self.feature_cache.put_many(cache_entries_dict)
+        clips_feature_store = FeatureStore.from_lists(
+            [clip_name for clip_name, _ in data_lst],
+            [label for _, label in data_lst],
+            features_lst,
+            features_cnt=4 * mfcc_features_cnt,
         )
-
-        # zapis wartosci probki do zadanej wartosci
-        if test_data_flg:
-            with self.locker:
-                self.mfcc_test_clip_data_dict[clip_name] = {}
-                self.mfcc_test_clip_data_dict[clip_name]["label"] = label
-                self.mfcc_test_clip_data_dict[clip_name]["feature"] = all_feature_val
-        else:
-            with self.locker:
-                self.mfcc_learn_clip_data_dict[clip_name] = {}
-                self.mfcc_learn_clip_data_dict[clip_name]["label"] = label
-                self.mfcc_learn_clip_data_dict[clip_name]["feature"] = all_feature_val
+        store_name = (
+            "mfcc_test_feature_store" if test_data_flg else "mfcc_learn_feature_store"
+        )
+        with self.locker:
+            feature_store = getattr(self, store_name)
+            setattr(
+                self,
+                store_name,
+                (
+                    feature_store.concatenate(clips_feature_store)
+                    if len(feature_store)
+                    else clips_feature_store
+                ),
+            )
 
     def normalize_mfcc(self):
         """
@@ -159,65 +456,323 @@ class ClipsHandler:
         self.logger.save_log("")
         self.logger.save_log("Normalizacja MFCC...")
 
-        # odczytanie wartosci minimalne i maksymalnej kazdej cechy (wartosci sredniej i medianej danej cechy)
-        min_mfcc_arr, max_mfcc_arr = get_min_max_mfcc_values(
-            {**self.mfcc_test_clip_data_dict, **self.mfcc_learn_clip_data_dict}
-        )
-
-        # normalizacja wektorow cech dla kazdej probki
-        for key in self.mfcc_test_clip_data_dict.keys():
-            self.mfcc_test_clip_data_dict[key]["normalized_feature"] = (
-                self.mfcc_test_clip_data_dict[key]["feature"] - min_mfcc_arr
-            ) / (max_mfcc_arr - min_mfcc_arr)
+        with profile_stage(
+            self.profiler,
+            "normalizacja",
+            items=len(self.mfcc_test_feature_store) + len(self.mfcc_learn_feature_store),
+        ):
+            # odczytanie wartosci minimalne i maksymalnej kazdej cechy (wartosci sredniej i medianej danej cechy)
+            min_max_lst = [
+                feature_store.get_min_max()
+                for feature_store in (
+                    self.mfcc_test_feature_store,
+                    self.mfcc_learn_feature_store,
+                )
+                if len(feature_store)
+            ]
+            min_mfcc_arr = np.min([min_arr for min_arr, _ in min_max_lst], axis=0)
+            max_mfcc_arr = np.max([max_arr for _, max_arr in min_max_lst], axis=0)
+            self.min_mfcc_arr, self.max_mfcc_arr = min_mfcc_arr, max_mfcc_arr
 
-        for key in self.mfcc_learn_clip_data_dict.keys():
-            self.mfcc_learn_clip_data_dict[key]["normalized_feature"] = (
-                self.mfcc_learn_clip_data_dict[key]["feature"] - min_mfcc_arr
-            ) / (max_mfcc_arr - min_mfcc_arr)
+            # normalizacja macierzy wektorow cech
+            self.mfcc_test_feature_store.normalize(min_mfcc_arr, max_mfcc_arr)
+            self.mfcc_learn_feature_store.normalize(min_mfcc_arr, max_mfcc_arr)
 
         self.logger.save_log("Koniec normalizacji MFCC!")
 
-    def get_all_files_mfcc(
-        self, src_path, mfcc_features_cnt, frame_duration=0.02, hop_length=50
+    def _run_in_pool(self, func, src_path, clip_names_lst, *args, **kwargs):
+        """
+        Generator uruchamiajacy funkcje func(src_path, paczka nagran, *args, **kwargs) w procesach
+        lub watkach roboczych i zwracajacy jej wyniki dla kolejnych zakonczonych paczek.
+        Nagrania wysylane sa paczkami po chunk_size, a jednoczesnie przetwarzanych jest
+        co najwyzej 2 * workers_cnt paczek
+        """
+        if not clip_names_lst:
+            return
+
+        if self.extraction_backend == "process":
+            # watki BLAS/OpenMP procesow roboczych ograniczone do ich udzialu w rdzeniach
+            executor_class = ProcessPoolExecutor
+            executor_kwargs = {
+                "initializer": limit_worker_threads,
+                "initargs": (get_worker_threads_cnt(self.workers_cnt, self.cores_cnt),),
+            }
+        elif self.extraction_backend == "thread":
+            executor_class = ThreadPoolExecutor
+            executor_kwargs = {}
+        else:
+            raise ValueError(
+                f"Nieznany sposob wyznaczania cech: {self.extraction_backend}"
+            )
+
+        chunks_iter = (
+            clip_names_lst[i : i + self.chunk_size]
+            for i in range(0, len(clip_names_lst), self.chunk_size)
+        )
+        with executor_class(
+            max_workers=self.workers_cnt, **executor_kwargs
+        ) as executor:
+            in_flight = set()
+            while True:
+                # uzupelnienie kolejki paczek do ograniczonej liczby
+                for chunk in chunks_iter:
+                    in_flight.add(
+                        executor.submit(func, src_path, chunk, *args, **kwargs)
+                    )
+                    if len(in_flight) >= 2 * self.workers_cnt:
+                        break
+                if not in_flight:
+                    break
+
+                # odebranie wynikow zakonczonych paczek
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def _iter_clips_features(
+        self, src_path, clip_names_lst, extraction_configs_lst, pcm_store_dir=None
     ):
         """
-        Metoda odpowiedzialna za odczytanie cehc wszystkich probek
+        Generator wyznaczajacy wektory cech nagran (get_clips_features) w procesach lub watkach
+        roboczych i zwracajacy wyniki kolejnych paczek. Jesli podano profiler, czasy etapow
+        z procesow roboczych dolaczane sa do niego po kazdej paczce
         """
-        self.logger.save_log("")
-        self.logger.save_log("Wczytywanie probek uczacych...")
-
-        # uruchomienie wielowatkowsci
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            # odczytanie wektorow cech zbioru uczacego
-            for file, age in self.learn_data_lst:
-                executor.submit(
-                    self.get_recording_mfcc,
-                    src_path,
-                    file,
-                    age,
-                    mfcc_features_cnt,
-                    frame_duration=frame_duration,
-                    hop_length=hop_length,
-                    test_data_flg=False,
+        if self.profiler is None:
+            yield from self._run_in_pool(
+                get_clips_features,
+                src_path,
+                clip_names_lst,
+                extraction_configs_lst,
+                top_db=self.top_db,
+                pcm_store_dir=pcm_store_dir,
+            )
+            return
+
+        for clips_features_lst, profile_data in self._run_in_pool(
+            get_clips_features_profiled,
+            src_path,
+            clip_names_lst,
+            extraction_configs_lst,
+            top_db=self.top_db,
+            pcm_store_dir=pcm_store_dir,
+        ):
+            self.profiler.merge(profile_data)
+            yield clips_features_lst
+
+    def _get_files_mfcc(self, src_path, data_lst, extraction_configs_lst):
+        """
+        Metoda wyznaczajaca wektory cech nagran z listy (data_lst) dla listy konfiguracji
+        (ilosc cech MFCC, dlugosc ramki w sekundach, przeplot ramek) w procesach lub watkach roboczych.
+        Nagrania, ktorych nie udalo sie przetworzyc, sa zliczane i zapisywane do failed_clips_lst.
+        Zwraca liste zbiorow probek (FeatureStore) dla kolejnych konfiguracji
+        """
+        clip_names_lst = [clip for clip, _ in data_lst]
+
+        # odczytanie wektorow cech zapisanych w magazynie
+        features_dict = {}
+        cache_keys_dict = {}
+        if self.feature_cache is not None:
+            for clip_name in clip_names_lst:
+                try:
+                    cache_keys_dict[clip_name] = [
+                        self.feature_cache.get_key(
+                            os.path.join(src_path, clip_name),
+                            mfcc_features_cnt,
+                            frame_duration,
+                            hop_length,
+                            self.top_db,
+                        )
+                        for mfcc_features_cnt, frame_duration, hop_length in extraction_configs_lst
+                    ]
+                except OSError:
+                    pass
+            cached_features_dict = self.feature_cache.get_many(
+                [key for keys_lst in cache_keys_dict.values() for key in keys_lst]
+            )
+            features_dict = {
+                clip_name: [cached_features_dict[key] for key in keys_lst]
+                for clip_name, keys_lst in cache_keys_dict.items()
+                if all(key in cached_features_dict for key in keys_lst)
+            }
+            self.logger.save_log(
+                f"Odczytano z magazynu cech {len(features_dict)}/{len(clip_names_lst)} probek"
+            )
+
+        missing_clip_names_lst = [
+            clip for clip in clip_names_lst if clip not in features_dict
+        ]
+
+        # zdekodowanie nagran nieobecnych w magazynie zdekodowanych probek
+        pcm_store_dir = None
+        if self.pcm_store is not None:
+            not_decoded_clip_names_lst = [
+                clip
+                for clip in missing_clip_names_lst
+                if os.path.join(src_path, clip) not in self.pcm_store
+            ]
+            for decoded_clips_lst in self._run_in_pool(
+                decode_clips, src_path, not_decoded_clip_names_lst
+            ):
+                self.pcm_store.add_recordings(
+                    [
+                        (key, recording, recording_sr)
+                        for _, key, recording, recording_sr in decoded_clips_lst
+                        if recording is not None
+                    ]
                 )
-        self.logger.save_log(
-            f"Wczytano wszystkie probki uczace ({len(self.mfcc_learn_clip_data_dict)})"
-        )
+            pcm_store_dir = self.pcm_store.store_dir
+
+        # wyznaczenie wektorow cech pozostalych nagran
+        failed_clips_lst = []
+        with profile_stage(
+            self.profiler, "wyznaczanie cech", items=len(missing_clip_names_lst)
+        ):
+            for clips_features_lst in self._iter_clips_features(
+                src_path, missing_clip_names_lst, extraction_configs_lst, pcm_store_dir
+            ):
+                for clip_name, features_lst, error in clips_features_lst:
+                    if error is None:
+                        features_dict[clip_name] = features_lst
+                    else:
+                        failed_clips_lst.append((clip_name, error))
+
+        # zapis nowych wektorow cech do magazynu
+        if self.feature_cache is not None:
+            self.feature_cache.put_many(
+                {
+                    key: feature_arr
+                    for clip_name in missing_clip_names_lst
+                    if clip_name in features_dict and clip_name in cache_keys_dict
+                    for key, feature_arr in zip(
+                        cache_keys_dict[clip_name], features_dict[clip_name]
+                    )
+                }
+            )
+            self.feature_cache.save_index()
+
+        # zapisanie bledow
+        if failed_clips_lst:
+            self.logger.save_log(
+                f"Nie udalo sie wczytac {len(failed_clips_lst)} probek:"
+            )
+            for clip_name, error in failed_clips_lst:
+                self.logger.save_log(f"{clip_name}: {error}")
+        self.failed_clips_lst.extend(failed_clips_lst)
+
+        # zapis cech w kolejnosci listy nagran dla kazdej konfiguracji
+        loaded_data_lst = [
+            (clip_name, label)
+            for clip_name, label in data_lst
+            if clip_name in features_dict
+        ]
+        return [
+            FeatureStore.from_lists(
+                [clip_name for clip_name, _ in loaded_data_lst],
+                [label for _, label in loaded_data_lst],
+                [features_dict[clip_name][i] for clip_name, _ in loaded_data_lst],
+                features_cnt=4 * mfcc_features_cnt,
+            )
+            for i, (mfcc_features_cnt, _, _) in enumerate(extraction_configs_lst)
+        ]
+
+    def get_all_files_mfcc_multi(self, src_path, extraction_configs_lst):
+        """
+        Metoda odczytujaca cechy wszystkich probek dla listy konfiguracji
+        (ilosc cech MFCC, dlugosc ramki w milisekundach, stopien przeplotu ramek) z jednego
+        dekodowania nagrania i jednego spektrogramu dla kazdej pary (ramka, przeplot).
+        Znormalizowane probki kazdej konfiguracji zapisywane sa w mfcc_feature_stores_by_config_dict
+        """
+        extraction_configs_lst = list(dict.fromkeys(extraction_configs_lst))
+        seconds_configs_lst = [
+            (mfcc_features_cnt, frame_duration_ms / 1000, hop_duration)
+            for mfcc_features_cnt, frame_duration_ms, hop_duration in extraction_configs_lst
+        ]
 
         self.logger.save_log("")
-        self.logger.save_log("Wczytywanie probek testowyh...")
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            # odczytanie wektora cech probek uczacych
-            for file, age in self.test_data_lst:
-                executor.submit(
-                    self.get_recording_mfcc,
-                    src_path,
-                    file,
-                    age,
-                    mfcc_features_cnt,
-                    frame_duration=frame_duration,
-                    hop_length=hop_length,
-                )
         self.logger.save_log(
-            f"Wczytano wszystkie probki testowe ({len(self.mfcc_test_clip_data_dict)})"
+            f"Wczytywanie probek uczacych ({len(extraction_configs_lst)} konfiguracji)..."
+        )
+        learn_stores_lst = self._get_files_mfcc(
+            src_path, self.learn_data_lst, seconds_configs_lst
+        )
+        self.logger.save_log(
+            f"Wczytano wszystkie probki uczace ({len(learn_stores_lst[0])})"
         )
+
+        if self.stream_test_samples:
+            test_stores_lst = [
+                FeatureStore.from_lists([], [], [], features_cnt=4 * mfcc_features_cnt)
+                for mfcc_features_cnt, _, _ in seconds_configs_lst
+            ]
+        else:
+            self.logger.save_log("")
+            self.logger.save_log(
+                f"Wczytywanie probek testowyh ({len(extraction_configs_lst)} konfiguracji)..."
+            )
+            test_stores_lst = self._get_files_mfcc(
+                src_path, self.test_data_lst, seconds_configs_lst
+            )
+            self.logger.save_log(
+                f"Wczytano wszystkie probki testowe ({len(test_stores_lst[0])})"
+            )
+
+        # normalizacja wektorow kazdej konfiguracji
+        for config, learn_store, test_store in zip(
+            extraction_configs_lst, learn_stores_lst, test_stores_lst
+        ):
+            self.mfcc_learn_feature_store = learn_store
+            self.mfcc_test_feature_store = test_store
+            self.normalize_mfcc()
+            self.mfcc_feature_stores_by_config_dict[config] = (learn_store, test_store)
+            self.mfcc_min_max_by_config_dict[config] = (
+                self.min_mfcc_arr,
+                self.max_mfcc_arr,
+            )
+
+    def select_extraction_config(self, extraction_config):
+        """
+        Metoda ustawiajaca probki uczace i testowe (mfcc_learn_feature_store,
+        mfcc_test_feature_store) wyznaczone dla danej konfiguracji
+        (ilosc cech MFCC, dlugosc ramki w milisekundach, stopien przeplotu ramek)
+        """
+        self.extraction_config = extraction_config
+        (
+            self.mfcc_learn_feature_store,
+            self.mfcc_test_feature_store,
+        ) = self.mfcc_feature_stores_by_config_dict[extraction_config]
+        self.min_mfcc_arr, self.max_mfcc_arr = self.mfcc_min_max_by_config_dict[
+            extraction_config
+        ]
+
+    def iter_test_mfcc(self, src_path):
+        """
+        Generator wyznaczajacy strumieniowo wektory cech probek testowych dla biezacej konfiguracji.
+        Zwraca paczki probek (FeatureStore) znormalizowanych wartosciami minimalnymi
+        i maksymalnymi zbioru uczacego, od razu po ich wyznaczeniu.
+        Kolejne paczki wysylane sa do procesow roboczych dopiero po odebraniu poprzednich
+        """
+        mfcc_features_cnt, frame_duration_ms, hop_duration = self.extraction_config
+        labels_dict = dict(self.test_data_lst)
+
+        for clips_features_lst in self._iter_clips_features(
+            src_path,
+            [clip for clip, _ in self.test_data_lst],
+            [(mfcc_features_cnt, frame_duration_ms / 1000, hop_duration)],
+            self.pcm_store.store_dir if self.pcm_store else None,
+        ):
+            loaded_clips_lst = []
+            for clip_name, features_lst, error in clips_features_lst:
+                if error is not None:
+                    self.logger.save_log(f"Nie udalo sie wczytac {clip_name}: {error}")
+                    self.failed_clips_lst.append((clip_name, error))
+                    continue
+                loaded_clips_lst.append((clip_name, features_lst[0]))
+
+            test_feature_store = FeatureStore.from_lists(
+                [clip_name for clip_name, _ in loaded_clips_lst],
+                [labels_dict[clip_name] for clip_name, _ in loaded_clips_lst],
+                [feature_arr for _, feature_arr in loaded_clips_lst],
+                features_cnt=4 * mfcc_features_cnt,
+            )
+            test_feature_store.normalize(self.min_mfcc_arr, self.max_mfcc_arr)
+            yield test_feature_store
@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import pandas as pd
+
+# wersja formatu indeksu (zmiana wymusza ponowne odczytanie pliku z danymi o nagraniach)
+METADATA_INDEX_VERSION = 1
+
+# klasy wieku pomijane przy wyborze probek
+EXCLUDED_AGES = ("sixties", "seventies")
+
+
+def get_metadata_index_path(clips_data_path):
+    """
+    Funkcja zwracajaca sciezke indeksu danych o nagraniach (obok pliku z danymi)
+    """
+    return clips_data_path + ".index.npz"
+
+
+def read_clips_metadata(clips_data_path):
+    """
+    Funkcja odczytujaca z pliku TSV jedynie kolumny path i age (wiek jako typ kategoryczny).
+    Zwraca macierz nazw nagran (bajty UTF-8), kody wieku (-1 - brak wieku) i nazwy klas wieku
+    """
+    clips_data_df = pd.read_csv(
+        clips_data_path,
+        sep="\t",
+        usecols=["path", "age"],
+        dtype={"path": str, "age": "category"},
+    )
+    paths_arr = np.array(
+        clips_data_df["path"].str.encode("utf-8").tolist(), dtype=np.bytes_
+    )
+    age_codes_arr = clips_data_df["age"].cat.codes.to_numpy(np.int16)
+    age_names_arr = np.array(clips_data_df["age"].cat.categories, dtype=str)
+    return paths_arr, age_codes_arr, age_names_arr
+
+
+def load_clips_metadata(clips_data_path, use_cache=True):
+    """
+    Funkcja zwracajaca dane o nagraniach (read_clips_metadata). Dla use_cache=True dane
+    zapisywane sa w indeksie NPZ obok pliku z danymi i odczytywane z niego, dopoki rozmiar
+    i czas modyfikacji pliku z danymi sie nie zmienia
+    """
+    clips_data_stat = os.stat(clips_data_path)
+    source_arr = np.array(
+        [METADATA_INDEX_VERSION, clips_data_stat.st_size, clips_data_stat.st_mtime_ns],
+        dtype=np.int64,
+    )
+    index_path = get_metadata_index_path(clips_data_path)
+
+    if use_cache and os.path.exists(index_path):
+        try:
+            with np.load(index_path) as index_npz:
+                if np.array_equal(index_npz["source_arr"], source_arr):
+                    return (
+                        index_npz["paths_arr"],
+                        index_npz["age_codes_arr"],
+                        index_npz["age_names_arr"],
+                    )
+        except (OSError, ValueError, KeyError):
+            pass
+
+    paths_arr, age_codes_arr, age_names_arr = read_clips_metadata(clips_data_path)
+    if use_cache:
+        # zapis przez plik tymczasowy, pominiety jesli katalog nie jest zapisywalny
+        tmp_index_path = index_path + ".tmp"
+        try:
+            with open(tmp_index_path, "wb") as f:
+                np.savez(
+                    f,
+                    source_arr=source_arr,
+                    paths_arr=paths_arr,
+                    age_codes_arr=age_codes_arr,
+                    age_names_arr=age_names_arr,
+                )
+            os.replace(tmp_index_path, index_path)
+        except OSError:
+            pass
+    return paths_arr, age_codes_arr, age_names_arr
+
+
+def get_grouped_sample_idx(
+    label_codes_arr, example_in_class_cnt, learn_data_percentage, seed=None
+):
+    """
+    Funkcja losujaca co najwyzej example_in_class_cnt probek kazdej klasy (kody klas >= 0)
+    i dzielaca je na uczace (learn_data_percentage procent probek klasy) i testowe - jedna
+    wspolna permutacja wszystkich probek i stabilne sortowanie wedlug klasy (seed - ziarno
+    losowania, None - losowanie niepowtarzalne). Zwraca indeksy probek uczacych i testowych
+    (uporzadkowane wedlug kodu klasy) oraz ilosci probek uczacych i testowych kazdej klasy
+    """
+    rng = np.random.default_rng(seed)
+    labels_cnt = int(label_codes_arr.max()) + 1 if len(label_codes_arr) else 0
+
+    # losowa kolejnosc probek w obrebie klasy (losowa permutacja stabilnie posortowana
+    # wedlug klasy) i numer probki w klasie
+    permutation_arr = rng.permutation(len(label_codes_arr))
+    order_arr = permutation_arr[
+        np.argsort(label_codes_arr[permutation_arr], kind="stable")
+    ]
+    order_arr = order_arr[label_codes_arr[order_arr] >= 0]
+    sorted_codes_arr = label_codes_arr[order_arr]
+    class_sizes_arr = np.bincount(sorted_codes_arr, minlength=labels_cnt)
+    class_starts_arr = np.cumsum(class_sizes_arr) - class_sizes_arr
+    rank_arr = np.arange(len(order_arr)) - class_starts_arr[sorted_codes_arr]
+
+    # ilosc wybranych i uczacych probek kazdej klasy
+    selected_cnt_arr = np.minimum(class_sizes_arr, example_in_class_cnt)
+    learn_cnt_arr = np.round(selected_cnt_arr * learn_data_percentage / 100).astype(
+        np.int64
+    )
+
+    learn_mask_arr = rank_arr < learn_cnt_arr[sorted_codes_arr]
+    test_mask_arr = ~learn_mask_arr & (rank_arr < selected_cnt_arr[sorted_codes_arr])
+    return (
+        order_arr[learn_mask_arr],
+        order_arr[test_mask_arr],
+        learn_cnt_arr,
+        selected_cnt_arr - learn_cnt_arr,
+    )
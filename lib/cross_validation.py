@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+from lib.feature_store import as_feature_store
+from lib.knn_index import get_smallest_idx, get_squared_distances
+from lib.knn_threading import KNearestNeighbours, select_information_gain_columns
+from lib.utils import calculate_information_gains
+
+
+class CrossValidator:
+    """
+    Ocena klasyfikatora KNN na jednym zbiorze probek (FeatureStore ze znormalizowanymi cechami)
+    przez stratyfikowana walidacje krzyzowa (folds_cnt podzbiorow) lub powtarzany losowy podzial
+    na probki uczace i testowe - bez ponownego wyznaczania cech.
+    Przyrost informacji (wybor i wagi cech) liczony jest dla kazdego podzialu tylko z probek
+    uczacych, jak w KNearestNeighbours, wiec etykiety probek testowych nie wplywaja na wynik.
+    Dla kazdego podzialu liczona jest macierz kwadratow wazonych odleglosci probek testowych
+    od wszystkich probek, w ktorej kolumny probek testowych sa zamaskowane (lacznie dla
+    wszystkich podzialow walidacji krzyzowej - jedna macierz (ilosc probek)^2)
+    """
+
+    def __init__(self, feature_store, logger, seed=0):
+        self.feature_store = as_feature_store(feature_store)
+        self.logger = logger
+        self.seed = seed
+
+        self.label_codes_arr = self.feature_store.label_codes_arr
+        self.labels_cnt = len(self.feature_store.label_names_arr)
+
+    def get_split_information_gain(self, test_idx_arr):
+        """
+        Metoda zwracajaca przyrost informacji cech liczony z probek uczacych podzialu
+        (wszystkich probek poza test_idx_arr)
+        """
+        learn_mask_arr = np.ones(len(self.label_codes_arr), bool)
+        learn_mask_arr[test_idx_arr] = False
+        return calculate_information_gains(self.feature_store.take(learn_mask_arr))
+
+    def get_split_sq_distances(
+        self,
+        test_idx_arr,
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.0,
+    ):
+        """
+        Metoda zwracajaca macierz kwadratow wazonych odleglosci probek testowych podzialu
+        od wszystkich probek (kolumny probek testowych rowne nieskonczonosci), z wyborem
+        i wagami cech z przyrostu informacji probek uczacych podzialu
+        """
+        if information_gain_as_weight:
+            information_gain = self.get_split_information_gain(test_idx_arr)
+        else:
+            information_gain = np.ones(self.feature_store.features_cnt, np.float32)
+        best_gain_vars_arr, information_gain_arr = select_information_gain_columns(
+            information_gain, information_gain_as_weight, information_gain_threshold
+        )
+        points_arr = self.feature_store.get_features(
+            normalized=normalized_mfcc, columns_arr=best_gain_vars_arr
+        )
+        weighted_points_arr = points_arr * np.sqrt(information_gain_arr)
+        split_sq_distances_arr = get_squared_distances(
+            weighted_points_arr[test_idx_arr], weighted_points_arr
+        )
+
+        # zamaskowanie probek testowych jako sasiadow
+        split_sq_distances_arr[:, test_idx_arr] = np.inf
+        return split_sq_distances_arr
+
+    def get_stratified_folds(self, folds_cnt=5):
+        """
+        Metoda dzielaca probki na folds_cnt podzbiorow o zblizonym udziale kazdej klasy.
+        Zwraca liste indeksow probek testowych kolejnych podzialow
+        """
+        rng = np.random.default_rng(self.seed)
+        fold_arr = np.empty(len(self.label_codes_arr), np.intp)
+        for label_code in range(self.labels_cnt):
+            label_idx_arr = np.flatnonzero(self.label_codes_arr == label_code)
+            rng.shuffle(label_idx_arr)
+            fold_arr[label_idx_arr] = np.arange(len(label_idx_arr)) % folds_cnt
+        return [np.flatnonzero(fold_arr == fold) for fold in range(folds_cnt)]
+
+    def get_holdout_splits(self, learn_percent=80, repeats_cnt=5):
+        """
+        Metoda losujaca repeats_cnt podzialow probek na uczace i testowe (learn_percent procent
+        probek kazdej klasy jako probki uczace, jak w ClipsHandler.get_clips_data).
+        Zwraca liste indeksow probek testowych kolejnych podzialow
+        """
+        rng = np.random.default_rng(self.seed)
+        test_idx_lst = []
+        for _ in range(repeats_cnt):
+            split_test_idx_lst = []
+            for label_code in range(self.labels_cnt):
+                label_idx_arr = rng.permutation(
+                    np.flatnonzero(self.label_codes_arr == label_code)
+                )
+                learn_cnt = int(round(len(label_idx_arr) * learn_percent / 100))
+                split_test_idx_lst.append(label_idx_arr[learn_cnt:])
+            test_idx_lst.append(np.sort(np.concatenate(split_test_idx_lst)))
+        return test_idx_lst
+
+    def predict_split(
+        self,
+        test_idx_arr,
+        k_neighbours_lst=(3,),
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.0,
+    ):
+        """
+        Metoda przewidujaca kody etykiet probek testowych podzialu (test_idx_arr, pozostale
+        probki sa probkami uczacymi) dla kazdej ilosci sasiadow z k_neighbours_lst.
+        Zwraca slownik {ilosc sasiadow: kody przewidzianych etykiet}
+        """
+        k_neighbours_lst = sorted(set(k_neighbours_lst))
+        split_sq_distances_arr = self.get_split_sq_distances(
+            test_idx_arr,
+            normalized_mfcc,
+            information_gain_as_weight,
+            information_gain_threshold,
+        )
+        k_max = min(k_neighbours_lst[-1], len(self.label_codes_arr) - len(test_idx_arr))
+
+        # wybranie sasiadow w kolejnosci rosnacej odleglosci (przy rownych odleglosciach - indeksu)
+        neighbours_idx_arr = get_smallest_idx(split_sq_distances_arr, k_max)
+        neighbours_sq_dist_arr = np.take_along_axis(
+            split_sq_distances_arr, neighbours_idx_arr, axis=1
+        )
+        order_arr = np.lexsort((neighbours_idx_arr, neighbours_sq_dist_arr), axis=1)
+        neighbours_idx_arr = np.take_along_axis(neighbours_idx_arr, order_arr, axis=1)
+        neighbours_sq_dist_arr = np.take_along_axis(
+            neighbours_sq_dist_arr, order_arr, axis=1
+        )
+
+        return KNearestNeighbours.vote_labels_multi_k(
+            np.sqrt(neighbours_sq_dist_arr),
+            self.label_codes_arr[neighbours_idx_arr],
+            k_neighbours_lst,
+            self.labels_cnt,
+        )
+
+    def evaluate_splits(
+        self,
+        test_idx_lst,
+        k_neighbours_lst=(3,),
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.0,
+    ):
+        """
+        Metoda wyznaczajaca poprawnosc klasyfikacji dla kazdego podzialu (indeksy probek testowych
+        z test_idx_lst, pozostale probki sa probkami uczacymi) i kazdej ilosci sasiadow
+        z k_neighbours_lst. Zwraca slownik {ilosc sasiadow: lista (procent poprawnych,
+        poprawne/wszystkie) kolejnych podzialow}
+        """
+        k_neighbours_lst = sorted(set(k_neighbours_lst))
+
+        split_results_dict = {k_neighbours: [] for k_neighbours in k_neighbours_lst}
+        for test_idx_arr in test_idx_lst:
+            label_codes_dict = self.predict_split(
+                test_idx_arr,
+                k_neighbours_lst,
+                normalized_mfcc=normalized_mfcc,
+                information_gain_as_weight=information_gain_as_weight,
+                information_gain_threshold=information_gain_threshold,
+            )
+            for k_neighbours, label_codes_arr in label_codes_dict.items():
+                matched_checks = int(
+                    np.sum(label_codes_arr == self.label_codes_arr[test_idx_arr])
+                )
+                split_results_dict[k_neighbours].append(
+                    (
+                        round(matched_checks / len(test_idx_arr) * 100, 2),
+                        f"{matched_checks}/{len(test_idx_arr)}",
+                    )
+                )
+
+        self._log_split_results(
+            split_results_dict,
+            normalized_mfcc,
+            information_gain_as_weight,
+            information_gain_threshold,
+        )
+        return split_results_dict
+
+    def _log_split_results(
+        self,
+        split_results_dict,
+        normalized_mfcc,
+        information_gain_as_weight,
+        information_gain_threshold,
+    ):
+        """
+        Metoda zapisujaca tabele poprawnosci kolejnych podzialow oraz jej srednia
+        i odchylenie standardowe dla kazdej ilosci sasiadow
+        """
+        summary_df = pd.DataFrame(
+            {
+                f"k={k_neighbours}": [percent for percent, _ in results_lst]
+                for k_neighbours, results_lst in split_results_dict.items()
+            }
+        )
+        summary_df.index = [f"Podzial {i}" for i in range(1, len(summary_df) + 1)]
+        summary_df.loc["Srednia"] = summary_df.mean().round(2)
+        summary_df.loc["Odchylenie standardowe"] = (
+            summary_df.iloc[:-1].std(ddof=1).round(2)
+        )
+
+        self.logger.save_log("")
+        self.logger.save_log(
+            f"Walidacja (cechy znormalizowane: {normalized_mfcc}, przyrost informacji jako waga: "
+            f"{information_gain_as_weight}, prog odciecia: {information_gain_threshold})\n"
+            + summary_df.to_string()
+        )
+
+    def cross_validate(self, folds_cnt=5, k_neighbours_lst=(3,), **func_kwargs):
+        """
+        Metoda stratyfikowanej walidacji krzyzowej (folds_cnt podzialow)
+        """
+        return self.evaluate_splits(
+            self.get_stratified_folds(folds_cnt), k_neighbours_lst, **func_kwargs
+        )
+
+    def holdout_validate(
+        self, learn_percent=80, repeats_cnt=5, k_neighbours_lst=(3,), **func_kwargs
+    ):
+        """
+        Metoda walidacji na repeats_cnt losowych podzialach na probki uczace i testowe
+        """
+        return self.evaluate_splits(
+            self.get_holdout_splits(learn_percent, repeats_cnt),
+            k_neighbours_lst,
+            **func_kwargs,
+        )
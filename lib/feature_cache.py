@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+import numpy as np
+
+
+class FeatureCache:
+    """
+    Trwaly podreczny magazyn wektorow cech nagran na dysku. Wektory zapisywane sa paczkami
+    (shard) jako macierze .npy odczytywane przez mapowanie pamieci, a indeks (index.json)
+    przypisuje kluczowi nagrania plik paczki i wiersz. Klucz zalezy od sciezki, rozmiaru
+    i czasu modyfikacji pliku oraz parametrow wyznaczania cech. Po przekroczeniu rozmiaru
+    max_size_mb usuwane sa najdawniej uzywane paczki (LRU)
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, cache_dir, max_size_mb=1024):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # odczytanie indeksu
+        self.entries_dict = {}
+        self.shards_dict = {}
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index_dict = json.load(f)
+            self.entries_dict = index_dict["entries"]
+            self.shards_dict = index_dict["shards"]
+
+        self._shard_arr_dict = {}
+
+    @staticmethod
+    def get_key(recording_path, mfcc_features_cnt, frame_duration, hop_length, top_db):
+        """
+        Metoda statyczna zwracajaca klucz wektora cech nagrania dla danych parametrow
+        """
+        recording_stat = os.stat(recording_path)
+        key_str = "|".join(
+            str(item)
+            for item in (
+                os.path.abspath(recording_path),
+                recording_stat.st_size,
+                recording_stat.st_mtime_ns,
+                mfcc_features_cnt,
+                frame_duration,
+                hop_length,
+                top_db,
+            )
+        )
+        return hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+
+    def _get_shard_arr(self, shard_name):
+        """
+        Metoda zwracajaca zmapowana w pamieci macierz paczki
+        """
+        if shard_name not in self._shard_arr_dict:
+            self._shard_arr_dict[shard_name] = np.load(
+                os.path.join(self.cache_dir, shard_name), mmap_mode="r"
+            )
+        return self._shard_arr_dict[shard_name]
+
+    def get(self, key):
+        """
+        Metoda zwracajaca wektor cech dla klucza lub None, jesli go nie ma
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys_lst):
+        """
+        Metoda zwracajaca slownik {klucz: wektor cech} dla kluczy obecnych w magazynie
+        """
+        features_dict = {}
+        access_time = time.time()
+        for key in keys_lst:
+            if key not in self.entries_dict:
+                continue
+            shard_name, row = self.entries_dict[key]
+            try:
+                features_dict[key] = np.array(self._get_shard_arr(shard_name)[row])
+            except (OSError, ValueError):
+                # uszkodzona lub usunieta paczka
+                self._remove_shard(shard_name)
+                continue
+            self.shards_dict[shard_name]["last_access"] = access_time
+        return features_dict
+
+    def put_many(self, features_dict):
+        """
+        Metoda zapisujaca slownik {klucz: wektor cech} jako nowa paczke i aktualizujaca indeks
+        """
+        features_dict = {
+            key: arr for key, arr in features_dict.items() if key not in self.entries_dict
+        }
+        if not features_dict:
+            return
+
+        # zapis paczki wektorow o jednakowej dlugosci
+        for feature_len in {len(arr) for arr in features_dict.values()}:
+            keys_lst = [
+                key for key, arr in features_dict.items() if len(arr) == feature_len
+            ]
+            shard_name = f"shard_{uuid.uuid4().hex}.npy"
+            shard_path = os.path.join(self.cache_dir, shard_name)
+            np.save(shard_path, np.stack([features_dict[key] for key in keys_lst]))
+
+            self.shards_dict[shard_name] = {
+                "size": os.path.getsize(shard_path),
+                "last_access": time.time(),
+            }
+            for row, key in enumerate(keys_lst):
+                self.entries_dict[key] = [shard_name, row]
+
+        self._evict()
+        self.save_index()
+
+    def _remove_shard(self, shard_name):
+        """
+        Metoda usuwajaca paczke z dysku i indeksu
+        """
+        self._shard_arr_dict.pop(shard_name, None)
+        self.shards_dict.pop(shard_name, None)
+        self.entries_dict = {
+            key: entry for key, entry in self.entries_dict.items() if entry[0] != shard_name
+        }
+        try:
+            os.remove(os.path.join(self.cache_dir, shard_name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """
+        Metoda usuwajaca najdawniej uzywane paczki, dopoki magazyn przekracza max_size_bytes
+        """
+        total_size = sum(shard["size"] for shard in self.shards_dict.values())
+        for shard_name in sorted(
+            self.shards_dict, key=lambda name: self.shards_dict[name]["last_access"]
+        ):
+            if total_size <= self.max_size_bytes:
+                break
+            total_size -= self.shards_dict[shard_name]["size"]
+            self._remove_shard(shard_name)
+
+    def save_index(self):
+        """
+        Metoda zapisujaca indeks na dysk (przez plik tymczasowy)
+        """
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE_NAME)
+        tmp_index_path = index_path + ".tmp"
+        with open(tmp_index_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries_dict, "shards": self.shards_dict}, f)
+        os.replace(tmp_index_path, index_path)
@@ -0,0 +1,203 @@
+import numpy as np
+
+
+class FeatureStore:
+    """
+    Kolumnowy zbior probek: nazwy nagran (clip_names_arr), etykiety jako kody (label_codes_arr)
+    z tablica nazw etykiet (label_names_arr, posortowana rosnaco) oraz ciagle macierze float32
+    wektorow cech (features_arr) i wektorow znormalizowanych (normalized_features_arr).
+    Wiersz macierzy odpowiada probce, kolumna - cesze
+    """
+
+    def __init__(
+        self,
+        clip_names_arr,
+        label_codes_arr,
+        label_names_arr,
+        features_arr,
+        normalized_features_arr=None,
+    ):
+        self.clip_names_arr = np.asarray(clip_names_arr, dtype=object)
+        self.label_codes_arr = np.asarray(label_codes_arr, dtype=np.intp)
+        self.label_names_arr = np.asarray(label_names_arr)
+        self.features_arr = np.ascontiguousarray(features_arr, dtype=np.float32)
+        self.normalized_features_arr = (
+            np.ascontiguousarray(normalized_features_arr, dtype=np.float32)
+            if normalized_features_arr is not None
+            else None
+        )
+
+    @classmethod
+    def from_lists(cls, clip_names_lst, labels_lst, features_lst, features_cnt=0):
+        """
+        Metoda tworzaca zbior z list nazw nagran, etykiet i wektorow cech
+        (features_cnt - ilosc cech pustego zbioru)
+        """
+        label_names_arr, label_codes_arr = np.unique(
+            np.asarray(labels_lst, dtype=str), return_inverse=True
+        )
+        features_arr = (
+            np.stack(features_lst)
+            if len(features_lst)
+            else np.empty((0, features_cnt), np.float32)
+        )
+        return cls(clip_names_lst, label_codes_arr, label_names_arr, features_arr)
+
+    @classmethod
+    def from_dict(cls, mfcc_clip_data_dict):
+        """
+        Metoda tworzaca zbior ze slownika {nazwa nagrania: {"label", "feature",
+        "normalized_feature"}}
+        """
+        items_lst = list(mfcc_clip_data_dict.values())
+        feature_store = cls.from_lists(
+            list(mfcc_clip_data_dict.keys()),
+            [item["label"] for item in items_lst],
+            [item["feature"] for item in items_lst],
+        )
+        if not items_lst or "normalized_feature" in items_lst[0]:
+            feature_store.normalized_features_arr = np.ascontiguousarray(
+                [item["normalized_feature"] for item in items_lst], dtype=np.float32
+            ).reshape(feature_store.features_arr.shape)
+        return feature_store
+
+    def __len__(self):
+        return len(self.clip_names_arr)
+
+    @property
+    def features_cnt(self):
+        return self.features_arr.shape[1]
+
+    @property
+    def labels_arr(self):
+        """
+        Tablica etykiet probek
+        """
+        return self.label_names_arr[self.label_codes_arr]
+
+    def get_features(self, normalized=False, columns_arr=None):
+        """
+        Metoda zwracajaca macierz wektorow cech (znormalizowanych lub nie), ograniczona
+        do kolumn columns_arr (None - wszystkie kolumny, bez kopiowania)
+        """
+        features_arr = self.normalized_features_arr if normalized else self.features_arr
+        if columns_arr is not None:
+            features_arr = features_arr[:, columns_arr]
+        return features_arr
+
+    def get_min_max(self):
+        """
+        Metoda zwracajaca wartosci minimalne i maksymalne kazdej cechy
+        """
+        return self.features_arr.min(axis=0), self.features_arr.max(axis=0)
+
+    def normalize(self, min_values_arr, max_values_arr, columns_arr=None):
+        """
+        Metoda wyznaczajaca znormalizowane wektory cech dla podanych wartosci minimalnych
+        i maksymalnych kazdej cechy (columns_arr - tylko wybrane kolumny, pozostale bez zmian)
+        """
+        if columns_arr is None or self.normalized_features_arr is None:
+            self.normalized_features_arr = (self.features_arr - min_values_arr) / (
+                max_values_arr - min_values_arr
+            )
+            return
+
+        normalized_features_arr = self.normalized_features_arr.copy()
+        normalized_features_arr[:, columns_arr] = (
+            self.features_arr[:, columns_arr] - min_values_arr[columns_arr]
+        ) / (max_values_arr[columns_arr] - min_values_arr[columns_arr])
+        self.normalized_features_arr = normalized_features_arr
+
+    def copy(self):
+        """
+        Metoda zwracajaca kopie zbioru, ktorej normalizacja nie zmienia oryginalu
+        (macierze sa wspoldzielone - normalize przypisuje nowe macierze zamiast zmieniac je
+        w miejscu)
+        """
+        return FeatureStore(
+            self.clip_names_arr,
+            self.label_codes_arr,
+            self.label_names_arr,
+            self.features_arr,
+            self.normalized_features_arr,
+        )
+
+    def get_rows(self, clip_names_lst):
+        """
+        Metoda zwracajaca indeksy wierszy probek o podanych nazwach nagran
+        """
+        return np.flatnonzero(
+            np.isin(self.clip_names_arr, np.asarray(clip_names_lst, dtype=object))
+        )
+
+    def take(self, rows_arr):
+        """
+        Metoda zwracajaca zbior wybranych probek (wiersze rows_arr)
+        """
+        return FeatureStore(
+            self.clip_names_arr[rows_arr],
+            self.label_codes_arr[rows_arr],
+            self.label_names_arr,
+            self.features_arr[rows_arr],
+            (
+                self.normalized_features_arr[rows_arr]
+                if self.normalized_features_arr is not None
+                else None
+            ),
+        )
+
+    def concatenate(self, other):
+        """
+        Metoda zwracajaca zbior probek obu zbiorow (kody etykiet przeliczane
+        na wspolna tablice nazw etykiet)
+        """
+        label_names_arr = np.union1d(self.label_names_arr, other.label_names_arr)
+        label_codes_arr = np.concatenate(
+            [
+                np.searchsorted(label_names_arr, store.labels_arr)
+                for store in (self, other)
+            ]
+        ).astype(np.intp)
+        normalized_features_arr = None
+        if (
+            self.normalized_features_arr is not None
+            and other.normalized_features_arr is not None
+        ):
+            normalized_features_arr = np.concatenate(
+                [self.normalized_features_arr, other.normalized_features_arr]
+            )
+        return FeatureStore(
+            np.concatenate([self.clip_names_arr, other.clip_names_arr]),
+            label_codes_arr,
+            label_names_arr,
+            np.concatenate([self.features_arr, other.features_arr]),
+            normalized_features_arr,
+        )
+
+    def to_dict(self):
+        """
+        Metoda zwracajaca probki jako slownik {nazwa nagrania: {"label", "feature",
+        "normalized_feature"}}
+        """
+        mfcc_clip_data_dict = {}
+        for i, (clip_name, label) in enumerate(
+            zip(self.clip_names_arr.tolist(), self.labels_arr.tolist())
+        ):
+            mfcc_clip_data_dict[clip_name] = {
+                "label": label,
+                "feature": self.features_arr[i],
+            }
+            if self.normalized_features_arr is not None:
+                mfcc_clip_data_dict[clip_name]["normalized_feature"] = (
+                    self.normalized_features_arr[i]
+                )
+        return mfcc_clip_data_dict
+
+
+def as_feature_store(samples):
+    """
+    Funkcja zwracajaca zbior probek jako FeatureStore (slowniki probek sa konwertowane)
+    """
+    if isinstance(samples, FeatureStore):
+        return samples
+    return FeatureStore.from_dict(samples)
@@ -0,0 +1,355 @@
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import os
+import time
+from lib.clip_handler import ClipsHandler
+from lib.feature_cache import FeatureCache
+from lib.knn_threading import KNearestNeighbours
+from lib.logger import SilentLogger
+from lib.results_store import ResultsStore
+from lib.thread_limits import get_worker_threads_cnt, limit_worker_threads
+
+user_input = namedtuple(
+    "user_input",
+    [
+        "number_of_examples",
+        "percent_to_learn",
+        "number_of_features",
+        "frame_duration_ms",
+        "hop_duration",
+    ],
+)
+
+# argumenty ClipsHandler okreslajace jedynie sposob wykonania (nie wplywaja na wyniki,
+# wiec nie sa czescia klucza wyniku)
+EXECUTION_KWARGS_NAMES = (
+    "workers_cnt",
+    "cores_cnt",
+    "extraction_backend",
+    "chunk_size",
+    "pcm_store",
+    "profiler",
+)
+
+
+def _classify_extraction_node(
+    learn_feature_store, test_feature_store, classifier_groups_lst
+):
+    """
+    Funkcja procesu roboczego klasyfikujaca probki testowe jednej konfiguracji ekstrakcji
+    dla kazdej grupy (argumenty klasyfikatora, lista ilosci sasiadow) - jedno wyszukiwanie
+    sasiadow na grupe. Zwraca liste (argumenty klasyfikatora, ilosc sasiadow, rodzaj testu,
+    procent poprawnych, poprawne/wszystkie, czas)
+    """
+    knn_model = KNearestNeighbours(
+        learn_feature_store, test_feature_store, SilentLogger()
+    )
+    results_lst = []
+    for func_kwargs, k_neighbours_lst in classifier_groups_lst:
+        start_time = time.perf_counter()
+        summaries_dict = knn_model.get_all_test_points_labels_multi_k(
+            k_neighbours_lst=k_neighbours_lst, **func_kwargs
+        )
+        seconds = time.perf_counter() - start_time
+        for k_neighbours, summary in summaries_dict.items():
+            test_type, percent_guessed, guesses = summary[:3]
+            results_lst.append(
+                (func_kwargs, k_neighbours, test_type, percent_guessed, guesses, seconds)
+            )
+    return results_lst
+
+
+class GridRunner:
+    """
+    Przeglad siatki parametrow testow zaplanowany jako graf zaleznosci:
+    losowanie probek (ilosc przykladow, procent uczacy, powtorzenie) -> wyznaczenie cech dla
+    konfiguracji ekstrakcji (ilosc cech MFCC, dlugosc ramki w milisekundach, stopien przeplotu)
+    -> klasyfikacja dla argumentow klasyfikatora i ilosci sasiadow.
+
+    Wspolna praca jest wykonywana raz: losowanie raz dla wszystkich konfiguracji ekstrakcji,
+    cechy wszystkich konfiguracji losowania z jednego dekodowania nagran, cechy nagran wspolnych
+    dla roznych losowan odczytywane z magazynu cech (FeatureCache), a klasyfikacje jednej
+    konfiguracji ekstrakcji z jednego modelu i jednego wyszukiwania max(k) sasiadow.
+    Klasyfikacje wykonywane sa w workers_cnt procesach roboczych rownolegle z wyznaczaniem cech
+    kolejnych losowan, a kazdy wynik zapisywany jest od razu w magazynie wynikow (ResultsStore).
+    Ponowne uruchomienie pomija zapisane wyniki (losowania sa powtarzalne - ziarno seed + powtorzenie),
+    a klucz wyniku obejmuje rowniez rozmiar i czas modyfikacji pliku z danymi nagran oraz argumenty
+    ClipsHandler wplywajace na cechy (np. top_db).
+    Przy workers_cnt > 1 rdzenie procesora dzielone sa miedzy warstwy: workers_cnt rdzeni dla
+    procesow klasyfikacji, pozostale (co najmniej 1) dla procesow wyznaczania cech
+    """
+
+    def __init__(
+        self,
+        logger,
+        clip_data_csv,
+        clips_path,
+        results_db_path,
+        workers_cnt=1,
+        feature_cache=None,
+        seed=0,
+        clips_handler_kwargs=None,
+    ):
+        self.logger = logger
+        self.clip_data_csv = clip_data_csv
+        self.clips_path = clips_path
+        self.results_store = ResultsStore(results_db_path)
+        self.workers_cnt = workers_cnt
+        self.seed = seed
+        self.clips_handler_kwargs = clips_handler_kwargs or {}
+
+        # magazyn cech (domyslnie obok bazy wynikow) - cechy nagran wspolnych dla losowan
+        # wyznaczane sa raz, rowniez pomiedzy wznowieniami przegladu
+        self.feature_cache = (
+            feature_cache
+            if feature_cache is not None
+            else FeatureCache(os.path.splitext(results_db_path)[0] + "_feature_cache")
+        )
+
+    def plan(
+        self,
+        examples_cnt_lst,
+        learn_percent_lst,
+        extraction_configs_lst,
+        classifier_options_lst,
+        k_neighbours_lst=(3,),
+        repeats_cnt=1,
+    ):
+        """
+        Metoda planujaca graf przegladu. Zwraca liste kluczy wszystkich wynikow siatki oraz liste
+        losowan z niezakonczonymi klasyfikacjami: [(parametry losowania, [(konfiguracja ekstrakcji,
+        [(argumenty klasyfikatora, lista niezakonczonych ilosci sasiadow)])])]
+        """
+        finished_keys_set = self.results_store.get_finished_keys()
+        extraction_configs_lst = list(dict.fromkeys(extraction_configs_lst))
+        clip_data_stat = os.stat(self.clip_data_csv)
+        extraction_kwargs_dict = {
+            name: value
+            for name, value in self.clips_handler_kwargs.items()
+            if name not in EXECUTION_KWARGS_NAMES
+        }
+        k_neighbours_lst = sorted(set(k_neighbours_lst))
+
+        keys_lst = []
+        sample_nodes_lst = []
+        for examples_cnt in examples_cnt_lst:
+            for learn_percent in learn_percent_lst:
+                for repeat in range(repeats_cnt):
+                    sample_params_dict = {
+                        "clip_data_csv": os.path.abspath(self.clip_data_csv),
+                        # zmiana pliku z danymi nagran uniewaznia zapisane wyniki
+                        "clip_data_csv_size": clip_data_stat.st_size,
+                        "clip_data_csv_mtime_ns": clip_data_stat.st_mtime_ns,
+                        "clips_handler_kwargs": extraction_kwargs_dict,
+                        "number_of_examples": examples_cnt,
+                        "percent_to_learn": learn_percent,
+                        "repeat": repeat,
+                        "seed": self.seed + repeat,
+                        # sposob losowania (ten sam seed w innym sposobie - inne probki)
+                        "sampling": "grouped_permutation",
+                    }
+                    extraction_nodes_lst = []
+                    for extraction_config in extraction_configs_lst:
+                        classifier_groups_lst = []
+                        for func_kwargs in classifier_options_lst:
+                            pending_k_lst = []
+                            for k_neighbours in k_neighbours_lst:
+                                key = ResultsStore.get_key(
+                                    self.get_result_params(
+                                        sample_params_dict,
+                                        extraction_config,
+                                        func_kwargs,
+                                        k_neighbours,
+                                    )
+                                )
+                                keys_lst.append(key)
+                                if key not in finished_keys_set:
+                                    pending_k_lst.append(k_neighbours)
+                            if pending_k_lst:
+                                classifier_groups_lst.append((func_kwargs, pending_k_lst))
+                        if classifier_groups_lst:
+                            extraction_nodes_lst.append(
+                                (extraction_config, classifier_groups_lst)
+                            )
+                    if extraction_nodes_lst:
+                        sample_nodes_lst.append((sample_params_dict, extraction_nodes_lst))
+
+        pending_cnt = sum(
+            len(k_lst)
+            for _, extraction_nodes_lst in sample_nodes_lst
+            for _, classifier_groups_lst in extraction_nodes_lst
+            for _, k_lst in classifier_groups_lst
+        )
+        self.logger.save_log("")
+        self.logger.save_log(
+            f"Siatka parametrow: {len(keys_lst)} testow, zakonczone {len(keys_lst) - pending_cnt}, "
+            f"do wykonania {pending_cnt} ({len(sample_nodes_lst)} losowan, "
+            f"{sum(len(nodes_lst) for _, nodes_lst in sample_nodes_lst)} wyznaczen cech)"
+        )
+        return keys_lst, sample_nodes_lst
+
+    @staticmethod
+    def get_result_params(
+        sample_params_dict, extraction_config, func_kwargs, k_neighbours
+    ):
+        """
+        Metoda statyczna zwracajaca slownik parametrow wyniku (klucz w magazynie wynikow)
+        """
+        number_of_features, frame_duration_ms, hop_duration = extraction_config
+        return {
+            **sample_params_dict,
+            "number_of_features": number_of_features,
+            "frame_duration_ms": frame_duration_ms,
+            "hop_duration": hop_duration,
+            **func_kwargs,
+            "k_neighbours": k_neighbours,
+        }
+
+    def run(
+        self,
+        examples_cnt_lst,
+        learn_percent_lst,
+        extraction_configs_lst,
+        classifier_options_lst,
+        k_neighbours_lst=(3,),
+        repeats_cnt=1,
+    ):
+        """
+        Metoda wykonujaca niezakonczone testy siatki parametrow. Zwraca tabele wynikow
+        wszystkich testow siatki (rowniez zapisanych wczesniej)
+        """
+        keys_lst, sample_nodes_lst = self.plan(
+            examples_cnt_lst,
+            learn_percent_lst,
+            extraction_configs_lst,
+            classifier_options_lst,
+            k_neighbours_lst=k_neighbours_lst,
+            repeats_cnt=repeats_cnt,
+        )
+
+        # podzial rdzeni miedzy procesy klasyfikacji (workers_cnt rdzeni) i wyznaczane
+        # w tym czasie cechy kolejnych losowan (pozostale rdzenie), watki BLAS procesow
+        # roboczych ograniczone do udzialu w rdzeniach swojej warstwy
+        executor = None
+        extraction_kwargs_dict = {}
+        if self.workers_cnt > 1:
+            cpu_cnt = os.cpu_count() or 1
+            classification_cores_cnt = min(self.workers_cnt, cpu_cnt)
+            extraction_cores_cnt = max(1, cpu_cnt - classification_cores_cnt)
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers_cnt,
+                initializer=limit_worker_threads,
+                initargs=(
+                    get_worker_threads_cnt(self.workers_cnt, classification_cores_cnt),
+                ),
+            )
+            extraction_kwargs_dict = {
+                "workers_cnt": extraction_cores_cnt,
+                "cores_cnt": extraction_cores_cnt,
+            }
+        futures_dict = {}
+        try:
+            for sample_params_dict, extraction_nodes_lst in sample_nodes_lst:
+                self.logger.save_log("")
+                self.logger.save_log(
+                    f"Losowanie: {sample_params_dict['number_of_examples']} przykladow, "
+                    f"{sample_params_dict['percent_to_learn']}% uczacych, "
+                    f"powtorzenie {sample_params_dict['repeat']}"
+                )
+
+                # jedno losowanie i wyznaczenie cech wszystkich niezakonczonych konfiguracji
+                pending_configs_lst = [config for config, _ in extraction_nodes_lst]
+                clip_handler = ClipsHandler(
+                    self.logger,
+                    user_input(
+                        sample_params_dict["number_of_examples"],
+                        sample_params_dict["percent_to_learn"],
+                        *pending_configs_lst[0],
+                    ),
+                    self.clip_data_csv,
+                    self.clips_path,
+                    feature_cache=self.feature_cache,
+                    extraction_configs_lst=pending_configs_lst,
+                    seed=sample_params_dict["seed"],
+                    **{**extraction_kwargs_dict, **self.clips_handler_kwargs},
+                )
+
+                for extraction_config, classifier_groups_lst in extraction_nodes_lst:
+                    clip_handler.select_extraction_config(extraction_config)
+                    node_args = (
+                        clip_handler.mfcc_learn_feature_store,
+                        clip_handler.mfcc_test_feature_store,
+                        classifier_groups_lst,
+                    )
+                    node = (sample_params_dict, extraction_config)
+                    if executor is None:
+                        self._save_node_results(
+                            node, _classify_extraction_node(*node_args)
+                        )
+                    else:
+                        futures_dict[
+                            executor.submit(_classify_extraction_node, *node_args)
+                        ] = node
+
+                # zapis wynikow klasyfikacji zakonczonych w trakcie wyznaczania cech
+                self._save_finished_futures(futures_dict, block=False)
+
+            self._save_finished_futures(futures_dict, block=True)
+        finally:
+            if executor is not None:
+                # zapis wynikow zakonczonych klasyfikacji rowniez przy przerwaniu przegladu
+                self._save_finished_futures(futures_dict, block=False)
+                executor.shutdown(cancel_futures=True)
+
+        results_df = self.results_store.get_results_df(keys_lst)
+        self.logger.save_log("")
+        self.logger.save_log(f"Zakonczono przeglad siatki ({len(results_df)} wynikow)")
+        return results_df
+
+    def _save_finished_futures(self, futures_dict, block):
+        """
+        Metoda zapisujaca wyniki zakonczonych klasyfikacji procesow roboczych
+        (block=True - oczekiwanie na wszystkie klasyfikacje)
+        """
+        while futures_dict:
+            done_futures_set, _ = wait(
+                futures_dict,
+                timeout=None if block else 0,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done_futures_set:
+                return
+            for future in done_futures_set:
+                node = futures_dict.pop(future)
+                if future.cancelled():
+                    continue
+                error = future.exception()
+                if error is not None:
+                    self.logger.save_log(
+                        f"Nie udalo sie wykonac klasyfikacji {node[1]}: {error}"
+                    )
+                    continue
+                self._save_node_results(node, future.result())
+
+    def _save_node_results(self, node, node_results_lst):
+        """
+        Metoda zapisujaca wyniki klasyfikacji jednej konfiguracji ekstrakcji w magazynie wynikow
+        """
+        sample_params_dict, extraction_config = node
+        self.results_store.add_results(
+            [
+                (
+                    self.get_result_params(
+                        sample_params_dict, extraction_config, func_kwargs, k_neighbours
+                    ),
+                    test_type,
+                    percent_guessed,
+                    guesses,
+                    seconds,
+                )
+                for func_kwargs, k_neighbours, test_type, percent_guessed, guesses, seconds in node_results_lst
+            ]
+        )
+        self.logger.save_log(
+            f"Zapisano {len(node_results_lst)} wynikow dla konfiguracji {extraction_config}"
+        )
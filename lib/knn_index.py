@@ -0,0 +1,245 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# maksymalny wymiar wektora cech, dla ktorego drzewo moze byc szybsze niz przeszukiwanie pelne
+KD_TREE_MAX_DIM = 20
+
+
+def choose_search_algorithm(features_cnt, learn_samples_cnt):
+    """
+    Funkcja wybierajaca sposob przeszukiwania probek uczacych ("brute" lub "kd_tree").
+    Drzewo oplaca sie tylko dla malego wymiaru i gdy probek jest wiecej niz 2^wymiar
+    (kazda os jest dzielona co najmniej raz), w pozostalych przypadkach przeszukiwanie
+    drzewa odwiedza prawie wszystkie liscie i jest wolniejsze niz mnozenie macierzy
+    """
+    if features_cnt <= KD_TREE_MAX_DIM and learn_samples_cnt >= 2**features_cnt:
+        return "kd_tree"
+    return "brute"
+
+
+class KDTreeIndex:
+    """
+    Dokladny indeks przestrzenny (KD-drzewo) probek uczacych. Przyrost informacji jako waga
+    odleglosci uwzgledniony jest przez przeskalowanie osi o pierwiastek z wagi
+    """
+
+    def __init__(self, learn_points_arr, information_gain=None):
+        if information_gain is None:
+            information_gain = np.ones(learn_points_arr.shape[1], np.float32)
+        self.axis_scale_arr = np.sqrt(np.asarray(information_gain, np.float64))
+        self.learn_samples_cnt = learn_points_arr.shape[0]
+        self.tree = cKDTree(learn_points_arr * self.axis_scale_arr)
+
+    def query(self, test_points_arr, k_neighbours):
+        """
+        Metoda zwracajaca odleglosci i indeksy k najblizszych probek uczacych dla bloku probek
+        testowych, w kolejnosci rosnacej odleglosci (przy rownych odleglosciach - indeksu)
+        """
+        k_neighbours = min(k_neighbours, self.learn_samples_cnt)
+        neighbours_dist_arr, neighbours_idx_arr = self.tree.query(
+            test_points_arr * self.axis_scale_arr, k=np.arange(1, k_neighbours + 1)
+        )
+
+        # posortowanie sasiadow wedlug odleglosci, a nastepnie indeksu
+        order_arr = np.lexsort((neighbours_idx_arr, neighbours_dist_arr), axis=1)
+        return (
+            np.take_along_axis(neighbours_dist_arr, order_arr, axis=1),
+            np.take_along_axis(neighbours_idx_arr, order_arr, axis=1),
+        )
+
+
+def get_squared_distances(test_points_arr, learn_points_arr):
+    """
+    Funkcja zwracajaca macierz kwadratow odleglosci euklidesowych miedzy probkami testowymi
+    i uczacymi w postaci ||a||^2 + ||b||^2 - 2ab
+    """
+    sq_distances_arr = test_points_arr @ learn_points_arr.T
+    sq_distances_arr *= -2
+    sq_distances_arr += np.einsum("ij,ij->i", test_points_arr, test_points_arr)[:, None]
+    sq_distances_arr += np.einsum("ij,ij->i", learn_points_arr, learn_points_arr)[
+        None, :
+    ]
+    return np.maximum(sq_distances_arr, 0, out=sq_distances_arr)
+
+
+def get_smallest_idx(values_arr, k_smallest):
+    """
+    Funkcja zwracajaca dla kazdego wiersza indeksy (bez sortowania) k najmniejszych wartosci
+    """
+    if k_smallest == 1:
+        return np.argmin(values_arr, axis=1)[:, None]
+    if k_smallest < values_arr.shape[1]:
+        return np.argpartition(values_arr, k_smallest - 1, axis=1)[:, :k_smallest]
+    return np.broadcast_to(np.arange(values_arr.shape[1]), values_arr.shape)
+
+
+def get_block_sizes(
+    test_samples_cnt, learn_samples_cnt, k_neighbours, max_block_bytes, itemsize=4
+):
+    """
+    Funkcja zwracajaca ilosc probek testowych i uczacych w jednym bloku macierzy odleglosci
+    tak, aby blok zajmowal co najwyzej max_block_bytes (None - jeden blok). Pierwszenstwo
+    maja bloki o wszystkich probkach testowych, a blok probek uczacych obejmuje co najmniej
+    2k probek (laczenie k najlepszych z kolejnych blokow)
+    """
+    if max_block_bytes is None:
+        return test_samples_cnt, learn_samples_cnt
+    block_elements_cnt = max(1, max_block_bytes // itemsize)
+    learn_block_size = min(
+        learn_samples_cnt,
+        max(2 * k_neighbours, block_elements_cnt // max(1, test_samples_cnt)),
+    )
+    test_block_size = min(
+        test_samples_cnt, max(1, block_elements_cnt // max(1, learn_block_size))
+    )
+    return test_block_size, learn_block_size
+
+
+def get_nearest_centroids(points_arr, centroids_arr, centroids_cnt, chunk_size=65536):
+    """
+    Funkcja zwracajaca indeksy (centroids_cnt) najblizszych centroidow dla kazdej probki,
+    liczone blokami po chunk_size probek
+    """
+    nearest_centroids_lst = []
+    for start in range(0, len(points_arr), chunk_size):
+        sq_distances_arr = get_squared_distances(
+            points_arr[start : start + chunk_size], centroids_arr
+        )
+        nearest_centroids_lst.append(get_smallest_idx(sq_distances_arr, centroids_cnt))
+    return np.concatenate(nearest_centroids_lst, axis=0)
+
+
+class IVFIndex:
+    """
+    Przyblizony indeks probek uczacych (IVF): probki dzielone sa algorytmem k-srednich na
+    lists_cnt list, a dla probki testowej przeszukiwane sa tylko probki z probes_cnt list
+    o najblizszych centroidach. Wiecej przeszukiwanych list - wieksza dokladnosc (recall)
+    kosztem czasu. Przyrost informacji jako waga odleglosci uwzgledniony jest przez
+    przeskalowanie osi o pierwiastek z wagi
+    """
+
+    def __init__(
+        self,
+        learn_points_arr,
+        information_gain=None,
+        lists_cnt=None,
+        probes_cnt=8,
+        kmeans_iterations=10,
+        kmeans_samples_per_list=64,
+        seed=0,
+    ):
+        if information_gain is None:
+            information_gain = np.ones(learn_points_arr.shape[1], np.float32)
+        self.axis_scale_arr = np.sqrt(np.asarray(information_gain, np.float32))
+        scaled_learn_arr = np.ascontiguousarray(
+            learn_points_arr * self.axis_scale_arr, np.float32
+        )
+        self.learn_samples_cnt = len(scaled_learn_arr)
+
+        # domyslnie pierwiastek z ilosci probek list
+        if lists_cnt is None:
+            lists_cnt = int(round(np.sqrt(self.learn_samples_cnt)))
+        lists_cnt = max(1, min(lists_cnt, self.learn_samples_cnt))
+        self.probes_cnt = max(1, min(probes_cnt, lists_cnt))
+
+        # wyznaczenie centroidow list algorytmem k-srednich na podzbiorze probek
+        rng = np.random.default_rng(seed)
+        train_arr = scaled_learn_arr[
+            rng.choice(
+                self.learn_samples_cnt,
+                min(self.learn_samples_cnt, lists_cnt * kmeans_samples_per_list),
+                replace=False,
+            )
+        ]
+        self.centroids_arr = train_arr[:lists_cnt].copy()
+        for _ in range(kmeans_iterations):
+            assignment_arr = get_nearest_centroids(train_arr, self.centroids_arr, 1)[:, 0]
+            order_arr = np.argsort(assignment_arr, kind="stable")
+            list_sizes_arr = np.bincount(assignment_arr, minlength=lists_cnt)
+
+            # centroidy pustych list pozostaja bez zmian
+            not_empty_arr = list_sizes_arr > 0
+            centroid_sums_arr = np.add.reduceat(
+                train_arr[order_arr].astype(np.float64),
+                (np.cumsum(list_sizes_arr) - list_sizes_arr)[not_empty_arr],
+                axis=0,
+            )
+            self.centroids_arr[not_empty_arr] = (
+                centroid_sums_arr / list_sizes_arr[not_empty_arr, None]
+            )
+        assignment_arr = get_nearest_centroids(scaled_learn_arr, self.centroids_arr, 1)[
+            :, 0
+        ]
+
+        # ulozenie probek kolejnymi listami
+        self.learn_idx_arr = np.argsort(assignment_arr, kind="stable")
+        self.sorted_learn_arr = scaled_learn_arr[self.learn_idx_arr]
+        self.list_offsets_arr = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignment_arr, minlength=lists_cnt))]
+        )
+
+    def query(self, test_points_arr, k_neighbours):
+        """
+        Metoda zwracajaca odleglosci i indeksy k najblizszych probek uczacych (sposrod
+        przeszukanych list) dla bloku probek testowych, w kolejnosci rosnacej odleglosci
+        """
+        k_neighbours = min(k_neighbours, self.learn_samples_cnt)
+        scaled_test_arr = np.ascontiguousarray(
+            test_points_arr * self.axis_scale_arr, np.float32
+        )
+        probes_arr = get_nearest_centroids(
+            scaled_test_arr, self.centroids_arr, self.probes_cnt
+        )
+
+        # przeszukanie kolejnych list dla probek testowych, ktore je wybraly
+        best_sq_dist_arr = np.full((len(scaled_test_arr), k_neighbours), np.inf)
+        best_idx_arr = np.full((len(scaled_test_arr), k_neighbours), -1)
+        for list_idx in np.unique(probes_arr):
+            start, end = self.list_offsets_arr[list_idx : list_idx + 2]
+            if start == end:
+                continue
+            test_idx_arr = np.flatnonzero((probes_arr == list_idx).any(axis=1))
+            candidates_sq_dist_arr = np.concatenate(
+                [
+                    best_sq_dist_arr[test_idx_arr],
+                    get_squared_distances(
+                        scaled_test_arr[test_idx_arr], self.sorted_learn_arr[start:end]
+                    ),
+                ],
+                axis=1,
+            )
+            candidates_idx_arr = np.concatenate(
+                [
+                    best_idx_arr[test_idx_arr],
+                    np.broadcast_to(
+                        self.learn_idx_arr[start:end], (len(test_idx_arr), end - start)
+                    ),
+                ],
+                axis=1,
+            )
+            top_arr = get_smallest_idx(candidates_sq_dist_arr, k_neighbours)
+            best_sq_dist_arr[test_idx_arr] = np.take_along_axis(
+                candidates_sq_dist_arr, top_arr, axis=1
+            )
+            best_idx_arr[test_idx_arr] = np.take_along_axis(
+                candidates_idx_arr, top_arr, axis=1
+            )
+
+        # uzupelnienie przeszukaniem pelnym, gdy w wybranych listach bylo za malo probek
+        missing_arr = np.flatnonzero((best_idx_arr < 0).any(axis=1))
+        if len(missing_arr):
+            sq_distances_arr = get_squared_distances(
+                scaled_test_arr[missing_arr], self.sorted_learn_arr
+            )
+            top_arr = get_smallest_idx(sq_distances_arr, k_neighbours)
+            best_sq_dist_arr[missing_arr] = np.take_along_axis(
+                sq_distances_arr, top_arr, axis=1
+            )
+            best_idx_arr[missing_arr] = self.learn_idx_arr[top_arr]
+
+        # posortowanie sasiadow wedlug odleglosci, a nastepnie indeksu
+        order_arr = np.lexsort((best_idx_arr, best_sq_dist_arr), axis=1)
+        return (
+            np.sqrt(np.take_along_axis(best_sq_dist_arr, order_arr, axis=1)),
+            np.take_along_axis(best_idx_arr, order_arr, axis=1),
+        )
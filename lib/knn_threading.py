@@ -1,23 +1,568 @@
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import time
 import numpy as np
-from copy import deepcopy
 import pandas as pd
-from lib.utils import calculate_information_gains
+from lib.feature_store import FeatureStore, as_feature_store
+from lib.learn_statistics import LearnSetStatistics
+from lib.model_artifact import load_model_artifact, save_model_artifact
+from lib.profiler import StageProfiler, profile_stage
+from lib.shared_arrays import attach_shared_array, create_shared_array
+from lib.thread_limits import get_worker_threads_cnt, limit_worker_threads
+from lib.utils import (
+    calculate_information_gains,
+    dequantize_features,
+    get_normalization_coefficients,
+    quantize_features,
+)
+from lib.knn_index import (
+    IVFIndex,
+    KDTreeIndex,
+    choose_search_algorithm,
+    get_block_sizes,
+    get_smallest_idx,
+)
+
+# rozmiar bloku macierzy odleglosci dla skwantyzowanych probek uczacych bez ograniczenia
+# rozmiaru bloku (max_block_bytes=None) - blok probek uczacych zamieniany na float32 naraz
+QUANTIZED_MAX_BLOCK_BYTES = 16 * 2**20
+
+# stan procesu roboczego klasyfikacji rownoleglej (macierze w pamieci wspoldzielonej)
+_worker_state_dict = {}
+
+
+def _init_labels_worker(
+    test_points_spec,
+    learn_points_spec,
+    learn_label_codes_spec,
+    labels_cnt,
+    information_gain_arr,
+    search_index,
+    max_block_bytes,
+    threads_cnt,
+):
+    """
+    Funkcja inicjalizujaca proces roboczy klasyfikacji rownoleglej: ograniczenie watkow BLAS
+    do threads_cnt i otwarcie macierzy probek testowych, uczacych i kodow etykiet z pamieci
+    wspoldzielonej bez kopiowania
+    """
+    limit_worker_threads(threads_cnt)
+    shm_lst = []
+    for key, array_spec in (
+        ("test_points_arr", test_points_spec),
+        ("learn_points_arr", learn_points_spec),
+        ("learn_label_codes_arr", learn_label_codes_spec),
+    ):
+        shm, arr = attach_shared_array(array_spec)
+        shm_lst.append(shm)
+        _worker_state_dict[key] = arr
+    _worker_state_dict["shm_lst"] = shm_lst
+    _worker_state_dict["labels_cnt"] = labels_cnt
+    _worker_state_dict["information_gain_arr"] = information_gain_arr
+    _worker_state_dict["search_index"] = search_index
+    _worker_state_dict["max_block_bytes"] = max_block_bytes
+
+
+def _get_chunk_label_codes(start, end, k_neighbours_lst, leave_one_out):
+    """
+    Funkcja klasyfikacji probek testowych start:end w procesie roboczym.
+    Zwraca slownik {ilosc sasiadow: kody etykiet}
+    """
+    test_points_arr = _worker_state_dict["test_points_arr"][start:end]
+    exclude_idx_arr = np.arange(start, end) if leave_one_out else None
+    if _worker_state_dict["search_index"] is None:
+        neighbours_dist_arr, neighbours_idx_arr = (
+            KNearestNeighbours.get_nearest_neighbours(
+                test_points_arr,
+                _worker_state_dict["learn_points_arr"],
+                max(k_neighbours_lst),
+                _worker_state_dict["information_gain_arr"],
+                exclude_idx_arr=exclude_idx_arr,
+                max_block_bytes=_worker_state_dict["max_block_bytes"],
+            )
+        )
+    else:
+        neighbours_dist_arr, neighbours_idx_arr = (
+            KNearestNeighbours.query_search_index(
+                _worker_state_dict["search_index"],
+                dequantize_features(test_points_arr),
+                max(k_neighbours_lst),
+                exclude_idx_arr,
+            )
+        )
+    return KNearestNeighbours.vote_labels_multi_k(
+        neighbours_dist_arr,
+        _worker_state_dict["learn_label_codes_arr"][neighbours_idx_arr],
+        k_neighbours_lst,
+        _worker_state_dict["labels_cnt"],
+    )
+
+
+def _get_chunk_label_codes_profiled(start, end, k_neighbours_lst, leave_one_out):
+    """
+    Funkcja _get_chunk_label_codes z pomiarem czasu klasyfikacji bloku w procesie roboczym.
+    Zwraca krotke (wynik _get_chunk_label_codes, dane profilera do dolaczenia w procesie glownym)
+    """
+    profiler = StageProfiler()
+    with profiler.stage("klasyfikacja bloku", items=end - start):
+        label_codes_dict = _get_chunk_label_codes(
+            start, end, k_neighbours_lst, leave_one_out
+        )
+    return label_codes_dict, profiler.get_data()
+
+
+def select_information_gain_columns(
+    information_gain, information_gain_as_weight=True, information_gain_threshold=0.000
+):
+    """
+    Funkcja zwracajaca indeksy cech z przyrostem informacji wiekszym niz prog odciecia
+    (None - wszystkie cechy) oraz wagi odleglosci tych cech
+    """
+    if not information_gain_as_weight:
+        # wagi rowne 1 dla wszystkich cech
+        best_gain_vars_arr = None
+        information_gain_arr = np.ones(len(information_gain), np.float32)
+    elif information_gain_threshold > 0.0:
+        # wybranie cech z przyrostem informacji wiekszym niz prog odciecia
+        best_gain_vars_arr = np.flatnonzero(information_gain > information_gain_threshold)
+        information_gain_arr = information_gain[best_gain_vars_arr]
+    else:
+        # cechy o zerowym przyroscie informacji maja zerowa wage
+        best_gain_vars_arr = None
+        information_gain_arr = np.maximum(information_gain, 0)
+    return (
+        best_gain_vars_arr,
+        np.ascontiguousarray(information_gain_arr, np.float32),
+    )
 
 
 class KNearestNeighbours:
     """
     Klasa klasyfikatora kNN
+
+    Sposob przeszukiwania probek uczacych (algorithm) przy klasyfikacji blokowej:
+        "brute" - odleglosci do wszystkich probek uczacych (mnozenie macierzy)
+        "kd_tree" - dokladny indeks przestrzenny budowany raz dla kazdej konfiguracji
+        "auto" - wybor na podstawie wymiaru wektora cech i ilosci probek uczacych
+        "ivf" - przyblizone przeszukiwanie ivf_probes_cnt z ivf_lists_cnt list probek
+                (IVFIndex), recall@k wzgledem dokladnego kNN liczony jest dla
+                recall_samples_cnt losowych probek testowych
+
+    max_block_bytes - maksymalny rozmiar bloku macierzy odleglosci (None - bez ograniczenia),
+    przeszukiwanie "brute" liczy odleglosci blokami probek testowych i uczacych
+
+    learn_features_dtype - sposob zapisu znormalizowanych cech probek uczacych ("float32",
+    "float16" lub "uint8", patrz quantize_features). Dla "float16" i "uint8" jest to jedyna
+    przechowywana macierz znormalizowanych cech probek uczacych (obok cech nieznormalizowanych),
+    a bloki probek zamieniane sa na float32 dopiero przy liczeniu odleglosci bloku.
+    compare_full_precision=True - przewidywania dla skwantyzowanych cech porownywane sa
+    z przewidywaniami pelnej precyzji dla wszystkich klasyfikowanych probek (podwaja czas
+    klasyfikacji), a roznica poprawnosci zapisywana jest przez logger
+
+    workers_cnt - ilosc procesow roboczych klasyfikacji blokowej (1 - bez procesow roboczych).
+    Macierze probek i kody etykiet umieszczane sa w pamieci wspoldzielonej, a bloki po
+    batch_size probek testowych rozdzielane miedzy procesy, wyniki skladane sa w kolejnosci blokow
     """
 
-    def __init__(self, learn_samples, test_samples, logger):
-        # przypisanie probek uczacych i testowych
-        self.learn_samples_dict = learn_samples
-        self.test_samples_dict = test_samples
+    def __init__(
+        self,
+        learn_samples,
+        test_samples,
+        logger,
+        algorithm="brute",
+        ivf_lists_cnt=None,
+        ivf_probes_cnt=8,
+        recall_samples_cnt=256,
+        max_block_bytes=None,
+        learn_features_dtype="float32",
+        compare_full_precision=True,
+        workers_cnt=1,
+        profiler=None,
+        information_gain=None,
+    ):
+        # przypisanie probek uczacych (FeatureStore lub slowniki probek)
+        self.learn_feature_store = as_feature_store(learn_samples)
         self.logger = logger
+        self.algorithm = algorithm
+        self.ivf_lists_cnt = ivf_lists_cnt
+        self.ivf_probes_cnt = ivf_probes_cnt
+        self.recall_samples_cnt = recall_samples_cnt
+        self.max_block_bytes = max_block_bytes
+        self.learn_features_dtype = learn_features_dtype
+        self.compare_full_precision = compare_full_precision
+        self.workers_cnt = workers_cnt
+        self.profiler = profiler
+
+        # obliczenie przyrostu informacji dla probek (jesli nie zostal podany)
+        if information_gain is None:
+            with profile_stage(
+                self.profiler,
+                "przyrost informacji",
+                items=len(self.learn_feature_store),
+            ):
+                information_gain = calculate_information_gains(
+                    self.learn_feature_store
+                )
+        self.information_gain = information_gain
+
+        # macierze cech oraz kody etykiet probek uczacych
+        self.normalization_coefficients = None
+        self._set_learn_arrays(self.learn_feature_store)
+
+        # macierze cech oraz etykiety probek testowych
+        self.set_test_samples(test_samples)
+
+        # indeksy i wagi cech dla kazdej konfiguracji przyrostu informacji
+        self._information_gain_columns_cache = {}
+
+        # indeksy przestrzenne probek uczacych dla kazdej konfiguracji
+        self._search_index_cache = {}
+
+        # parametry wyznaczania cech zapisanego modelu (load_model)
+        self.model_params = None
+
+        # statystyki zbioru uczacego do przyrostowych zmian probek uczacych
+        # (tworzone przy pierwszej zmianie lub przez init_learn_statistics)
+        self.learn_statistics = None
+
+    def set_test_samples(self, test_samples):
+        """
+        Metoda przypisujaca probki testowe (FeatureStore lub slowniki probek)
+        """
+        self.test_feature_store = as_feature_store(test_samples)
+        self.test_features_arr = self.test_feature_store.get_features()
+        self.test_normalized_features_arr = self.test_feature_store.get_features(
+            normalized=True
+        )
+        self.test_labels_arr = self.test_feature_store.labels_arr
+
+    def save_model(self, model_path, model_params=None):
+        """
+        Metoda zapisujaca model (macierze cech i znormalizowanych cech probek uczacych, kody
+        i nazwy etykiet, przyrost informacji, ustawienia klasyfikatora) wraz z parametrami
+        wyznaczania cech (model_params, np. ClipsHandler.get_model_params) do jednego pliku
+        """
+        model_params = dict(model_params or {})
+        if self.learn_statistics is not None:
+            # zakres normalizacji rozszerzony przez dodane probki uczace
+            model_params["min_mfcc_arr"] = self.learn_statistics.min_mfcc_arr
+            model_params["max_mfcc_arr"] = self.learn_statistics.max_mfcc_arr
+        arrays_dict = {
+            "learn_features_arr": self.learn_feature_store.get_features(),
+            "learn_label_codes_arr": self.learn_label_codes_arr.astype(np.int64),
+            "information_gain": np.asarray(self.information_gain),
+        }
+        if self.learn_normalized_features_arr is not None:
+            arrays_dict["learn_normalized_features_arr"] = (
+                self.get_full_precision_features()
+            )
+        arrays_dict.update(
+            {
+                f"model_params.{name}": value
+                for name, value in model_params.items()
+                if isinstance(value, np.ndarray)
+            }
+        )
+        save_model_artifact(
+            model_path,
+            arrays_dict,
+            {
+                "clip_names": self.learn_feature_store.clip_names_arr.tolist(),
+                "label_names": self.label_names_arr.tolist(),
+                "knn_params": {
+                    "algorithm": self.algorithm,
+                    "ivf_lists_cnt": self.ivf_lists_cnt,
+                    "ivf_probes_cnt": self.ivf_probes_cnt,
+                    "recall_samples_cnt": self.recall_samples_cnt,
+                    "max_block_bytes": self.max_block_bytes,
+                    "learn_features_dtype": self.learn_features_dtype,
+                    "compare_full_precision": self.compare_full_precision,
+                },
+                "model_params": {
+                    name: value
+                    for name, value in model_params.items()
+                    if not isinstance(value, np.ndarray)
+                },
+            },
+        )
+        self.logger.save_log(f"Zapisano model: {model_path}")
+
+    def init_learn_statistics(self, min_mfcc_arr=None, max_mfcc_arr=None):
+        """
+        Metoda tworzaca statystyki zbioru uczacego (LearnSetStatistics). Zakresem normalizacji
+        jest zakres probek uczacych rozszerzony o zakres, ktorym probki zostaly znormalizowane:
+        podany (np. ClipsHandler.min_mfcc_arr i max_mfcc_arr) lub zapisany w modelu.
+        Probki testowe nie wyznaczaja zakresu. Jesli zakres rozni sie od zakresu normalizacji
+        probek (lub nie jest on znany), probki uczace i testowe normalizowane sa ponownie
+        (kopie zbiorow - zbiory przekazane do klasyfikatora pozostaja bez zmian)
+        """
+        if min_mfcc_arr is None and self.model_params is not None:
+            min_mfcc_arr = self.model_params.get("min_mfcc_arr")
+            max_mfcc_arr = self.model_params.get("max_mfcc_arr")
+
+        learn_min_mfcc_arr, learn_max_mfcc_arr = self.learn_feature_store.get_min_max()
+        if min_mfcc_arr is None:
+            range_changed = True
+            min_mfcc_arr, max_mfcc_arr = learn_min_mfcc_arr, learn_max_mfcc_arr
+        else:
+            range_changed = bool(
+                np.any(learn_min_mfcc_arr < min_mfcc_arr)
+                or np.any(learn_max_mfcc_arr > max_mfcc_arr)
+            )
+            min_mfcc_arr = np.minimum(min_mfcc_arr, learn_min_mfcc_arr)
+            max_mfcc_arr = np.maximum(max_mfcc_arr, learn_max_mfcc_arr)
+
+        # zbior bez znormalizowanych cech (zapis skwantyzowany) normalizowany jest tym samym
+        # zakresem, zeby statystyki liczone byly z cech pelnej precyzji
+        learn_feature_store = self.learn_feature_store
+        if range_changed or learn_feature_store.normalized_features_arr is None:
+            learn_feature_store = learn_feature_store.copy()
+            learn_feature_store.normalize(min_mfcc_arr, max_mfcc_arr)
+        if range_changed:
+            if len(self.test_feature_store):
+                test_feature_store = self.test_feature_store.copy()
+                test_feature_store.normalize(min_mfcc_arr, max_mfcc_arr)
+                self.set_test_samples(test_feature_store)
+
+        self.learn_statistics = LearnSetStatistics.from_feature_store(
+            learn_feature_store, min_mfcc_arr, max_mfcc_arr
+        )
+        if range_changed:
+            self._set_learn_feature_store(
+                learn_feature_store,
+                quantize_features(
+                    learn_feature_store.get_features(normalized=True),
+                    self.learn_features_dtype,
+                ),
+            )
+
+    def add_learn_samples(self, learn_samples):
+        """
+        Metoda dodajaca probki uczace (FeatureStore lub slowniki probek; wektory cech
+        normalizowane sa biezacym zakresem normalizacji). Zakres normalizacji i przyrost informacji
+        aktualizowane sa przyrostowo - ponownie normalizowane (rowniez probki testowe) i zliczane
+        sa jedynie cechy, ktorych zakres rozszerzyly nowe probki. Normalizowane sa kopie zbiorow,
+        wiec zbiory przekazane przez wywolujacego pozostaja bez zmian
+        """
+        if self.learn_statistics is None:
+            self.init_learn_statistics()
+        new_feature_store = as_feature_store(learn_samples).copy()
+        if not len(new_feature_store):
+            return
+
+        # rozszerzenie zakresu normalizacji i normalizacja nowych probek
+        changed_columns_arr = self.learn_statistics.update_range(
+            new_feature_store.get_features()
+        )
+        min_mfcc_arr = self.learn_statistics.min_mfcc_arr
+        max_mfcc_arr = self.learn_statistics.max_mfcc_arr
+        new_feature_store.normalize(min_mfcc_arr, max_mfcc_arr)
 
-        # obliczenie przyrostu informacji dla probek
-        self.information_gain = calculate_information_gains(self.learn_samples_dict)
+        # dopisanie probek i ich licznosci (kody etykiet wspolnej tablicy nazw etykiet)
+        learn_feature_store = self.learn_feature_store.concatenate(new_feature_store)
+        self.learn_statistics.set_label_names(learn_feature_store.label_names_arr)
+        self.learn_statistics.add(
+            new_feature_store.get_features(normalized=True),
+            learn_feature_store.label_codes_arr[-len(new_feature_store) :],
+        )
+
+        # ponowna normalizacja i zliczenie cech o zmienionym zakresie
+        if len(changed_columns_arr):
+            self.logger.save_log(
+                f"Zmiana zakresu normalizacji {len(changed_columns_arr)} cech"
+            )
+            learn_feature_store.normalize(
+                min_mfcc_arr, max_mfcc_arr, columns_arr=changed_columns_arr
+            )
+            self.learn_statistics.reset_columns(
+                changed_columns_arr,
+                learn_feature_store.get_features(
+                    normalized=True, columns_arr=changed_columns_arr
+                ),
+                learn_feature_store.label_codes_arr,
+            )
+            if len(self.test_feature_store):
+                test_feature_store = self.test_feature_store.copy()
+                test_feature_store.normalize(
+                    min_mfcc_arr, max_mfcc_arr, columns_arr=changed_columns_arr
+                )
+                self.set_test_samples(test_feature_store)
+            learn_normalized_features_arr = quantize_features(
+                learn_feature_store.get_features(normalized=True),
+                self.learn_features_dtype,
+            )
+        elif self.learn_features_dtype == "float32":
+            learn_normalized_features_arr = learn_feature_store.get_features(
+                normalized=True
+            )
+        else:
+            learn_normalized_features_arr = np.concatenate(
+                [
+                    self.learn_normalized_features_arr,
+                    quantize_features(
+                        new_feature_store.get_features(normalized=True),
+                        self.learn_features_dtype,
+                    ),
+                ]
+            )
+
+        self._set_learn_feature_store(
+            learn_feature_store, learn_normalized_features_arr
+        )
+
+    def remove_learn_samples(self, clip_names_lst):
+        """
+        Metoda usuwajaca probki uczace o podanych nazwach nagran. Licznosci i przyrost informacji
+        aktualizowane sa przyrostowo, a zakres normalizacji pozostaje bez zmian
+        """
+        if self.learn_statistics is None:
+            self.init_learn_statistics()
+        removed_rows_arr = self.learn_feature_store.get_rows(clip_names_lst)
+        if not len(removed_rows_arr):
+            return
+
+        removed_feature_store = self.learn_feature_store.take(removed_rows_arr)
+        if removed_feature_store.normalized_features_arr is None:
+            removed_feature_store.normalize(
+                self.learn_statistics.min_mfcc_arr, self.learn_statistics.max_mfcc_arr
+            )
+        self.learn_statistics.remove(
+            removed_feature_store.get_features(normalized=True),
+            removed_feature_store.label_codes_arr,
+        )
+
+        kept_rows_arr = np.ones(len(self.learn_feature_store), bool)
+        kept_rows_arr[removed_rows_arr] = False
+        self._set_learn_feature_store(
+            self.learn_feature_store.take(kept_rows_arr),
+            self.learn_normalized_features_arr[kept_rows_arr],
+        )
+
+    def _set_learn_feature_store(
+        self, learn_feature_store, learn_normalized_features_arr
+    ):
+        """
+        Metoda przypisujaca zmieniony zbior probek uczacych, przyrost informacji ze statystyk
+        zbioru uczacego oraz uniewazniajaca zapamietane wagi cech i indeksy przestrzenne
+        """
+        # wspolczynniki normalizacji z zakresu statystyk zbioru uczacego
+        values_range_arr = (
+            self.learn_statistics.max_mfcc_arr - self.learn_statistics.min_mfcc_arr
+        )
+        scale_arr = np.divide(
+            1,
+            values_range_arr,
+            out=np.zeros(len(values_range_arr), np.float32),
+            where=values_range_arr > 0,
+        )
+        self._set_learn_arrays(
+            learn_feature_store,
+            learn_normalized_features_arr,
+            (scale_arr, -self.learn_statistics.min_mfcc_arr * scale_arr),
+        )
+        self.information_gain = self.learn_statistics.get_information_gains()
+        self._information_gain_columns_cache = {}
+        self._search_index_cache = {}
+
+    def _set_learn_arrays(
+        self,
+        learn_feature_store,
+        learn_normalized_features_arr=None,
+        normalization_coefficients=None,
+    ):
+        """
+        Metoda przypisujaca zbior probek uczacych, macierze ich cech i kody etykiet.
+        Znormalizowane cechy zapisywane sa w postaci learn_features_dtype (quantize_features).
+        Dla postaci innej niz float32 zbior probek przechowuje jedynie cechy nieznormalizowane,
+        a cechy znormalizowane pelnej precyzji odtwarzane sa z nich wspolczynnikami normalizacji
+        (podanymi lub wyznaczonymi przez get_normalization_coefficients)
+        """
+        if (
+            learn_normalized_features_arr is None
+            and learn_feature_store.normalized_features_arr is not None
+        ):
+            learn_normalized_features_arr = quantize_features(
+                learn_feature_store.get_features(normalized=True),
+                self.learn_features_dtype,
+            )
+        if self.learn_features_dtype != "float32":
+            if normalization_coefficients is None and (
+                learn_feature_store.normalized_features_arr is not None
+            ):
+                normalization_coefficients = get_normalization_coefficients(
+                    learn_feature_store.get_features(),
+                    learn_feature_store.get_features(normalized=True),
+                )
+            learn_feature_store = learn_feature_store.copy()
+            learn_feature_store.normalized_features_arr = None
+        if normalization_coefficients is not None:
+            self.normalization_coefficients = normalization_coefficients
+
+        self.learn_feature_store = learn_feature_store
+        self.learn_features_arr = learn_feature_store.get_features()
+        self.learn_normalized_features_arr = learn_normalized_features_arr
+        self.label_names_arr = learn_feature_store.label_names_arr
+        self.learn_label_codes_arr = learn_feature_store.label_codes_arr
+
+    def get_full_precision_features(self, columns_arr=None):
+        """
+        Metoda zwracajaca macierz znormalizowanych cech float32 probek uczacych ograniczona
+        do kolumn columns_arr. Przy zapisie skwantyzowanym macierz odtwarzana jest z cech
+        nieznormalizowanych (nowa macierz float32 na czas jej uzycia)
+        """
+        if self.learn_feature_store.normalized_features_arr is not None:
+            return self.learn_feature_store.get_features(
+                normalized=True, columns_arr=columns_arr
+            )
+        scale_arr, offset_arr = self.normalization_coefficients
+        if columns_arr is not None:
+            scale_arr, offset_arr = scale_arr[columns_arr], offset_arr[columns_arr]
+        features_arr = self.learn_feature_store.get_features(columns_arr=columns_arr)
+        return (features_arr * scale_arr + offset_arr).astype(np.float32)
+
+    @classmethod
+    def load_model(cls, model_path, logger, test_samples=None, **kwargs):
+        """
+        Metoda tworzaca klasyfikator z modelu zapisanego przez save_model bez ponownego
+        wyznaczania przyrostu informacji. Macierze probek uczacych sa mapowane w pamieci
+        (bez kopiowania), a ustawienia klasyfikatora z modelu moga byc zmienione przez kwargs.
+        Parametry wyznaczania cech modelu (wraz z nazwami nagran uczacych) zapisywane sa
+        w model_params
+        """
+        arrays_dict, metadata_dict = load_model_artifact(model_path)
+        learn_feature_store = FeatureStore(
+            metadata_dict["clip_names"],
+            arrays_dict["learn_label_codes_arr"],
+            metadata_dict["label_names"],
+            arrays_dict["learn_features_arr"],
+            arrays_dict.get("learn_normalized_features_arr"),
+        )
+        if test_samples is None:
+            test_samples = FeatureStore.from_lists(
+                [], [], [], features_cnt=learn_feature_store.features_cnt
+            )
+
+        knn_model = cls(
+            learn_feature_store,
+            test_samples,
+            logger,
+            information_gain=arrays_dict["information_gain"],
+            **{**metadata_dict["knn_params"], **kwargs},
+        )
+        knn_model.model_params = {
+            **metadata_dict["model_params"],
+            **{
+                name[len("model_params.") :]: arr
+                for name, arr in arrays_dict.items()
+                if name.startswith("model_params.")
+            },
+            "learn_clip_names": metadata_dict["clip_names"],
+        }
+        logger.save_log(
+            f"Wczytano model: {model_path} ({len(learn_feature_store)} probek uczacych)"
+        )
+        return knn_model
 
     @staticmethod
     def get_knn_label(
@@ -25,8 +570,9 @@ class KNearestNeighbours:
     ):
         """
         Metoda statyczna klasyfikacji probki testowej (test_sample) na podstawie ilosci (k_neighbours)
-        nablizszych probek uczacych (learn_samples) wartosci znormalizownych (jesli normalized=True)
-        oraz przyrsotu informacji (information_gain) jako wagi odleglosci
+        nablizszych probek uczacych (learn_samples - FeatureStore lub slownik probek) wartosci
+        znormalizownych (jesli normalized=True) oraz przyrsotu informacji (information_gain)
+        jako wagi odleglosci
         """
         # wybranie wektora znormalizowanego lub nie probki testowej
         test_point_mfcc = (
@@ -35,32 +581,42 @@ class KNearestNeighbours:
             else test_sample["normalized_feature"]
         )
 
+        learn_feature_store = as_feature_store(learn_samples)
+        learn_points_arr = learn_feature_store.get_features(normalized=normalized)
+        label_points = learn_feature_store.labels_arr.tolist()
+
+        return KNearestNeighbours.get_knn_label_from_arr(
+            test_point_mfcc,
+            learn_points_arr,
+            label_points,
+            k_neighbours,
+            information_gain=information_gain,
+        )
+
+    @staticmethod
+    def get_knn_label_from_arr(
+        test_point_mfcc,
+        learn_points_arr,
+        label_points,
+        k_neighbours,
+        information_gain=None,
+    ):
+        """
+        Metoda statyczna klasyfikacji wektora cech probki testowej (test_point_mfcc) na podstawie
+        macierzy cech probek uczacych (learn_points_arr) i ich etykiet (label_points)
+        """
         # utworzenie przyrostu informacji o wartosci 1 dla kazdej cechy jesli nie zostal on podany
         if information_gain is None:
             information_gain = np.zeros(test_point_mfcc.shape) + 1
 
-        distance_points = []
-        label_points = []
-        for learn_point in learn_samples.values():
-            # wybranie cech znormalizowanych lub nie probki uczacej
-            learn_point_mfcc = (
-                learn_point["feature"]
-                if not normalized
-                else learn_point["normalized_feature"]
-            )
-
-            # utworzenie listy wspolrzednych dla kazdej probki oraz ich etykiet
-            distance_points.append(learn_point_mfcc)
-            label_points.append(learn_point["label"])
-
         # obliczenie odleglosci dla kazdej probki uczacej od probki testowej
-        distance_points_arr = np.array(distance_points)
         distance_points_arr = np.sqrt(
             np.sum(
-                information_gain * ((distance_points_arr - test_point_mfcc) ** 2),
+                information_gain * ((learn_points_arr - test_point_mfcc) ** 2),
                 axis=1,
             )
         )
+        label_points = list(label_points)
 
         # wybranie k probek o najmniejszej odleglosci
         min_dists = []
@@ -103,58 +659,643 @@ class KNearestNeighbours:
                     min_label = label
             return min_label
 
-    def _get_all_points_labels(
+    @staticmethod
+    def get_nearest_neighbours(
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours,
+        information_gain=None,
+        exclude_idx_arr=None,
+        max_block_bytes=None,
+    ):
+        """
+        Metoda statyczna wyznaczajaca dla bloku probek testowych (test_points_arr) odleglosci i indeksy
+        (k_neighbours) najblizszych probek uczacych (learn_points_arr) z przyrostem informacji
+        (information_gain) jako waga odleglosci. Kwadraty odleglosci liczone sa w postaci
+        ||a||^2 + ||b||^2 - 2ab, czyli jednym mnozeniem macierzy dla calego bloku.
+        Dla max_block_bytes (None - bez ograniczenia) macierz odleglosci liczona jest blokami
+        zajmujacymi co najwyzej max_block_bytes, a k najlepszych sasiadow laczonych jest
+        z kolejnych blokow probek uczacych.
+        Dla kazdej probki testowej pomijana jest probka uczaca o indeksie z exclude_idx_arr (jesli podano).
+        Sasiedzi zwracani sa w kolejnosci rosnacej odleglosci (przy rownych odleglosciach - indeksu)
+        """
+        # utworzenie przyrostu informacji o wartosci 1 dla kazdej cechy jesli nie zostal on podany
+        if information_gain is None:
+            information_gain = np.ones(test_points_arr.shape[1], np.float32)
+        information_gain = np.asarray(information_gain, np.float32)
+
+        learn_samples_cnt = learn_points_arr.shape[0]
+        k_neighbours = min(
+            k_neighbours,
+            learn_samples_cnt - (1 if exclude_idx_arr is not None else 0),
+        )
+        # skwantyzowane probki uczace zamieniane sa na float32 blokami ograniczonej wielkosci
+        # rowniez bez ograniczenia rozmiaru bloku (bez kopii float32 calej macierzy)
+        if max_block_bytes is None and learn_points_arr.dtype in (np.uint8, np.float16):
+            max_block_bytes = QUANTIZED_MAX_BLOCK_BYTES
+        test_block_size, learn_block_size = get_block_sizes(
+            len(test_points_arr),
+            learn_samples_cnt,
+            k_neighbours,
+            max_block_bytes,
+            np.result_type(
+                dequantize_features(test_points_arr[:0]),
+                dequantize_features(learn_points_arr[:0]),
+            ).itemsize,
+        )
+
+        neighbours_dist_lst, neighbours_idx_lst = [], []
+        for test_start in range(0, len(test_points_arr), test_block_size):
+            test_block_arr = dequantize_features(
+                test_points_arr[test_start : test_start + test_block_size]
+            )
+            weighted_test_arr = test_block_arr * information_gain
+            test_sq_norms_arr = np.einsum("ij,ij->i", weighted_test_arr, test_block_arr)
+            exclude_block_arr = (
+                exclude_idx_arr[test_start : test_start + test_block_size]
+                if exclude_idx_arr is not None
+                else None
+            )
+
+            best_sq_dist_arr = np.empty((len(test_block_arr), 0), np.float32)
+            best_idx_arr = np.empty((len(test_block_arr), 0), np.intp)
+            for learn_start in range(0, learn_samples_cnt, learn_block_size):
+                learn_block_arr = dequantize_features(
+                    learn_points_arr[learn_start : learn_start + learn_block_size]
+                )
+
+                # obliczenie kwadratow wazonych odleglosci bloku probek
+                learn_sq_norms_arr = np.einsum(
+                    "ij,ij->i", learn_block_arr * information_gain, learn_block_arr
+                )
+                sq_distances_arr = weighted_test_arr @ learn_block_arr.T
+                sq_distances_arr *= -2
+                sq_distances_arr += test_sq_norms_arr[:, None]
+                sq_distances_arr += learn_sq_norms_arr[None, :]
+                np.maximum(sq_distances_arr, 0, out=sq_distances_arr)
+
+                # pominiecie wskazanych probek uczacych
+                if exclude_block_arr is not None:
+                    rows_arr = np.flatnonzero(
+                        (exclude_block_arr >= learn_start)
+                        & (exclude_block_arr < learn_start + len(learn_block_arr))
+                    )
+                    sq_distances_arr[
+                        rows_arr, exclude_block_arr[rows_arr] - learn_start
+                    ] = np.inf
+
+                # wybranie k probek o najmniejszej odleglosci bez pelnego sortowania
+                block_idx_arr = get_smallest_idx(
+                    sq_distances_arr, min(k_neighbours, len(learn_block_arr))
+                )
+                block_sq_dist_arr = np.take_along_axis(
+                    sq_distances_arr, block_idx_arr, axis=1
+                )
+
+                # polaczenie z najlepszymi sasiadami z poprzednich blokow
+                best_sq_dist_arr = np.concatenate(
+                    [best_sq_dist_arr, block_sq_dist_arr], axis=1
+                )
+                best_idx_arr = np.concatenate(
+                    [best_idx_arr, block_idx_arr + learn_start], axis=1
+                )
+
+                # posortowanie sasiadow wedlug odleglosci, a nastepnie indeksu
+                order_arr = np.lexsort((best_idx_arr, best_sq_dist_arr), axis=1)[
+                    :, :k_neighbours
+                ]
+                best_idx_arr = np.take_along_axis(best_idx_arr, order_arr, axis=1)
+                best_sq_dist_arr = np.take_along_axis(
+                    best_sq_dist_arr, order_arr, axis=1
+                )
+
+            neighbours_dist_lst.append(np.sqrt(best_sq_dist_arr))
+            neighbours_idx_lst.append(best_idx_arr)
+
+        return (
+            np.concatenate(neighbours_dist_lst, axis=0),
+            np.concatenate(neighbours_idx_lst, axis=0),
+        )
+
+    @staticmethod
+    def vote_labels(neighbours_dist_arr, neighbours_label_arr, labels_cnt):
+        """
+        Metoda statyczna glosowania sasiadow dla bloku probek. Wybierana jest etykieta o najwiekszej
+        licznosci, a przy remisie etykieta o najmniejszej sumie odleglosci (jak w get_knn_label).
+        Zwraca kody etykiet
+        """
+        # zliczenie etykiet i sum odleglosci sasiadow dla kazdej etykiety
+        one_hot_arr = neighbours_label_arr[:, :, None] == np.arange(labels_cnt)
+        label_counts_arr = one_hot_arr.sum(axis=1)
+        label_dist_sums_arr = (one_hot_arr * neighbours_dist_arr[:, :, None]).sum(axis=1)
+
+        # wybranie etykiety o najmniejszej sumie odleglosci sposrod etykiet o najwiekszej licznosci
+        candidates_arr = label_counts_arr == label_counts_arr.max(axis=1, keepdims=True)
+        return np.argmin(np.where(candidates_arr, label_dist_sums_arr, np.inf), axis=1)
+
+    @staticmethod
+    def vote_labels_multi_k(
+        neighbours_dist_arr, neighbours_label_arr, k_neighbours_lst, labels_cnt
+    ):
+        """
+        Metoda statyczna glosowania k pierwszych (najblizszych) sasiadow dla kazdej ilosci
+        sasiadow z k_neighbours_lst. Zwraca slownik {ilosc sasiadow: kody etykiet}
+        """
+        return {
+            k_neighbours: KNearestNeighbours.vote_labels(
+                neighbours_dist_arr[:, :k_neighbours],
+                neighbours_label_arr[:, :k_neighbours],
+                labels_cnt,
+            )
+            for k_neighbours in k_neighbours_lst
+        }
+
+    def get_neighbours_batch(
         self,
-        test_points,
-        k_neighbours=3,
-        normalized_mfcc=True,
-        information_gain_as_weight=True,
-        information_gain_threshold=0.000,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours,
+        information_gain=None,
+        search_index=None,
+        exclude_idx_arr=None,
     ):
         """
-        Metoda odpowiedzialna za wyznaczenie etykiet wszystkich probek
+        Metoda wyznaczajaca odleglosci i indeksy k najblizszych probek uczacych dla bloku probek
+        testowych na podstawie macierzy cech probek uczacych lub indeksu przestrzennego
+        (search_index) zbudowanego na tej macierzy, z pominieciem probek z exclude_idx_arr
         """
-        testing_steps = [
-            round(x / 10 * (len(test_points)) - 1) for x in range(1, 11)
-        ]
-        matched_checks = 0
+        if search_index is None:
+            return self.get_nearest_neighbours(
+                test_points_arr,
+                learn_points_arr,
+                k_neighbours,
+                information_gain,
+                exclude_idx_arr=exclude_idx_arr,
+                max_block_bytes=self.max_block_bytes,
+            )
+        test_points_arr = dequantize_features(test_points_arr)
+        return self.query_search_index(
+            search_index, test_points_arr, k_neighbours, exclude_idx_arr
+        )
 
-        # kopia probek testowych i uczacych
-        test_samples_dict = deepcopy(test_points)
-        learn_samples_dict = deepcopy(self.learn_samples_dict)
+    @staticmethod
+    def query_search_index(
+        search_index, test_points_arr, k_neighbours, exclude_idx_arr=None
+    ):
+        """
+        Metoda statyczna wyznaczajaca odleglosci i indeksy k najblizszych probek uczacych
+        dla bloku probek testowych w indeksie przestrzennym, z pominieciem probek z exclude_idx_arr
+        """
+        if exclude_idx_arr is None:
+            return search_index.query(test_points_arr, k_neighbours)
 
-        # wybranie cech z przyrostem informacji wiekszym niz prog odciecia
-        information_gain_best_lst = (
+        # wyszukanie jednego sasiada wiecej i usuniecie pominietej probki
+        # (lub najdalszego sasiada, jesli pominietej probki nie bylo wsrod sasiadow)
+        k_neighbours = min(k_neighbours, search_index.learn_samples_cnt - 1)
+        neighbours_dist_arr, neighbours_idx_arr = search_index.query(
+            test_points_arr, k_neighbours + 1
+        )
+        keep_arr = neighbours_idx_arr != exclude_idx_arr[:, None]
+        keep_arr[keep_arr.all(axis=1), -1] = False
+        return (
+            neighbours_dist_arr[keep_arr].reshape(-1, k_neighbours),
+            neighbours_idx_arr[keep_arr].reshape(-1, k_neighbours),
+        )
+
+    def get_knn_labels_batch(
+        self,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours,
+        information_gain=None,
+        search_index=None,
+        exclude_idx_arr=None,
+    ):
+        """
+        Metoda klasyfikacji bloku probek testowych na podstawie macierzy cech probek uczacych
+        (wiersze w kolejnosci learn_feature_store) lub indeksu przestrzennego (search_index)
+        zbudowanego na tej macierzy, z pominieciem probek z exclude_idx_arr. Zwraca etykiety probek
+        """
+        return self.get_knn_labels_batch_multi_k(
+            test_points_arr,
+            learn_points_arr,
+            [k_neighbours],
+            information_gain,
+            search_index=search_index,
+            exclude_idx_arr=exclude_idx_arr,
+        )[k_neighbours]
+
+    def get_knn_labels_batch_multi_k(
+        self,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours_lst,
+        information_gain=None,
+        search_index=None,
+        exclude_idx_arr=None,
+    ):
+        """
+        Metoda klasyfikacji bloku probek testowych dla kilku ilosci sasiadow jednym wyszukiwaniem
+        max(k_neighbours_lst) sasiadow. Sasiedzi posortowani sa wedlug odleglosci (a nastepnie
+        indeksu), wiec k pierwszych z nich to k najblizszych sasiadow.
+        Zwraca slownik {ilosc sasiadow: etykiety probek}
+        """
+        neighbours_dist_arr, neighbours_idx_arr = self.get_neighbours_batch(
+            test_points_arr,
+            learn_points_arr,
+            max(k_neighbours_lst),
+            information_gain,
+            search_index=search_index,
+            exclude_idx_arr=exclude_idx_arr,
+        )
+        label_codes_dict = self.vote_labels_multi_k(
+            neighbours_dist_arr,
+            self.learn_label_codes_arr[neighbours_idx_arr],
+            k_neighbours_lst,
+            len(self.label_names_arr),
+        )
+        return {
+            k_neighbours: self.label_names_arr[label_codes_arr]
+            for k_neighbours, label_codes_arr in label_codes_dict.items()
+        }
+
+    def get_information_gain_columns(
+        self, information_gain_as_weight=True, information_gain_threshold=0.000
+    ):
+        """
+        Metoda zwracajaca indeksy cech z przyrostem informacji wiekszym niz prog odciecia
+        (None - wszystkie cechy) oraz wagi odleglosci tych cech. Wynik zapamietywany jest
+        dla kazdej konfiguracji, wiec wybor cech nie kopiuje probek
+        """
+        key = (information_gain_as_weight, information_gain_threshold)
+        if key not in self._information_gain_columns_cache:
+            self._information_gain_columns_cache[key] = select_information_gain_columns(
+                self.information_gain,
+                information_gain_as_weight,
+                information_gain_threshold,
+            )
+
+        return self._information_gain_columns_cache[key]
+
+    def get_search_index(self, search_key, learn_points_arr, information_gain_arr):
+        """
+        Metoda zwracajaca indeks przestrzenny probek uczacych dla danej konfiguracji
+        (search_key) lub None, jesli probki maja byc przeszukiwane w calosci.
+        Indeks budowany jest raz dla kazdej konfiguracji
+        """
+        algorithm = self.algorithm
+        if algorithm == "auto":
+            algorithm = choose_search_algorithm(
+                learn_points_arr.shape[1], learn_points_arr.shape[0]
+            )
+        if algorithm == "brute":
+            return None
+        if algorithm not in ("kd_tree", "ivf"):
+            raise ValueError(f"Nieznany sposob przeszukiwania: {algorithm}")
+
+        if search_key not in self._search_index_cache:
+            if algorithm == "kd_tree":
+                self.logger.save_log("Budowanie KD-drzewa probek uczacych...")
+                self._search_index_cache[search_key] = KDTreeIndex(
+                    dequantize_features(learn_points_arr), information_gain_arr
+                )
+            else:
+                self.logger.save_log("Budowanie przyblizonego indeksu IVF...")
+                self._search_index_cache[search_key] = IVFIndex(
+                    dequantize_features(learn_points_arr),
+                    information_gain_arr,
+                    lists_cnt=self.ivf_lists_cnt,
+                    probes_cnt=self.ivf_probes_cnt,
+                )
+        return self._search_index_cache[search_key]
+
+    def _log_search_recall(
+        self,
+        test_points_arr,
+        test_labels_arr,
+        learn_points_arr,
+        k_neighbours,
+        information_gain_arr,
+        search_index,
+        full_learn_points_arr,
+    ):
+        """
+        Metoda zapisujaca recall@k przyblizonego przeszukiwania indeksem IVF wzgledem dokladnego
+        kNN w pelnej precyzji (full_learn_points_arr) oraz procent poprawnych przewidywan obu
+        metod dla losowych probek testowych
+        """
+        rng = np.random.default_rng(0)
+        sample_idx_arr = np.sort(
+            rng.choice(
+                len(test_points_arr),
+                min(self.recall_samples_cnt, len(test_points_arr)),
+                replace=False,
+            )
+        )
+        sample_points_arr = dequantize_features(test_points_arr[sample_idx_arr])
+
+        # wyznaczenie sasiadow przyblizonych i dokladnych
+        approx_dist_arr, approx_idx_arr = self.get_neighbours_batch(
+            sample_points_arr,
+            learn_points_arr,
+            k_neighbours,
+            information_gain_arr,
+            search_index=search_index,
+        )
+        exact_dist_arr, exact_idx_arr = self.get_nearest_neighbours(
+            sample_points_arr,
+            full_learn_points_arr,
+            k_neighbours,
+            information_gain_arr,
+            max_block_bytes=self.max_block_bytes,
+        )
+        recall = np.mean(
             [
-                (i, gain)
-                for i, gain in enumerate(self.information_gain)
-                if gain > information_gain_threshold
+                len(np.intersect1d(approx_row, exact_row)) / exact_idx_arr.shape[1]
+                for approx_row, exact_row in zip(approx_idx_arr, exact_idx_arr)
             ]
-            if information_gain_as_weight
-            else [(i, 1) for i in range(len(self.information_gain))]
         )
 
-        # wybranie cech dla kazdej probki spelniajacych przyrost informacji wiekszy niz prog odciecia
-        if information_gain_threshold > 0.0:
-            best_gain_vars_lst = [i for i, _ in information_gain_best_lst]
+        # porownanie poprawnosci przewidywan
+        matched_checks_lst = []
+        for neighbours_dist_arr, neighbours_idx_arr in (
+            (approx_dist_arr, approx_idx_arr),
+            (exact_dist_arr, exact_idx_arr),
+        ):
+            label_codes_arr = self.vote_labels(
+                neighbours_dist_arr,
+                self.learn_label_codes_arr[neighbours_idx_arr],
+                len(self.label_names_arr),
+            )
+            matched_checks_lst.append(
+                np.mean(
+                    self.label_names_arr[label_codes_arr]
+                    == test_labels_arr[sample_idx_arr]
+                )
+            )
 
-            for key in test_samples_dict.keys():
-                test_samples_dict[key]["feature"] = test_samples_dict[key]["feature"][
-                    best_gain_vars_lst
-                ]
-                test_samples_dict[key]["normalized_feature"] = test_samples_dict[key][
-                    "normalized_feature"
-                ][best_gain_vars_lst]
+        self.logger.save_log("")
+        self.logger.save_log(
+            f"Recall@{k_neighbours} wzgledem dokladnego kNN ({len(sample_idx_arr)} probek): {round(recall, 4)}"
+        )
+        self.logger.save_log(
+            f"Procent poprawnie przewidzianych etykiet dla tych probek: przyblizony {round(matched_checks_lst[0] * 100, 2)}% | dokladny {round(matched_checks_lst[1] * 100, 2)}%"
+        )
+        self.logger.save_log(
+            f"Roznica poprawnosci wzgledem dokladnego kNN: {round((matched_checks_lst[0] - matched_checks_lst[1]) * 100, 2)} pp"
+        )
 
-            for key in learn_samples_dict.keys():
-                learn_samples_dict[key]["feature"] = learn_samples_dict[key]["feature"][
-                    best_gain_vars_lst
-                ]
-                learn_samples_dict[key]["normalized_feature"] = learn_samples_dict[key][
-                    "normalized_feature"
-                ][best_gain_vars_lst]
+    def _log_quantization_accuracy(
+        self,
+        full_test_points_arr,
+        test_labels_arr,
+        full_learn_points_arr,
+        k_neighbours_lst,
+        information_gain_arr,
+        batch_size,
+        knn_labels_dict,
+        leave_one_out=False,
+    ):
+        """
+        Metoda zapisujaca dla kazdej ilosci sasiadow procent poprawnych przewidywan dla
+        skwantyzowanych cech probek uczacych (knn_labels_dict) i dla cech pelnej precyzji
+        (wszystkie klasyfikowane probki) oraz procent probek o roznych przewidywaniach
+        """
+        full_labels_dict = self._get_batch_labels(
+            full_test_points_arr,
+            full_learn_points_arr,
+            k_neighbours_lst,
+            information_gain_arr,
+            batch_size,
+            leave_one_out=leave_one_out,
+        )
+        self.logger.save_log("")
+        for k_neighbours in k_neighbours_lst:
+            knn_labels_arr = np.asarray(knn_labels_dict[k_neighbours])
+            full_labels_arr = np.asarray(full_labels_dict[k_neighbours])
+            quantized_matched = np.mean(knn_labels_arr == test_labels_arr) * 100
+            full_matched = np.mean(full_labels_arr == test_labels_arr) * 100
+            self.logger.save_log(
+                f"Cechy {self.learn_features_dtype} (k={k_neighbours}, {len(test_labels_arr)} probek): {round(quantized_matched, 2)}% | pelna precyzja {round(full_matched, 2)}% | roznica {round(quantized_matched - full_matched, 2)} pp | rozne przewidywania {round(np.mean(knn_labels_arr != full_labels_arr) * 100, 2)}%"
+            )
 
-        # generowanie wiadomosci sposobu testowania
+    def _get_single_labels(
+        self,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours,
+        information_gain_arr,
+        leave_one_out=False,
+    ):
+        """
+        Metoda wyznaczajaca etykiety probek testowych pojedynczo (get_knn_label_from_arr).
+        Dla leave_one_out=True probki testowe sa probkami uczacymi, a kazda z nich jest pomijana
+        przy wlasnej klasyfikacji
+        """
+        testing_steps = [
+            round(x / 10 * (len(test_points_arr)) - 1) for x in range(1, 11)
+        ]
+        test_points_arr = dequantize_features(test_points_arr)
+        learn_points_arr = dequantize_features(learn_points_arr)
+        label_points = self.label_names_arr[self.learn_label_codes_arr].tolist()
+
+        knn_labels_lst = []
+        for i, test_point_mfcc in enumerate(test_points_arr):
+            if i in testing_steps:
+                self.logger.save_log(
+                    f"Przetestowano {round(i / (len(test_points_arr) - 1) * 100)}% probek!",
+                    save_to_file=False,
+                )
+            # pominiecie klasyfikowanej probki wsrod probek uczacych
+            if leave_one_out:
+                act_learn_points_arr = np.delete(learn_points_arr, i, axis=0)
+                act_label_points = label_points[:i] + label_points[i + 1 :]
+            else:
+                act_learn_points_arr = learn_points_arr
+                act_label_points = label_points
+
+            knn_labels_lst.append(
+                self.get_knn_label_from_arr(
+                    test_point_mfcc,
+                    act_learn_points_arr,
+                    act_label_points,
+                    k_neighbours,
+                    information_gain=information_gain_arr,
+                )
+            )
+
+        return knn_labels_lst
+
+    def _get_batch_labels(
+        self,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours_lst,
+        information_gain_arr,
+        batch_size,
+        search_index=None,
+        leave_one_out=False,
+    ):
+        """
+        Metoda wyznaczajaca etykiety probek testowych blokami po batch_size probek dla kazdej
+        ilosci sasiadow z k_neighbours_lst (jedno wyszukiwanie sasiadow na blok).
+        Dla leave_one_out=True probki testowe sa probkami uczacymi, a w kazdym bloku macierzy
+        odleglosci pomijana jest przekatna (probka nie glosuje przy wlasnej klasyfikacji).
+        Zwraca slownik {ilosc sasiadow: lista etykiet}
+        """
+        if self.workers_cnt > 1:
+            return self._get_parallel_batch_labels(
+                test_points_arr,
+                learn_points_arr,
+                k_neighbours_lst,
+                information_gain_arr,
+                batch_size,
+                search_index=search_index,
+                leave_one_out=leave_one_out,
+            )
+
+        knn_labels_dict = {k_neighbours: [] for k_neighbours in k_neighbours_lst}
+        for start in range(0, len(test_points_arr), batch_size):
+            batch_points_arr = test_points_arr[start : start + batch_size]
+            with profile_stage(
+                self.profiler, "klasyfikacja bloku", items=len(batch_points_arr)
+            ):
+                batch_labels_dict = self.get_knn_labels_batch_multi_k(
+                    batch_points_arr,
+                    learn_points_arr,
+                    k_neighbours_lst,
+                    information_gain_arr,
+                    search_index=search_index,
+                    exclude_idx_arr=(
+                        np.arange(start, start + len(batch_points_arr))
+                        if leave_one_out
+                        else None
+                    ),
+                )
+            for k_neighbours, knn_labels_arr in batch_labels_dict.items():
+                knn_labels_dict[k_neighbours].extend(knn_labels_arr)
+            self.logger.save_log(
+                f"Przetestowano {round(min(start + batch_size, len(test_points_arr)) / len(test_points_arr) * 100)}% probek!",
+                save_to_file=False,
+            )
+
+        return knn_labels_dict
+
+    def _get_parallel_batch_labels(
+        self,
+        test_points_arr,
+        learn_points_arr,
+        k_neighbours_lst,
+        information_gain_arr,
+        batch_size,
+        search_index=None,
+        leave_one_out=False,
+    ):
+        """
+        Metoda wyznaczajaca etykiety probek testowych blokami po batch_size probek w workers_cnt
+        procesach roboczych. Macierze probek testowych, uczacych i kody etykiet umieszczane sa
+        w pamieci wspoldzielonej, a wyniki blokow skladane w ich kolejnosci (jak w _get_batch_labels).
+        Czasy klasyfikacji blokow mierzone sa w procesach roboczych i dolaczane do profilera.
+        Zwraca slownik {ilosc sasiadow: lista etykiet}
+        """
+        knn_labels_dict = {k_neighbours: [] for k_neighbours in k_neighbours_lst}
+        starts_lst = list(range(0, len(test_points_arr), batch_size))
+        chunk_func = (
+            _get_chunk_label_codes_profiled
+            if self.profiler is not None
+            else _get_chunk_label_codes
+        )
+
+        shm_lst = []
+        try:
+            arrays_specs_lst = []
+            for arr in (test_points_arr, learn_points_arr, self.learn_label_codes_arr):
+                shm, array_spec = create_shared_array(arr)
+                shm_lst.append(shm)
+                arrays_specs_lst.append(array_spec)
+
+            with ProcessPoolExecutor(
+                max_workers=self.workers_cnt,
+                initializer=_init_labels_worker,
+                initargs=(
+                    *arrays_specs_lst,
+                    len(self.label_names_arr),
+                    information_gain_arr,
+                    search_index,
+                    self.max_block_bytes,
+                    get_worker_threads_cnt(self.workers_cnt),
+                ),
+            ) as executor:
+                for i, chunk_result in enumerate(
+                    executor.map(
+                        chunk_func,
+                        starts_lst,
+                        [
+                            min(start + batch_size, len(test_points_arr))
+                            for start in starts_lst
+                        ],
+                        repeat(k_neighbours_lst),
+                        repeat(leave_one_out),
+                    ),
+                    1,
+                ):
+                    if self.profiler is not None:
+                        label_codes_dict, profile_data = chunk_result
+                        self.profiler.merge(profile_data)
+                    else:
+                        label_codes_dict = chunk_result
+                    for k_neighbours, label_codes_arr in label_codes_dict.items():
+                        knn_labels_dict[k_neighbours].extend(
+                            self.label_names_arr[label_codes_arr]
+                        )
+                    self.logger.save_log(
+                        f"Przetestowano {round(i / len(starts_lst) * 100)}% probek!",
+                        save_to_file=False,
+                    )
+        finally:
+            for shm in shm_lst:
+                shm.close()
+                shm.unlink()
+
+        return knn_labels_dict
+
+    def _get_learn_points(
+        self,
+        normalized_mfcc,
+        information_gain_as_weight,
+        information_gain_threshold,
+        full_precision=False,
+    ):
+        """
+        Metoda zwracajaca indeksy wybranych cech, ich wagi oraz macierz cech (znormalizowanych
+        lub nie) probek uczacych ograniczona do wybranych cech. full_precision=True - macierz
+        znormalizowanych cech float32 niezaleznie od learn_features_dtype
+        """
+        best_gain_vars_arr, information_gain_arr = self.get_information_gain_columns(
+            information_gain_as_weight, information_gain_threshold
+        )
+        if full_precision and normalized_mfcc:
+            return (
+                best_gain_vars_arr,
+                information_gain_arr,
+                self.get_full_precision_features(best_gain_vars_arr),
+            )
+        if normalized_mfcc:
+            learn_points_arr = self.learn_normalized_features_arr
+        else:
+            learn_points_arr = self.learn_features_arr
+        if best_gain_vars_arr is not None:
+            learn_points_arr = learn_points_arr[:, best_gain_vars_arr]
+
+        return best_gain_vars_arr, information_gain_arr, learn_points_arr
+
+    @staticmethod
+    def _get_testing_message(
+        normalized_mfcc, information_gain_as_weight, information_gain_threshold
+    ):
+        """
+        Metoda statyczna generujaca wiadomosc sposobu testowania
+        """
         message = f"Testowanie "
         message += "znormalizowanych " if normalized_mfcc else ""
         message += "probek testowych "
@@ -166,56 +1307,267 @@ class KNearestNeighbours:
                 else ""
             )
             message += "jako waga odleglosci" if information_gain_as_weight else ""
+        return message
+
+    def _get_all_points_labels(
+        self,
+        test_features_arr,
+        test_normalized_features_arr,
+        test_labels_arr,
+        k_neighbours_lst=(3,),
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.000,
+        batch_size=256,
+        leave_one_out=False,
+        learn_set=False,
+    ):
+        """
+        Metoda odpowiedzialna za wyznaczenie etykiet wszystkich probek dla kazdej ilosci sasiadow
+        z k_neighbours_lst. Probki klasyfikowane sa blokami po batch_size probek jednym
+        wyszukiwaniem max(k_neighbours_lst) sasiadow (batch_size=None - klasyfikacja pojedynczych
+        probek osobno dla kazdej ilosci sasiadow).
+        learn_set=True - klasyfikowane sa probki uczace, leave_one_out=True - dodatkowo
+        nie glosuja one przy wlasnej klasyfikacji.
+        Zwraca slownik {ilosc sasiadow: (wiadomosc, procent poprawnych, poprawne/wszystkie,
+        lista przewidzianych etykiet, tablica przewidywania etykiet)}
+        """
+        # wybranie cech z przyrostem informacji wiekszym niz prog odciecia
+        # oraz macierzy cech znormalizowanych lub nie probek uczacych
+        best_gain_vars_arr, information_gain_arr, learn_points_arr = (
+            self._get_learn_points(
+                normalized_mfcc, information_gain_as_weight, information_gain_threshold
+            )
+        )
+
+        # wybranie macierzy cech znormalizowanych lub nie probek testowych
+        test_points_arr = (
+            test_normalized_features_arr if normalized_mfcc else test_features_arr
+        )
+        if best_gain_vars_arr is not None:
+            test_points_arr = test_points_arr[:, best_gain_vars_arr]
 
+        # generowanie wiadomosci sposobu testowania
+        message = self._get_testing_message(
+            normalized_mfcc, information_gain_as_weight, information_gain_threshold
+        )
+        if leave_one_out:
+            message += " (z pominieciem klasyfikowanej probki)"
         self.logger.save_log("")
         self.logger.save_log(message)
 
-        # przewidywanie etykiet dla kazdej probki testowej
-        label_guesses_dict = {}
-        for i, test_point in enumerate(test_samples_dict.values()):
-            if i in testing_steps:
-                self.logger.save_log(
-                    f"Przetestowano {round(i / (len(test_points) - 1) * 100)}% probek!",
-                    save_to_file=False,
+        # przewidywanie etykiet probek testowych
+        k_neighbours_lst = sorted(set(k_neighbours_lst))
+        if batch_size:
+            with profile_stage(self.profiler, "indeks wyszukiwania"):
+                search_index = self.get_search_index(
+                    (
+                        normalized_mfcc,
+                        information_gain_as_weight,
+                        information_gain_threshold,
+                    ),
+                    learn_points_arr,
+                    information_gain_arr,
                 )
-            knn_label = self.get_knn_label(
-                test_point,
-                learn_samples_dict,
-                k_neighbours,
-                normalized=normalized_mfcc,
-                information_gain=[gain for _, gain in information_gain_best_lst],
+            with profile_stage(
+                self.profiler, "klasyfikacja", items=len(test_points_arr)
+            ):
+                knn_labels_dict = self._get_batch_labels(
+                    test_points_arr,
+                    learn_points_arr,
+                    k_neighbours_lst,
+                    information_gain_arr,
+                    batch_size,
+                    search_index=search_index,
+                    leave_one_out=leave_one_out,
+                )
+            quantized = normalized_mfcc and self.learn_features_dtype != "float32"
+            if isinstance(search_index, IVFIndex) and not leave_one_out:
+                self._log_search_recall(
+                    test_points_arr,
+                    test_labels_arr,
+                    learn_points_arr,
+                    k_neighbours_lst[-1],
+                    information_gain_arr,
+                    search_index,
+                    self.get_full_precision_features(best_gain_vars_arr),
+                )
+            if quantized and self.compare_full_precision:
+                with profile_stage(
+                    self.profiler,
+                    "porownanie z pelna precyzja",
+                    items=len(test_points_arr),
+                ):
+                    full_learn_points_arr = self.get_full_precision_features(
+                        best_gain_vars_arr
+                    )
+                    self._log_quantization_accuracy(
+                        full_learn_points_arr if learn_set else test_points_arr,
+                        test_labels_arr,
+                        full_learn_points_arr,
+                        k_neighbours_lst,
+                        information_gain_arr,
+                        batch_size,
+                        knn_labels_dict,
+                        leave_one_out=leave_one_out,
+                    )
+        else:
+            with profile_stage(
+                self.profiler,
+                "klasyfikacja",
+                items=len(test_points_arr) * len(k_neighbours_lst),
+            ):
+                knn_labels_dict = {
+                    k_neighbours: self._get_single_labels(
+                        test_points_arr,
+                        learn_points_arr,
+                        k_neighbours,
+                        information_gain_arr,
+                        leave_one_out=leave_one_out,
+                    )
+                    for k_neighbours in k_neighbours_lst
+                }
+
+        summaries_dict = {}
+        for k_neighbours in k_neighbours_lst:
+            if len(k_neighbours_lst) > 1:
+                self.logger.save_log("")
+                self.logger.save_log(f"Ilosc sasiadow: {k_neighbours}")
+            summaries_dict[k_neighbours] = self._summarize_labels(
+                message, test_labels_arr, knn_labels_dict[k_neighbours]
+            ) + (
+                knn_labels_dict[k_neighbours],
+                self._get_guesses_table(test_labels_arr, knn_labels_dict[k_neighbours]),
             )
+        return summaries_dict
 
-            # przypisanie rozlozenia przewidywania
-            if test_point["label"] not in label_guesses_dict:
-                label_guesses_dict[test_point["label"]] = {}
-            if knn_label + "_guess" not in label_guesses_dict[test_point["label"]]:
-                label_guesses_dict[test_point["label"]][knn_label + "_guess"] = 1
-            else:
-                label_guesses_dict[test_point["label"]][knn_label + "_guess"] += 1
+    @staticmethod
+    def _get_guesses_table(test_labels_arr, knn_labels_lst):
+        """
+        Metoda statyczna zwracajaca tablice przewidywania etykiet (kolumny - etykiety probek,
+        wiersze - przewidziane etykiety)
+        """
+        label_guesses_dict = {}
+        for (label, knn_label), cnt in Counter(
+            zip(test_labels_arr.tolist(), list(knn_labels_lst))
+        ).items():
+            label_guesses_dict.setdefault(label, {})[knn_label + "_guess"] = cnt
+        return pd.DataFrame(label_guesses_dict).fillna(0)
 
-            # sprawdzenie poprawnosci przewidywania etykiet
-            if knn_label == test_point["label"]:
-                matched_checks += 1
+    def _summarize_labels(self, message, test_labels_arr, knn_labels_lst):
+        """
+        Metoda zapisujaca tablice przewidywania etykiet oraz procent poprawnych przewidywan
+        """
+        # sprawdzenie poprawnosci przewidywania etykiet
+        matched_checks = int(np.sum(test_labels_arr == np.asarray(knn_labels_lst)))
+        points_cnt = len(test_labels_arr)
 
         # zapisywanie podsumowan
         self.logger.save_log("")
         self.logger.save_log(
             "Tablica przewidywania etykiet\n"
-            + pd.DataFrame(label_guesses_dict).fillna(0).to_string()
+            + self._get_guesses_table(test_labels_arr, knn_labels_lst).to_string()
         )
         self.logger.save_log("")
         self.logger.save_log(
-            f"Ilosc poprawnie przewidzianych etykiet: {matched_checks}/{len(test_points)}"
+            f"Ilosc poprawnie przewidzianych etykiet: {matched_checks}/{points_cnt}"
         )
         self.logger.save_log(
-            f"Procent poprawnie przewidzianych etykiet: {round(matched_checks / len(test_points) * 100, 2)}%"
+            f"Procent poprawnie przewidzianych etykiet: {round(matched_checks / points_cnt * 100, 2)}%"
         )
 
         return (
             message,
-            round(matched_checks / len(test_points) * 100, 2),
-            f"{matched_checks}/{len(test_points)}",
+            round(matched_checks / points_cnt * 100, 2),
+            f"{matched_checks}/{points_cnt}",
+        )
+
+    def iter_stream_points_labels(
+        self,
+        test_samples_iter,
+        k_neighbours=3,
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.000,
+    ):
+        """
+        Generator przewidujacy etykiety probek testowych naplywajacych paczkami (FeatureStore
+        lub slowniki probek). Kazda paczka klasyfikowana jest od razu po odebraniu,
+        a dla kazdej probki zwracana jest krotka (nazwa probki, etykieta, przewidziana etykieta)
+        """
+        best_gain_vars_arr, information_gain_arr, learn_points_arr = (
+            self._get_learn_points(
+                normalized_mfcc, information_gain_as_weight, information_gain_threshold
+            )
+        )
+        search_index = self.get_search_index(
+            (normalized_mfcc, information_gain_as_weight, information_gain_threshold),
+            learn_points_arr,
+            information_gain_arr,
+        )
+
+        for test_samples in test_samples_iter:
+            test_feature_store = as_feature_store(test_samples)
+            if not len(test_feature_store):
+                continue
+            test_points_arr = test_feature_store.get_features(
+                normalized=normalized_mfcc, columns_arr=best_gain_vars_arr
+            )
+
+            with profile_stage(
+                self.profiler, "klasyfikacja bloku", items=len(test_points_arr)
+            ):
+                knn_labels_arr = self.get_knn_labels_batch(
+                    test_points_arr,
+                    learn_points_arr,
+                    k_neighbours,
+                    information_gain_arr,
+                    search_index=search_index,
+                )
+            yield from zip(
+                test_feature_store.clip_names_arr.tolist(),
+                test_feature_store.labels_arr.tolist(),
+                knn_labels_arr.tolist(),
+            )
+
+    def get_stream_points_labels(
+        self,
+        test_samples_iter,
+        k_neighbours=3,
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.000,
+    ):
+        """
+        Metoda przewidujaca etykiety probek testowych naplywajacych paczkami (test_samples_iter).
+        Kazde przewidywanie zapisywane jest od razu, a na koncu zapisywane jest podsumowanie
+        """
+        message = self._get_testing_message(
+            normalized_mfcc, information_gain_as_weight, information_gain_threshold
+        )
+        self.logger.save_log("")
+        self.logger.save_log(message)
+
+        start_time = time.perf_counter()
+        test_labels_lst = []
+        knn_labels_lst = []
+        for clip_name, label, knn_label in self.iter_stream_points_labels(
+            test_samples_iter,
+            k_neighbours=k_neighbours,
+            normalized_mfcc=normalized_mfcc,
+            information_gain_as_weight=information_gain_as_weight,
+            information_gain_threshold=information_gain_threshold,
+        ):
+            if not test_labels_lst:
+                self.logger.save_log(
+                    f"Czas do pierwszego przewidywania: {round(time.perf_counter() - start_time, 3)}s"
+                )
+            self.logger.save_log(f"{clip_name}: {label} -> {knn_label}")
+            test_labels_lst.append(label)
+            knn_labels_lst.append(knn_label)
+
+        return self._summarize_labels(
+            message, np.array(test_labels_lst), knn_labels_lst
         )
 
     def get_all_test_points_labels(
@@ -224,16 +1576,45 @@ class KNearestNeighbours:
         normalized_mfcc=True,
         information_gain_as_weight=True,
         information_gain_threshold=0.000,
+        batch_size=256,
     ):
         """
         Metoda przewidujaca etykiety punktow testowych
         """
         return self._get_all_points_labels(
-            test_points=self.test_samples_dict,
-            k_neighbours=k_neighbours,
+            self.test_features_arr,
+            self.test_normalized_features_arr,
+            self.test_labels_arr,
+            k_neighbours_lst=[k_neighbours],
             normalized_mfcc=normalized_mfcc,
             information_gain_as_weight=information_gain_as_weight,
             information_gain_threshold=information_gain_threshold,
+            batch_size=batch_size,
+        )[k_neighbours][:3]
+
+    def get_all_test_points_labels_multi_k(
+        self,
+        k_neighbours_lst=(1, 2, 3, 4, 5),
+        normalized_mfcc=True,
+        information_gain_as_weight=True,
+        information_gain_threshold=0.000,
+        batch_size=256,
+    ):
+        """
+        Metoda przewidujaca etykiety punktow testowych dla kilku ilosci sasiadow jednym
+        wyszukiwaniem max(k_neighbours_lst) sasiadow. Zwraca slownik {ilosc sasiadow:
+        (wiadomosc, procent poprawnych, poprawne/wszystkie, lista przewidzianych etykiet,
+        tablica przewidywania etykiet)}
+        """
+        return self._get_all_points_labels(
+            self.test_features_arr,
+            self.test_normalized_features_arr,
+            self.test_labels_arr,
+            k_neighbours_lst=k_neighbours_lst,
+            normalized_mfcc=normalized_mfcc,
+            information_gain_as_weight=information_gain_as_weight,
+            information_gain_threshold=information_gain_threshold,
+            batch_size=batch_size,
         )
 
     def get_all_learn_points_labels(
@@ -242,17 +1623,26 @@ class KNearestNeighbours:
         normalized_mfcc=True,
         information_gain_as_weight=True,
         information_gain_threshold=0.000,
+        batch_size=256,
+        leave_one_out=False,
     ):
         """
-        Metoda przewidujaca etykiety punktow uczacych
+        Metoda przewidujaca etykiety punktow uczacych. Macierz odleglosci uczacy x uczacy
+        liczona jest blokami po batch_size wierszy, a dla leave_one_out=True pomijana jest
+        jej przekatna (kazda probka klasyfikowana jest bez swojego udzialu)
         """
         return self._get_all_points_labels(
-            test_points=self.learn_samples_dict,
-            k_neighbours=k_neighbours,
+            self.learn_features_arr,
+            self.learn_normalized_features_arr,
+            self.label_names_arr[self.learn_label_codes_arr],
+            k_neighbours_lst=[k_neighbours],
             normalized_mfcc=normalized_mfcc,
             information_gain_as_weight=information_gain_as_weight,
             information_gain_threshold=information_gain_threshold,
-        )
+            batch_size=batch_size,
+            leave_one_out=leave_one_out,
+            learn_set=True,
+        )[k_neighbours][:3]
 
     def get_all_points_labels(
         self,
@@ -260,6 +1650,8 @@ class KNearestNeighbours:
         normalized_mfcc=True,
         information_gain_as_weight=True,
         information_gain_threshold=0.000,
+        batch_size=256,
+        leave_one_out=False,
     ):
         """
         Metoda przewidujaca etykiety probek testowych oraz uczacych
@@ -271,6 +1663,8 @@ class KNearestNeighbours:
             normalized_mfcc=normalized_mfcc,
             information_gain_as_weight=information_gain_as_weight,
             information_gain_threshold=information_gain_threshold,
+            batch_size=batch_size,
+            leave_one_out=leave_one_out,
         )
 
         self.logger.save_log("")
@@ -280,4 +1674,5 @@ class KNearestNeighbours:
             normalized_mfcc=normalized_mfcc,
             information_gain_as_weight=information_gain_as_weight,
             information_gain_threshold=information_gain_threshold,
+            batch_size=batch_size,
         )
@@ -0,0 +1,99 @@
+import numpy as np
+from lib.utils import get_information_gains_from_histograms, get_label_histograms
+
+
+class LearnSetStatistics:
+    """
+    Statystyki zbioru uczacego aktualizowane przyrostowo: biezace wartosci minimalne i maksymalne
+    kazdej cechy (zakres normalizacji) oraz licznosci par (przedzial, etykieta) znormalizowanych
+    cech (get_label_histograms), z ktorych liczony jest przyrost informacji. Dodanie lub usuniecie
+    probek zmienia licznosci jedynie o probki zmiany, a zmiana zakresu cechy wymaga ponownego
+    zliczenia tylko tej cechy.
+    Zakres normalizacji jest jedynie rozszerzany - usuniecie probek go nie zaweza
+    """
+
+    def __init__(self, min_mfcc_arr, max_mfcc_arr, label_names_arr):
+        self.min_mfcc_arr = np.array(min_mfcc_arr, np.float32)
+        self.max_mfcc_arr = np.array(max_mfcc_arr, np.float32)
+        self.label_names_arr = np.asarray(label_names_arr)
+        self.label_histograms_arr = np.zeros(
+            (len(self.min_mfcc_arr), 100, len(self.label_names_arr)), np.int64
+        )
+        self.label_counts_arr = np.zeros(len(self.label_names_arr), np.int64)
+
+    @classmethod
+    def from_feature_store(cls, feature_store, min_mfcc_arr, max_mfcc_arr):
+        """
+        Metoda tworzaca statystyki znormalizowanego zbioru probek (FeatureStore)
+        dla zakresu normalizacji, ktorym zostal znormalizowany
+        """
+        learn_statistics = cls(min_mfcc_arr, max_mfcc_arr, feature_store.label_names_arr)
+        learn_statistics.add(
+            feature_store.get_features(normalized=True), feature_store.label_codes_arr
+        )
+        return learn_statistics
+
+    def update_range(self, features_arr):
+        """
+        Metoda rozszerzajaca zakres normalizacji o wektory cech features_arr.
+        Zwraca indeksy cech, ktorych zakres sie zmienil
+        """
+        if not len(features_arr):
+            return np.empty(0, np.intp)
+        min_mfcc_arr = np.minimum(self.min_mfcc_arr, features_arr.min(axis=0))
+        max_mfcc_arr = np.maximum(self.max_mfcc_arr, features_arr.max(axis=0))
+        changed_columns_arr = np.flatnonzero(
+            (min_mfcc_arr != self.min_mfcc_arr) | (max_mfcc_arr != self.max_mfcc_arr)
+        )
+        self.min_mfcc_arr, self.max_mfcc_arr = min_mfcc_arr, max_mfcc_arr
+        return changed_columns_arr
+
+    def set_label_names(self, label_names_arr):
+        """
+        Metoda przeliczajaca licznosci na nowa tablice nazw etykiet (zawierajaca dotychczasowe)
+        """
+        label_names_arr = np.asarray(label_names_arr)
+        if np.array_equal(label_names_arr, self.label_names_arr):
+            return
+        positions_arr = np.searchsorted(label_names_arr, self.label_names_arr)
+        label_histograms_arr = np.zeros(
+            self.label_histograms_arr.shape[:2] + (len(label_names_arr),), np.int64
+        )
+        label_histograms_arr[:, :, positions_arr] = self.label_histograms_arr
+        label_counts_arr = np.zeros(len(label_names_arr), np.int64)
+        label_counts_arr[positions_arr] = self.label_counts_arr
+        self.label_names_arr = label_names_arr
+        self.label_histograms_arr = label_histograms_arr
+        self.label_counts_arr = label_counts_arr
+
+    def add(self, normalized_features_arr, label_codes_arr, sign=1):
+        """
+        Metoda dodajaca (sign=1) lub odejmujaca (sign=-1) licznosci probek
+        """
+        labels_cnt = len(self.label_names_arr)
+        self.label_histograms_arr += sign * get_label_histograms(
+            normalized_features_arr, label_codes_arr, labels_cnt
+        )
+        self.label_counts_arr += sign * np.bincount(
+            label_codes_arr, minlength=labels_cnt
+        )
+
+    def remove(self, normalized_features_arr, label_codes_arr):
+        self.add(normalized_features_arr, label_codes_arr, sign=-1)
+
+    def reset_columns(self, columns_arr, normalized_features_arr, label_codes_arr):
+        """
+        Metoda zliczajaca od nowa licznosci wybranych cech (columns_arr) dla znormalizowanych
+        wektorow cech (tylko kolumny columns_arr) wszystkich probek
+        """
+        self.label_histograms_arr[columns_arr] = get_label_histograms(
+            normalized_features_arr, label_codes_arr, len(self.label_names_arr)
+        )
+
+    def get_information_gains(self):
+        """
+        Metoda zwracajaca przyrost informacji kazdej cechy
+        """
+        return get_information_gains_from_histograms(
+            self.label_histograms_arr, self.label_counts_arr
+        )
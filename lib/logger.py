@@ -1,14 +1,32 @@
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+import atexit
 import os
 import sys
+import time
 from datetime import datetime
 
 
 class Logger:
     """
-    Logger zapisujacy informacje do pliku tekstowego wiadomosci z dzialania programu
+    Logger zapisujacy informacje do pliku tekstowego wiadomosci z dzialania programu.
+
+    Dla buffered=True wiadomosci trafiaja do kolejki, z ktorej watek w tle zapisuje je paczkami
+    (co najwyzej batch_size wiadomosci) do stale otwartego pliku, oprozniajac bufor pliku co
+    flush_interval sekund. Pozostale wiadomosci zapisywane sa przy zakonczeniu programu (atexit).
+    Wyswietlanie w konsoli mozna wylaczyc (print_to_console=False) lub ograniczyc do jednej
+    wiadomosci na console_interval sekund (pozostale trafiaja tylko do pliku)
     """
 
-    def __init__(self, file_prefix="knn_log_file_"):
+    def __init__(
+        self,
+        file_prefix="knn_log_file_",
+        buffered=False,
+        print_to_console=True,
+        console_interval=0.0,
+        flush_interval=1.0,
+        batch_size=256,
+    ):
         if getattr(sys, 'frozen', False):
             file_path = sys.executable
         else:
@@ -20,8 +38,27 @@ class Logger:
             + [f"{file_prefix}{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"]
         )
         self.logger_file_path = logger_file_path
+        self.buffered = buffered
+        self.print_to_console = print_to_console
+        self.console_interval = console_interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._console_locker = Lock()
+        self._last_print_time = None
         print("Plik z logami: " + self.logger_file_path)
 
+        # kolejka wiadomosci i watek zapisujacy je do pliku (tryb buforowany); po zamknieciu
+        # kolejki (close) wiadomosci zapisywane sa bezposrednio do pliku
+        self._messages_queue = None
+        self._writer_thread = None
+        self._queue_locker = Lock()
+        self._closed = False
+        if buffered:
+            self._messages_queue = Queue()
+            self._writer_thread = Thread(target=self._write_messages, daemon=True)
+            self._writer_thread.start()
+            atexit.register(self.close)
+
     def save_log(self, message: str, save_to_file=True):
         """
         Funkja zapisujaca wiadomosci do pliku z logami oraz wyswietlajca je w konsoli
@@ -34,8 +71,115 @@ class Logger:
             if message
             else ""
         )
-        print(logger_message)
+        self._print_message(logger_message)
 
-        if save_to_file:
+        if not save_to_file:
+            return
+        with self._queue_locker:
+            queued = self._messages_queue is not None and not self._closed
+            if queued:
+                self._messages_queue.put(logger_message)
+        if not queued:
+            # wiadomosc po zamknieciu kolejki zapisywana jest po wiadomosciach z kolejki
+            if self._writer_thread is not None:
+                self._writer_thread.join()
             with open(self.logger_file_path, "a", encoding="utf-8") as f:
                 f.write(logger_message + "\n")
+
+    def _print_message(self, logger_message):
+        """
+        Metoda wyswietlajaca wiadomosc w konsoli (jesli wlaczono wyswietlanie i od ostatniej
+        wyswietlonej wiadomosci minelo co najmniej console_interval sekund)
+        """
+        if not self.print_to_console:
+            return
+        if self.console_interval > 0:
+            with self._console_locker:
+                now = time.monotonic()
+                if (
+                    self._last_print_time is not None
+                    and now - self._last_print_time < self.console_interval
+                ):
+                    return
+                self._last_print_time = now
+        print(logger_message)
+
+    def _write_messages(self):
+        """
+        Metoda watku zapisujacego wiadomosci z kolejki paczkami do pliku z logami.
+        Zdarzenie (Event) w kolejce oznacza zadanie oproznienia bufora pliku,
+        a wiadomosc None konczy prace watku
+        """
+        messages_queue = self._messages_queue
+        last_flush_time = time.monotonic()
+        with open(self.logger_file_path, "a", encoding="utf-8") as f:
+            stop = False
+            while not stop:
+                try:
+                    messages_lst = [messages_queue.get(timeout=self.flush_interval)]
+                except Empty:
+                    messages_lst = []
+                while messages_lst and len(messages_lst) < self.batch_size:
+                    try:
+                        messages_lst.append(messages_queue.get_nowait())
+                    except Empty:
+                        break
+
+                lines_lst = [
+                    message for message in messages_lst if isinstance(message, str)
+                ]
+                flush_events_lst = [
+                    message for message in messages_lst if isinstance(message, Event)
+                ]
+                stop = None in messages_lst
+                if lines_lst:
+                    f.write("\n".join(lines_lst) + "\n")
+                if (
+                    stop
+                    or flush_events_lst
+                    or time.monotonic() - last_flush_time >= self.flush_interval
+                ):
+                    f.flush()
+                    last_flush_time = time.monotonic()
+                for flush_event in flush_events_lst:
+                    flush_event.set()
+
+    def flush(self):
+        """
+        Metoda czekajaca na zapisanie do pliku wszystkich wiadomosci z kolejki
+        """
+        if self._messages_queue is None:
+            return
+        with self._queue_locker:
+            closed = self._closed
+            if not closed:
+                flush_event = Event()
+                self._messages_queue.put(flush_event)
+        if closed:
+            self._writer_thread.join()
+        else:
+            flush_event.wait()
+
+    def close(self):
+        """
+        Metoda zapisujaca pozostale wiadomosci i konczaca prace watku zapisujacego.
+        Kolejne wiadomosci zapisywane sa bezposrednio do pliku - flaga zamkniecia ustawiana
+        jest pod blokada przed dodaniem wiadomosci konczacej, wiec zadna wiadomosc nie trafia
+        do kolejki za nia
+        """
+        with self._queue_locker:
+            if self._messages_queue is None or self._closed:
+                return
+            self._closed = True
+            self._messages_queue.put(None)
+        self._writer_thread.join()
+        atexit.unregister(self.close)
+
+
+class SilentLogger:
+    """
+    Logger pomijajacy wszystkie wiadomosci (np. w procesach roboczych)
+    """
+
+    def save_log(self, message: str, save_to_file=True):
+        pass
@@ -0,0 +1,90 @@
+import json
+import os
+import struct
+import numpy as np
+
+# naglowek pliku: znacznik formatu, wersja formatu, dlugosc opisu JSON
+MODEL_MAGIC = b"KNNMODEL"
+MODEL_FORMAT_VERSION = 1
+_header_struct = struct.Struct("<8sIQ")
+
+# wyrownanie poczatku kazdej macierzy w pliku (w bajtach)
+_ARRAY_ALIGNMENT = 64
+
+
+def _get_aligned(offset):
+    return -(-offset // _ARRAY_ALIGNMENT) * _ARRAY_ALIGNMENT
+
+
+def save_model_artifact(model_path, arrays_dict, metadata_dict):
+    """
+    Funkcja zapisujaca model jako jeden plik: naglowek z wersja formatu, opis JSON (metadane oraz
+    typ, wymiary i polozenie kazdej macierzy) oraz wyrownane macierze w postaci surowej,
+    odczytywane bez kopiowania przez mapowanie pamieci (load_model_artifact).
+    Plik zapisywany jest przez plik tymczasowy
+    """
+    arrays_dict = {
+        name: np.ascontiguousarray(arr) for name, arr in arrays_dict.items()
+    }
+
+    # wyznaczenie polozenia macierzy wzgledem poczatku danych
+    arrays_spec_dict = {}
+    data_size = 0
+    for name, arr in arrays_dict.items():
+        data_size = _get_aligned(data_size)
+        arrays_spec_dict[name] = {
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "offset": data_size,
+        }
+        data_size += arr.nbytes
+
+    description_bytes = json.dumps(
+        {"metadata": metadata_dict, "arrays": arrays_spec_dict}
+    ).encode("utf-8")
+    data_start = _get_aligned(_header_struct.size + len(description_bytes))
+
+    tmp_model_path = model_path + ".tmp"
+    with open(tmp_model_path, "wb") as f:
+        f.write(
+            _header_struct.pack(MODEL_MAGIC, MODEL_FORMAT_VERSION, len(description_bytes))
+        )
+        f.write(description_bytes)
+        for name, arr in arrays_dict.items():
+            f.seek(data_start + arrays_spec_dict[name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + data_size)
+    os.replace(tmp_model_path, model_path)
+
+
+def load_model_artifact(model_path):
+    """
+    Funkcja odczytujaca model zapisany przez save_model_artifact. Macierze sa mapowane w pamieci
+    tylko do odczytu, wiec wiele procesow korzysta z tych samych stron pamieci.
+    Zwraca slownik macierzy oraz metadane
+    """
+    with open(model_path, "rb") as f:
+        magic, version, description_size = _header_struct.unpack(
+            f.read(_header_struct.size)
+        )
+        if magic != MODEL_MAGIC:
+            raise ValueError(f"Plik {model_path} nie jest zapisanym modelem")
+        if version != MODEL_FORMAT_VERSION:
+            raise ValueError(
+                f"Nieobslugiwana wersja modelu {version} (obslugiwana: {MODEL_FORMAT_VERSION})"
+            )
+        description_dict = json.loads(f.read(description_size).decode("utf-8"))
+
+    data_start = _get_aligned(_header_struct.size + description_size)
+    model_map = np.memmap(model_path, dtype=np.uint8, mode="r")
+    arrays_dict = {}
+    for name, array_spec in description_dict["arrays"].items():
+        dtype = np.dtype(array_spec["dtype"])
+        shape = tuple(array_spec["shape"])
+        start = data_start + array_spec["offset"]
+        arrays_dict[name] = (
+            model_map[start : start + dtype.itemsize * int(np.prod(shape))]
+            .view(dtype)
+            .reshape(shape)
+        )
+    return arrays_dict, description_dict["metadata"]
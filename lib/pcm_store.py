@@ -0,0 +1,221 @@
+import json
+import os
+import librosa
+import numpy as np
+
+# otwarte magazyny probek dzwieku w danym procesie {katalog: magazyn} - jeden magazyn
+# na katalog, usuwany po zamknieciu (PCMStore.close)
+_opened_stores_dict = {}
+
+
+def decode_clips(clip_path, clip_names_lst):
+    """
+    Funkcja dekodujaca paczke nagran (uruchamiana w procesie lub watku roboczym).
+    Zwraca liste krotek (nazwa nagrania, klucz nagrania w magazynie lub None, probki float32
+    lub None, czestotliwosc probkowania lub opis bledu). Klucz wyznaczany jest przed
+    dekodowaniem, wiec nagranie zmienione w trakcie dekodowania nie zostanie uznane za aktualne
+    """
+    decoded_clips_lst = []
+    for clip_name in clip_names_lst:
+        recording_path = os.path.join(clip_path, clip_name)
+        try:
+            key = PCMStore.get_key(recording_path)
+            recording, recording_sr = librosa.load(recording_path, sr=None)
+            decoded_clips_lst.append((clip_name, key, recording, recording_sr))
+        except Exception as e:
+            decoded_clips_lst.append(
+                (clip_name, None, None, f"{type(e).__name__}: {e}")
+            )
+    return decoded_clips_lst
+
+
+def open_pcm_store(store_dir):
+    """
+    Funkcja zwracajaca magazyn probek dzwieku otwarty raz w danym procesie
+    (po zmianie indeksu odczytywany jest ponownie tylko indeks)
+    """
+    pcm_store = _opened_stores_dict.get(store_dir)
+    if pcm_store is None:
+        pcm_store = _opened_stores_dict[store_dir] = PCMStore(store_dir)
+    else:
+        pcm_store.refresh()
+    return pcm_store
+
+
+class PCMStore:
+    """
+    Magazyn zdekodowanych nagran: probki wszystkich nagran zapisane sa jeden za drugim w jednym
+    pliku (float32 lub int16), a indeks (index.json) przechowuje dla kazdego nagrania przesuniecie,
+    dlugosc i czestotliwosc probkowania. Nagrania identyfikowane sa sciezka, rozmiarem i czasem
+    modyfikacji pliku zrodlowego, wiec zmienione nagranie dekodowane jest ponownie.
+    Plik odczytywany jest przez mapowanie pamieci, wiec odczyt nagrania zapisanego jako float32
+    nie kopiuje danych
+    """
+
+    INDEX_FILE_NAME = "index.json"
+    DATA_FILE_NAME = "pcm.bin"
+    # wersja formatu indeksu (indeks w innej wersji jest usuwany razem z plikiem probek,
+    # a nagrania dekodowane ponownie)
+    INDEX_VERSION = 2
+
+    def __init__(self, store_dir, dtype="float32"):
+        self.store_dir = store_dir
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.index_path = os.path.join(self.store_dir, self.INDEX_FILE_NAME)
+        self.data_path = os.path.join(self.store_dir, self.DATA_FILE_NAME)
+
+        self.dtype = np.dtype(dtype)
+        self.clips_dict = {}
+        self.samples_cnt = 0
+        self._index_mtime_ns = None
+        self._read_index()
+
+        self._data_arr = None
+
+    @staticmethod
+    def get_key(recording_path):
+        """
+        Metoda statyczna zwracajaca klucz nagrania: sciezka, rozmiar i czas modyfikacji pliku
+        """
+        recording_stat = os.stat(recording_path)
+        return "|".join(
+            str(item)
+            for item in (
+                os.path.abspath(recording_path),
+                recording_stat.st_size,
+                recording_stat.st_mtime_ns,
+            )
+        )
+
+    def _read_index(self):
+        """
+        Metoda odczytujaca indeks nagran oraz ilosc probek w pliku objetych indeksem
+        """
+        if os.path.exists(self.index_path):
+            self._index_mtime_ns = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index_dict = json.load(f)
+            if index_dict.get("version") == self.INDEX_VERSION:
+                self.dtype = np.dtype(index_dict["dtype"])
+                self.clips_dict = index_dict["clips"]
+            else:
+                self._discard_data()
+        self.samples_cnt = max(
+            (offset + length for offset, length, _ in self.clips_dict.values()),
+            default=0,
+        )
+
+    def _discard_data(self):
+        """
+        Metoda usuwajaca indeks w nieobslugiwanej wersji i obcinajaca plik probek - nagrania
+        objete starym indeksem nie sa juz osiagalne, wiec zajmowane przez nie miejsce jest
+        zwalniane
+        """
+        self._data_arr = None
+        self.clips_dict = {}
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            # indeks usuniety w miedzyczasie przez inny proces
+            pass
+        self._index_mtime_ns = None
+        if os.path.exists(self.data_path):
+            with open(self.data_path, "wb"):
+                pass
+
+    def refresh(self):
+        """
+        Metoda odczytujaca ponownie indeks, jesli zmienil sie od ostatniego odczytu
+        (nagrania dopisane przez inny obiekt magazynu lub inny proces)
+        """
+        if (
+            os.path.exists(self.index_path)
+            and os.stat(self.index_path).st_mtime_ns != self._index_mtime_ns
+        ):
+            self._read_index()
+
+    def close(self):
+        """
+        Metoda zamykajaca mapowanie pliku probek i usuwajaca magazyn z otwartych magazynow procesu
+        """
+        self._data_arr = None
+        if _opened_stores_dict.get(self.store_dir) is self:
+            del _opened_stores_dict[self.store_dir]
+
+    def _get_entry(self, recording_path):
+        """
+        Metoda zwracajaca wpis indeksu dla aktualnej wersji nagrania lub None
+        """
+        try:
+            return self.clips_dict.get(self.get_key(recording_path))
+        except OSError:
+            return None
+
+    def __contains__(self, recording_path):
+        return self._get_entry(recording_path) is not None
+
+    def _get_data_arr(self, samples_cnt):
+        """
+        Metoda zwracajaca zmapowany w pamieci plik probek (co najmniej samples_cnt probek)
+        """
+        if self._data_arr is None or len(self._data_arr) < samples_cnt:
+            self._data_arr = np.memmap(
+                self.data_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(max(samples_cnt, self.samples_cnt),),
+            )
+        return self._data_arr
+
+    def get_recording(self, recording_path):
+        """
+        Metoda zwracajaca probki nagrania (float32) oraz czestotliwosc probkowania lub
+        (None, None), jesli nagrania nie ma w magazynie albo zmienilo sie od zapisania
+        """
+        entry = self._get_entry(recording_path)
+        if entry is None:
+            return None, None
+        offset, length, recording_sr = entry
+        recording = self._get_data_arr(offset + length)[offset : offset + length]
+        if self.dtype == np.int16:
+            recording = recording.astype(np.float32) / 32768
+        return recording, recording_sr
+
+    def add_recordings(self, decoded_clips_lst):
+        """
+        Metoda dopisujaca zdekodowane nagrania (klucz nagrania - get_key, probki, czestotliwosc
+        probkowania) na koniec pliku probek i zapisujaca indeks
+        """
+        # uwzglednienie nagran dopisanych w miedzyczasie przez inny obiekt magazynu
+        self._read_index()
+
+        with open(self.data_path, "ab") as f:
+            # przesuniecia liczone od faktycznego konca pliku
+            self.samples_cnt = f.seek(0, os.SEEK_END) // self.dtype.itemsize
+            for key, recording, recording_sr in decoded_clips_lst:
+                if key in self.clips_dict:
+                    continue
+                if self.dtype == np.int16:
+                    recording = np.clip(np.round(recording * 32768), -32768, 32767)
+                recording = np.ascontiguousarray(recording, self.dtype)
+                f.write(recording.tobytes())
+                self.clips_dict[key] = [
+                    self.samples_cnt,
+                    len(recording),
+                    int(recording_sr),
+                ]
+                self.samples_cnt += len(recording)
+
+        # zapis indeksu przez plik tymczasowy
+        tmp_index_path = self.index_path + ".tmp"
+        with open(tmp_index_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.INDEX_VERSION,
+                    "dtype": self.dtype.name,
+                    "clips": self.clips_dict,
+                },
+                f,
+            )
+        os.replace(tmp_index_path, self.index_path)
+        self._index_mtime_ns = os.stat(self.index_path).st_mtime_ns
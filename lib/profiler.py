@@ -0,0 +1,143 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from threading import Lock, get_ident
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+
+class StageProfiler:
+    """
+    Profiler etapow przetwarzania: dla kazdego etapu zbierane sa czasy wykonania, ilosci
+    przetworzonych elementow (np. nagran, probek testowych) oraz zdarzenia w formacie Chrome trace.
+    Dane z watkow roboczych zapisywane sa bezposrednio (z blokada), a z procesow roboczych
+    przekazywane sa przez get_data i dolaczane metoda merge
+    """
+
+    def __init__(self):
+        self.locker = Lock()
+        self.durations_dict = defaultdict(list)
+        self.items_dict = defaultdict(int)
+        self.trace_events_lst = []
+
+    @contextmanager
+    def stage(self, name, items=0):
+        """
+        Kontekst mierzacy czas wykonania etapu name, ktory przetworzyl items elementow
+        """
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, start_ns, time.perf_counter_ns() - start_ns, items)
+
+    def add(self, name, start_ns, duration_ns, items=0):
+        """
+        Metoda zapisujaca czas wykonania etapu (w nanosekundach)
+        """
+        with self.locker:
+            self.durations_dict[name].append(duration_ns / 1e9)
+            self.items_dict[name] += items
+            self.trace_events_lst.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start_ns / 1000,
+                    "dur": duration_ns / 1000,
+                    "pid": os.getpid(),
+                    "tid": get_ident(),
+                }
+            )
+
+    def get_data(self):
+        """
+        Metoda zwracajaca zebrane dane (do przekazania z procesu roboczego)
+        """
+        with self.locker:
+            return {
+                "durations": dict(self.durations_dict),
+                "items": dict(self.items_dict),
+                "trace_events": list(self.trace_events_lst),
+            }
+
+    def merge(self, profile_data):
+        """
+        Metoda dolaczajaca dane zebrane w innym procesie lub watku (get_data)
+        """
+        with self.locker:
+            for name, durations_lst in profile_data["durations"].items():
+                self.durations_dict[name].extend(durations_lst)
+            for name, items in profile_data["items"].items():
+                self.items_dict[name] += items
+            self.trace_events_lst.extend(profile_data["trace_events"])
+
+    def get_summary_df(self):
+        """
+        Metoda zwracajaca tabele podsumowania etapow: ilosc wywolan, czas calkowity,
+        czasy p50/p95/max jednego wywolania oraz przepustowosc (elementy / s)
+        """
+        summary_dict = {}
+        with self.locker:
+            for name, durations_lst in self.durations_dict.items():
+                durations_arr = np.array(durations_lst)
+                total_time = durations_arr.sum()
+                items = self.items_dict[name]
+                summary_dict[name] = {
+                    "wywolania": len(durations_arr),
+                    "czas [s]": round(total_time, 4),
+                    "p50 [ms]": round(np.percentile(durations_arr, 50) * 1000, 3),
+                    "p95 [ms]": round(np.percentile(durations_arr, 95) * 1000, 3),
+                    "max [ms]": round(durations_arr.max() * 1000, 3),
+                    "elementy": items,
+                    "elementy/s": (
+                        round(items / total_time, 2) if items and total_time else ""
+                    ),
+                }
+        return pd.DataFrame.from_dict(summary_dict, orient="index")
+
+    def log_summary(self, logger):
+        """
+        Metoda zapisujaca tabele podsumowania etapow przez logger
+        """
+        logger.save_log("")
+        logger.save_log(
+            "Podsumowanie czasu etapow\n" + self.get_summary_df().to_string()
+        )
+
+    def save_json(self, output_path):
+        """
+        Metoda zapisujaca podsumowanie etapow oraz wszystkie czasy do pliku JSON
+        """
+        profile_data = self.get_data()
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "summary": self.get_summary_df().to_dict(orient="index"),
+                    "durations": profile_data["durations"],
+                    "items": profile_data["items"],
+                },
+                f,
+                indent=2,
+                default=float,
+            )
+
+    def save_chrome_trace(self, output_path):
+        """
+        Metoda zapisujaca zdarzenia w formacie Chrome trace (chrome://tracing, Perfetto)
+        """
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": self.get_data()["trace_events"]},
+                f,
+            )
+
+
+def profile_stage(profiler, name, items=0):
+    """
+    Funkcja zwracajaca kontekst pomiaru etapu lub pusty kontekst, jesli profiler nie zostal podany
+    """
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name, items)
@@ -0,0 +1,99 @@
+from datetime import datetime
+import hashlib
+import json
+import sqlite3
+import pandas as pd
+
+
+class ResultsStore:
+    """
+    Trwaly magazyn wynikow testow w bazie SQLite. Kazdy wynik zapisywany jest pod kluczem
+    wyznaczonym z parametrow testu (get_key), dzieki czemu przerwany przeglad parametrow
+    moze byc wznowiony z pominieciem zakonczonych testow
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path, timeout=30)
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    test_type TEXT,
+                    percent_guessed REAL,
+                    guesses TEXT,
+                    seconds REAL,
+                    finished_at TEXT
+                )
+                """
+            )
+
+    @staticmethod
+    def get_key(params_dict):
+        """
+        Metoda statyczna zwracajaca klucz wyniku dla slownika parametrow testu
+        """
+        return hashlib.sha1(
+            json.dumps(params_dict, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def get_finished_keys(self):
+        """
+        Metoda zwracajaca zbior kluczy zapisanych wynikow
+        """
+        return {key for (key,) in self.connection.execute("SELECT key FROM results")}
+
+    def add_results(self, results_lst):
+        """
+        Metoda zapisujaca w jednej transakcji liste wynikow
+        (parametry testu, rodzaj testu, procent poprawnych, poprawne/wszystkie, czas)
+        """
+        finished_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.get_key(params_dict),
+                        json.dumps(params_dict, sort_keys=True),
+                        test_type,
+                        percent_guessed,
+                        guesses,
+                        seconds,
+                        finished_at,
+                    )
+                    for params_dict, test_type, percent_guessed, guesses, seconds in results_lst
+                ],
+            )
+
+    def get_results_df(self, keys_lst=None):
+        """
+        Metoda zwracajaca tabele wynikow (parametry testu jako kolumny) dla kluczy keys_lst
+        (None - wszystkie wyniki)
+        """
+        rows_lst = self.connection.execute(
+            "SELECT key, params, test_type, percent_guessed, guesses, seconds, finished_at "
+            "FROM results ORDER BY rowid"
+        ).fetchall()
+        if keys_lst is not None:
+            keys_set = set(keys_lst)
+            rows_lst = [row for row in rows_lst if row[0] in keys_set]
+
+        return pd.DataFrame(
+            [
+                {
+                    **json.loads(params),
+                    "test_type": test_type,
+                    "percent_guessed": percent_guessed,
+                    "guesses": guesses,
+                    "seconds": seconds,
+                    "finished_at": finished_at,
+                }
+                for _, params, test_type, percent_guessed, guesses, seconds, finished_at in rows_lst
+            ]
+        )
+
+    def close(self):
+        self.connection.close()
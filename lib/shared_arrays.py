@@ -0,0 +1,24 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+
+def create_shared_array(arr):
+    """
+    Funkcja kopiujaca macierz do pamieci wspoldzielonej. Zwraca obiekt pamieci wspoldzielonej
+    (do zamkniecia i usuniecia przez tworzacego) oraz opis macierzy (nazwa, wymiary, typ)
+    potrzebny do jej otwarcia w innym procesie
+    """
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def attach_shared_array(array_spec):
+    """
+    Funkcja otwierajaca w procesie roboczym macierz z pamieci wspoldzielonej bez kopiowania.
+    Zwraca obiekt pamieci wspoldzielonej (musi istniec, dopoki uzywana jest macierz) oraz macierz
+    """
+    name, shape, dtype = array_spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
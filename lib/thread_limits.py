@@ -0,0 +1,29 @@
+from threadpoolctl import threadpool_limits
+import os
+
+# zmienne srodowiskowe ograniczajace watki bibliotek ladowanych pozniej w procesie roboczym
+THREADS_ENV_NAMES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+)
+
+
+def get_worker_threads_cnt(workers_cnt, cores_cnt=None):
+    """
+    Funkcja zwracajaca ilosc watkow BLAS/OpenMP jednego z workers_cnt procesow roboczych
+    (rownomierny podzial cores_cnt rdzeni procesora, domyslnie wszystkich, co najmniej 1 watek)
+    """
+    return max(1, (cores_cnt or os.cpu_count() or 1) // max(1, workers_cnt))
+
+
+def limit_worker_threads(threads_cnt=1):
+    """
+    Funkcja inicjalizujaca proces roboczy puli: ograniczenie watkow bibliotek BLAS/OpenMP
+    (numpy, scipy, librosa) do threads_cnt, zeby procesy robocze nie uruchamialy kazdy
+    tylu watkow, ile jest rdzeni procesora. Biblioteki juz zaladowane ograniczane sa przez
+    threadpoolctl, ladowane pozniej - przez zmienne srodowiskowe
+    """
+    for env_name in THREADS_ENV_NAMES:
+        os.environ[env_name] = str(threads_cnt)
+    threadpool_limits(threads_cnt)
@@ -7,10 +7,12 @@ class UserInput:
      podanych przez uzytkownika w konsoli programu
     """
 
-    def __init__(self, logger):
+    def __init__(self, logger, extraction_config=None):
         """
         Konstruktor klasy zbierający informacje od uzytkownika
         i podajacy je do zapisu do pliku monitorujacego.
+        Parametry ekstrakcji cech zapisanego modelu (extraction_config - ilosc cech MFCC,
+        dlugosc ramki w milisekundach, stopien przeplotu) nie sa pobierane od uzytkownika
         """
         logger.save_log("Pobieranie danych od uzytkownika")
 
@@ -72,6 +74,17 @@ class UserInput:
             except ValueError:
                 logger.save_log("Nie podales liczby! Sprobuj jeszcze raz!")
 
+        # parametry cech zapisanego modelu
+        if extraction_config is not None:
+            self.number_of_features, self.frame_duration_ms, self.hop_duration = (
+                extraction_config
+            )
+            logger.save_log(
+                f"Parametry cech z modelu: {self.number_of_features} cech MFCC, "
+                f"ramka {self.frame_duration_ms}ms, przeplot {self.hop_duration}%"
+            )
+            return
+
         # odczytanie ilosci cech wektora MFCC
         while True:
             try:
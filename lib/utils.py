@@ -1,22 +1,59 @@
 import numpy as np
-import pandas as pd
+from lib.feature_store import as_feature_store
 
 
-def get_min_max_mfcc_values(mfcc_clip_data_dict):
+def quantize_features(normalized_features_arr, dtype="float32"):
     """
-    Funkcja zwracajaca tablice numeryczne wartosci minimalnych i maksymalnych dla kazdej cechy wektora mfcc
+    Funkcja zapisujaca macierz znormalizowanych wektorow cech (wartosci 0-1) w zwartej postaci:
+        "float32" - bez zmian
+        "float16" - polowa pamieci
+        "uint8" - kwantyzacja skalarna do 256 poziomow (wartosc = kod / 255), cwierc pamieci
     """
-    all_data_combined = np.concatenate(
-        [
-            item["feature"].reshape(1, item["feature"].shape[0])
-            for item in mfcc_clip_data_dict.values()
-        ],
-        axis=0,
-    )
-    min_values_arr = np.min(all_data_combined, axis=0)
-    max_values_arr = np.max(all_data_combined, axis=0)
+    if dtype == "float32":
+        return normalized_features_arr
+    if dtype == "float16":
+        return normalized_features_arr.astype(np.float16)
+    if dtype == "uint8":
+        return np.round(np.clip(normalized_features_arr, 0, 1) * 255).astype(np.uint8)
+    raise ValueError(f"Nieznany sposob zapisu cech: {dtype}")
+
 
-    return min_values_arr, max_values_arr
+def dequantize_features(features_arr):
+    """
+    Funkcja odtwarzajaca macierz float32 z postaci zapisanej przez quantize_features
+    (macierze float32 i float64 zwracane sa bez zmian)
+    """
+    if features_arr.dtype == np.uint8:
+        return features_arr.astype(np.float32) / np.float32(255)
+    if features_arr.dtype == np.float16:
+        return features_arr.astype(np.float32)
+    return features_arr
+
+
+def get_normalization_coefficients(features_arr, normalized_features_arr):
+    """
+    Funkcja wyznaczajaca dla kazdej cechy skale i przesuniecie, ktorymi wektory cech zostaly
+    znormalizowane (wartosc znormalizowana = wartosc * skala + przesuniecie), z probek o najmniejszej
+    i najwiekszej wartosci cechy. Cechy o stalej wartosci maja skale 0
+    """
+    if not len(features_arr):
+        return (
+            np.zeros(features_arr.shape[1], np.float32),
+            np.zeros(features_arr.shape[1], np.float32),
+        )
+    columns_arr = np.arange(features_arr.shape[1])
+    min_idx_arr = features_arr.argmin(axis=0)
+    max_idx_arr = features_arr.argmax(axis=0)
+    min_values_arr = features_arr[min_idx_arr, columns_arr]
+    values_range_arr = features_arr[max_idx_arr, columns_arr] - min_values_arr
+    normalized_min_values_arr = normalized_features_arr[min_idx_arr, columns_arr]
+    scale_arr = np.divide(
+        normalized_features_arr[max_idx_arr, columns_arr] - normalized_min_values_arr,
+        values_range_arr,
+        out=np.zeros(len(columns_arr), np.float32),
+        where=values_range_arr > 0,
+    )
+    return scale_arr, normalized_min_values_arr - min_values_arr * scale_arr
 
 
 def map_label(label):
@@ -34,85 +71,157 @@ def map_label(label):
     return label_map_dict[label]
 
 
-def get_mfcc_dataframe(mfcc_dict):
-    """
-    funkcja tworzaca dataframe na podstawie slownika z wektorami mfcc
-    """
-    # dodanie etkiety pod postacia liczby dla kazdego pliku do wektora cech mfcc
-    normalized_mfcc_data = np.concatenate(
-        [
-            np.concat(
-                [
-                    item["normalized_feature"].reshape(
-                        1, item["normalized_feature"].shape[0]
-                    ),
-                    np.array(map_label(item["label"])).reshape(1, 1),
-                ],
-                axis=1,
-            )
-            for item in mfcc_dict.values()
-        ],
-        axis=0,
-    )
+def get_mfcc_bin_idx(normalized_mfcc_arr):
+    """
+    Funkcja zwracajaca indeksy przedzialow [x/10 - 0.1, x/10) dla x = 1..100 (indeks x - 1)
+    wartosci wektorow mfcc oraz maske wartosci nalezacych do ktoregos z przedzialow.
+    Przedzial wyznaczany jest wyszukiwaniem binarnym zamiast 100 masek warunkow
+    """
+    normalized_mfcc_arr = np.asarray(normalized_mfcc_arr, np.float64)
+    upper_bounds_arr = np.arange(1, 101) / 10
+    lower_bounds_arr = upper_bounds_arr - 0.1
 
-    # ustalenie przedzialow wartosci dla wektora mfcc
-    end_range = 101
-    conditions = [
-        np.logical_and(
-            normalized_mfcc_data >= (x / 10) - 0.1, normalized_mfcc_data < (x / 10)
-        )
-        for x in range(1, end_range, 1)
-    ]
-    values = [x for x in range(1, end_range, 1)]
+    # pierwszy przedzial, ktorego gorna granica jest wieksza od wartosci
+    # (dolne granice rosna, wiec tylko ten przedzial moze zawierac wartosc)
+    bin_idx_arr = np.searchsorted(upper_bounds_arr, normalized_mfcc_arr, side="right")
+    in_range_arr = bin_idx_arr < len(upper_bounds_arr)
+    bin_idx_arr = np.minimum(bin_idx_arr, len(upper_bounds_arr) - 1)
+    in_range_arr &= normalized_mfcc_arr >= lower_bounds_arr[bin_idx_arr]
 
-    # mapowanie wartosci wektora mfcc do odpowiedajacych im przedzialow
-    mapped_arr = np.select(conditions, values, default=normalized_mfcc_data)
+    return bin_idx_arr, in_range_arr
 
-    mfcc_df = pd.DataFrame(mapped_arr)
 
-    return mfcc_df
+def get_mfcc_bins(normalized_mfcc_arr):
+    """
+    Funkcja mapujaca wartosci wektorow mfcc do przedzialow [x/10 - 0.1, x/10) dla x = 1..100
+    (numer przedzialu x). Wartosci spoza przedzialow pozostaja bez zmian
+    """
+    normalized_mfcc_arr = np.asarray(normalized_mfcc_arr, np.float64)
+    bin_idx_arr, in_range_arr = get_mfcc_bin_idx(normalized_mfcc_arr)
+    return np.where(in_range_arr, bin_idx_arr + 1, normalized_mfcc_arr)
 
 
-def entropy(series):
+def get_sequential_sum(values_arr):
     """
-    Funkcja licząca entropię.
+    Funkcja sumujaca kolejne kolumny macierzy po kolei (jak wbudowana funkcja sum),
+    dzieki czemu wynik jest identyczny z sumowaniem w petli
     """
-    probabilities = series.value_counts(normalize=True)
-    return -sum(probabilities * np.log2(probabilities))
+    sum_arr = np.zeros(values_arr.shape[0])
+    for col in range(values_arr.shape[1]):
+        sum_arr += values_arr[:, col]
+    return sum_arr
 
 
-def information_gain(df, target_col, split_col):
+def get_entropies(counts_arr):
     """
-    Funkcja licząca przyrost informacji
+    Funkcja liczaca entropie dla kazdego wiersza macierzy licznosci etykiet
+    (skladniki sumowane w kolejnosci malejacej licznosci, jak w dawnej implementacji
+    opartej na pandas value_counts - wyniki identyczne co do bitu)
     """
+    counts_arr = -np.sort(-counts_arr, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        probabilities_arr = counts_arr / counts_arr.sum(axis=1, keepdims=True)
+        terms_arr = probabilities_arr * np.log2(probabilities_arr)
+    terms_arr[counts_arr == 0] = 0.0
+    return -get_sequential_sum(terms_arr)
 
-    # Oblicz entropię dla całej kolumny
-    total_entropy = entropy(df[target_col])
 
-    # podzial danych wedlug wybranej kolumny
-    grouped = df.groupby(split_col)
+def calculate_information_gains(mfcc_dict):
+    """
+    Funkcja liczaca zysk informacji kazdej cechy zbioru probek (FeatureStore lub slownik
+    probek). Wartosci cech mapowane sa do przedzialow (get_mfcc_bins), a licznosci par
+    (przedzial, etykieta) dla wszystkich cech liczone sa jednym wywolaniem np.bincount
+    na polaczonym indeksie
+    """
+    feature_store = as_feature_store(mfcc_dict)
+    mapped_arr = get_mfcc_bins(feature_store.normalized_features_arr)
+    samples_cnt, features_cnt = mapped_arr.shape
+
+    # kody etykiet (map_label sprawdza poprawnosc etykiet)
+    label_codes_arr = feature_store.label_codes_arr
+    for label in feature_store.label_names_arr:
+        map_label(label)
+    labels_cnt = len(feature_store.label_names_arr)
+
+    # entropia etykiet wszystkich probek
+    total_entropy = get_entropies(
+        np.bincount(label_codes_arr, minlength=labels_cnt)[None, :]
+    )[0]
+
+    # numery grup (cecha, wartosc) rosnaco wedlug cechy, a nastepnie wartosci
+    # (wartosci nieokreslone sa pomijane, jak w dawnym pandas groupby)
+    valid_arr = ~np.isnan(mapped_arr)
+    values_arr, value_codes_arr = np.unique(mapped_arr[valid_arr], return_inverse=True)
+    feature_idx_arr = np.broadcast_to(np.arange(features_cnt), mapped_arr.shape)[
+        valid_arr
+    ]
+    group_keys_arr, group_codes_arr = np.unique(
+        feature_idx_arr * len(values_arr) + value_codes_arr, return_inverse=True
+    )
+    groups_cnt = len(group_keys_arr)
+
+    # licznosci par (grupa, etykieta) dla wszystkich cech naraz
+    joint_counts_arr = np.bincount(
+        group_codes_arr * labels_cnt
+        + np.broadcast_to(label_codes_arr[:, None], mapped_arr.shape)[valid_arr],
+        minlength=groups_cnt * labels_cnt,
+    ).reshape(groups_cnt, labels_cnt)
+
+    # entropie grup wazone udzialem grupy w probkach
+    group_sizes_arr = joint_counts_arr.sum(axis=1)
+    weighted_entropies_arr = group_sizes_arr / samples_cnt * get_entropies(
+        joint_counts_arr
+    )
 
-    # obliczenie entropii uwzgledniajac podzial na grupy
-    group_entropy = sum(
-        (len(group) / len(df)) * entropy(group[target_col]) for _, group in grouped
+    # sumowanie entropii grup kazdej cechy w kolejnosci wartosci
+    group_features_arr = group_keys_arr // len(values_arr)
+    group_positions_arr = np.arange(groups_cnt) - np.searchsorted(
+        group_features_arr, group_features_arr
+    )
+    grouped_entropies_arr = np.zeros((features_cnt, group_positions_arr.max() + 1))
+    grouped_entropies_arr[group_features_arr, group_positions_arr] = (
+        weighted_entropies_arr
     )
 
-    # zwrocenie zysku informaci
-    return total_entropy - group_entropy
+    return (total_entropy - get_sequential_sum(grouped_entropies_arr)).astype(
+        np.float32
+    )
 
 
-def calculate_information_gains(mfcc_dict):
+def get_label_histograms(normalized_mfcc_arr, label_codes_arr, labels_cnt):
     """
-    Funkcja liczaca zysk informacji
+    Funkcja zliczajaca dla kazdej cechy probki w parach (przedzial get_mfcc_bins, etykieta).
+    Zwraca macierz licznosci o wymiarach (ilosc cech, 100 przedzialow, ilosc etykiet).
+    Wartosci spoza przedzialow (oraz wartosci nieokreslone) nie sa zliczane
     """
-    # utworzenie dataframe'u z wartosci wektorow mfcc
-    df = get_mfcc_dataframe(mfcc_dict)
+    samples_cnt, features_cnt = np.shape(normalized_mfcc_arr)
+    bin_idx_arr, in_range_arr = get_mfcc_bin_idx(normalized_mfcc_arr)
+    joint_idx_arr = (
+        np.arange(features_cnt) * 100 + bin_idx_arr
+    ) * labels_cnt + np.asarray(label_codes_arr)[:, None]
+    return np.bincount(
+        joint_idx_arr[in_range_arr], minlength=features_cnt * 100 * labels_cnt
+    ).reshape(features_cnt, 100, labels_cnt)
 
-    # wybranie wszsytkich kolumn oprocz kolumny opisujace klase
-    last_col = df.columns[-1]
 
-    # obliczenie zyskow dla kazdej kolumny
-    gains_lst = [(col, information_gain(df, last_col, col)) for col in df.columns[:-1]]
-    gains_lst.sort(key=lambda x: x[0])
+def get_information_gains_from_histograms(label_histograms_arr, label_counts_arr):
+    """
+    Funkcja liczaca zysk informacji kazdej cechy z licznosci par (przedzial, etykieta)
+    (get_label_histograms) oraz licznosci etykiet wszystkich probek. Czas obliczen nie zalezy
+    od ilosci probek, a wynik jest identyczny z calculate_information_gains, jesli wszystkie
+    wartosci cech naleza do przedzialow (np. cechy znormalizowane do zakresu 0-1)
+    """
+    features_cnt, bins_cnt, labels_cnt = label_histograms_arr.shape
+    samples_cnt = label_counts_arr.sum()
+    total_entropy = get_entropies(np.asarray(label_counts_arr)[None, :])[0]
+
+    # entropie przedzialow wazone udzialem przedzialu w probkach (puste przedzialy maja wage 0)
+    joint_counts_arr = label_histograms_arr.reshape(features_cnt * bins_cnt, labels_cnt)
+    weighted_entropies_arr = (
+        joint_counts_arr.sum(axis=1) / samples_cnt * get_entropies(joint_counts_arr)
+    )
 
-    return np.array([gain for _, gain in gains_lst], np.float32)
+    return (
+        total_entropy
+        - get_sequential_sum(weighted_entropies_arr.reshape(features_cnt, bins_cnt))
+    ).astype(np.float32)
@@ -2,33 +2,136 @@ from lib.logger import Logger
 from lib.user_input import UserInput
 from lib.clip_handler import ClipsHandler
 from lib.knn_threading import KNearestNeighbours
+from lib.profiler import StageProfiler
+import argparse
 import os
 
 
 class App:
-    def __init__(self):
-        self.logger = Logger()
-        self.user_input = UserInput(self.logger)
-        self.clip_handler = ClipsHandler(
+    def __init__(
+        self,
+        stream_test_samples=False,
+        profile=False,
+        buffered_log=False,
+        model_path=None,
+    ):
+        # buffered_log=True - wiadomosci zapisywane do pliku paczkami przez watek w tle
+        self.logger = Logger(buffered=buffered_log)
+
+        # profiler czasu etapow (profile=True) - podsumowanie zapisywane przez logger,
+        # a czasy i zdarzenia Chrome trace do plikow obok pliku z logami
+        self.profiler = StageProfiler() if profile else None
+
+        # model_path - plik modelu: jesli istnieje, probki uczace, normalizacja i przyrost
+        # informacji odczytywane sa z modelu (parametry cech nie sa pobierane od uzytkownika),
+        # w przeciwnym razie model zapisywany jest po uczeniu
+        if model_path is not None and os.path.exists(model_path):
+            self.knn_model = KNearestNeighbours.load_model(
+                model_path, self.logger, profiler=self.profiler
+            )
+            self.user_input = UserInput(
+                self.logger, self.knn_model.model_params["extraction_config"]
+            )
+            self.clip_handler = self._get_clip_handler(
+                stream_test_samples, model_params=self.knn_model.model_params
+            )
+            self.knn_model.set_test_samples(self.clip_handler.mfcc_test_feature_store)
+        else:
+            self.user_input = UserInput(self.logger)
+            self.clip_handler = self._get_clip_handler(stream_test_samples)
+            self.knn_model = KNearestNeighbours(
+                self.clip_handler.mfcc_learn_feature_store,
+                self.clip_handler.mfcc_test_feature_store,
+                self.logger,
+                profiler=self.profiler,
+            )
+            if model_path is not None:
+                self.knn_model.save_model(
+                    model_path, self.clip_handler.get_model_params()
+                )
+
+        if stream_test_samples:
+            # probki testowe klasyfikowane od razu po wyznaczeniu ich cech
+            self.logger.save_log("")
+            self.logger.save_log("TESTOWANIE PROBEK UCZACYCH")
+            self.knn_model.get_all_learn_points_labels(
+                k_neighbours=self.user_input.number_of_neighbours,
+                normalized_mfcc=True,
+                information_gain_as_weight=True,
+                information_gain_threshold=0.0,
+            )
+
+            self.logger.save_log("")
+            self.logger.save_log("TESTOWANIE PROBEK TESTOWYCH")
+            self.knn_model.get_stream_points_labels(
+                self.clip_handler.iter_test_mfcc(
+                    os.path.join(self.user_input.samples_path, "clips")
+                ),
+                k_neighbours=self.user_input.number_of_neighbours,
+                normalized_mfcc=True,
+                information_gain_as_weight=True,
+                information_gain_threshold=0.0,
+            )
+        else:
+            self.knn_model.get_all_points_labels(
+                k_neighbours=self.user_input.number_of_neighbours,
+                normalized_mfcc=True,
+                information_gain_as_weight=True,
+                information_gain_threshold=0.0,
+            )
+
+        if self.profiler is not None:
+            self.save_profile()
+
+    def _get_clip_handler(self, stream_test_samples, model_params=None):
+        return ClipsHandler(
             self.logger,
             self.user_input,
             os.path.join(self.user_input.samples_path, "validated.tsv"),
             os.path.join(self.user_input.samples_path, "clips"),
-        )
-        self.knn_model = KNearestNeighbours(
-            self.clip_handler.mfcc_learn_clip_data_dict,
-            self.clip_handler.mfcc_test_clip_data_dict,
-            self.logger,
+            stream_test_samples=stream_test_samples,
+            profiler=self.profiler,
+            model_params=model_params,
         )
 
-        self.knn_model.get_all_points_labels(
-            k_neighbours=self.user_input.number_of_neighbours,
-            normalized_mfcc=True,
-            information_gain_as_weight=True,
-            information_gain_threshold=0.0,
-        )
+    def save_profile(self):
+        """
+        Metoda zapisujaca podsumowanie czasu etapow przez logger oraz do plikow JSON
+        i Chrome trace (chrome://tracing, Perfetto)
+        """
+        self.profiler.log_summary(self.logger)
+        profile_path = os.path.splitext(self.logger.logger_file_path)[0]
+        self.profiler.save_json(profile_path + "_profile.json")
+        self.profiler.save_chrome_trace(profile_path + "_trace.json")
+        self.logger.save_log(f"Zapisano profil: {profile_path}_trace.json")
 
 
 if __name__ == "__main__":
-    app = App()
-    input("Wcisnij enter zeby zakonczyc...")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Klasyfikacja wieku mowcy metoda KNN")
+    parser.add_argument(
+        "--stream-test-samples",
+        action="store_true",
+        help="klasyfikacja probek testowych od razu po wyznaczeniu ich cech",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="pomiar czasu etapow przetwarzania"
+    )
+    parser.add_argument(
+        "--buffered-log",
+        action="store_true",
+        help="zapis wiadomosci do pliku paczkami przez watek w tle",
+    )
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="plik modelu (odczytywany, jesli istnieje, w przeciwnym razie zapisywany)",
+    )
+    args = parser.parse_args()
+
+    app = App(
+        stream_test_samples=args.stream_test_samples,
+        profile=args.profile,
+        buffered_log=args.buffered_log,
+        model_path=args.model,
+    )
+    input("Wcisnij enter zeby zakonczyc...")
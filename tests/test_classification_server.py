@@ -0,0 +1,58 @@
+from concurrent.futures import Future
+from threading import Thread
+import http.client
+import json
+import pytest
+from lib.classification_server import create_classification_server
+
+
+class ClassifierStub:
+    """
+    Klasyfikator zwracajacy stala etykiete dla kazdego nagrania
+    """
+
+    def submit(self, recording_path=None, recording=None, recording_sr=None):
+        future = Future()
+        future.set_result("twenties")
+        return future
+
+
+@pytest.fixture
+def server_address():
+    server = create_classification_server(ClassifierStub(), port=0)
+    server_thread = Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def post_classify(server_address, body):
+    connection = http.client.HTTPConnection(*server_address, timeout=10)
+    try:
+        connection.request(
+            "POST",
+            "/classify",
+            body=body,
+            headers={"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_classify_clip_path(server_address):
+    status, response_dict = post_classify(
+        server_address, json.dumps({"clip_path": "clip.mp3"})
+    )
+    assert status == 200
+    assert response_dict["labels"] == ["twenties"]
+    assert response_dict["errors"] == [None]
+
+
+@pytest.mark.parametrize("body", ["[1, 2]", '"clip.mp3"', "3", "null", "{", "{}"])
+def test_invalid_request_returns_400(server_address, body):
+    status, response_dict = post_classify(server_address, body)
+    assert status == 400
+    assert response_dict["error"].startswith("Niepoprawne zapytanie")
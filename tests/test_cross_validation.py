@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from lib.cross_validation import CrossValidator
+from lib.feature_store import FeatureStore
+
+LABEL_NAMES_LST = ["fifties", "fourties", "nineties", "teens", "thirties", "twenties"]
+
+
+class LoggerStub:
+    def save_log(self, message, save_to_file=True):
+        pass
+
+
+def get_feature_store(label_codes_arr, seed=0):
+    """
+    Funkcja tworzaca zbior probek z cechami zaleznymi od etykiety (+ szum)
+    """
+    rng = np.random.default_rng(seed)
+    base_codes_arr = np.arange(120) % len(LABEL_NAMES_LST)
+    features_arr = base_codes_arr[:, None] * 0.5 + rng.normal(size=(120, 12))
+    feature_store = FeatureStore(
+        np.array([f"clip_{idx}.mp3" for idx in range(120)], dtype=object),
+        label_codes_arr,
+        np.array(LABEL_NAMES_LST),
+        features_arr,
+    )
+    min_values_arr, max_values_arr = feature_store.get_min_max()
+    feature_store.normalize(min_values_arr, max_values_arr)
+    return feature_store
+
+
+@pytest.mark.parametrize(
+    "func_kwargs",
+    [
+        dict(normalized_mfcc=True, information_gain_as_weight=True),
+        dict(normalized_mfcc=False, information_gain_as_weight=True),
+        dict(normalized_mfcc=True, information_gain_as_weight=False),
+        dict(
+            normalized_mfcc=True,
+            information_gain_as_weight=True,
+            information_gain_threshold=0.05,
+        ),
+    ],
+)
+def test_test_labels_do_not_affect_predictions(func_kwargs):
+    label_codes_arr = np.arange(120) % len(LABEL_NAMES_LST)
+    cross_validator = CrossValidator(get_feature_store(label_codes_arr), LoggerStub())
+    test_idx_arr = cross_validator.get_stratified_folds(5)[0]
+
+    # zmiana etykiet probek testowych na inne (etykiety probek uczacych bez zmian)
+    changed_label_codes_arr = label_codes_arr.copy()
+    changed_label_codes_arr[test_idx_arr] = (
+        changed_label_codes_arr[test_idx_arr] + 1
+    ) % len(LABEL_NAMES_LST)
+    changed_cross_validator = CrossValidator(
+        get_feature_store(changed_label_codes_arr), LoggerStub()
+    )
+
+    np.testing.assert_array_equal(
+        cross_validator.get_split_information_gain(test_idx_arr),
+        changed_cross_validator.get_split_information_gain(test_idx_arr),
+    )
+    knn_labels_dict = cross_validator.predict_split(
+        test_idx_arr, range(1, 6), **func_kwargs
+    )
+    changed_knn_labels_dict = changed_cross_validator.predict_split(
+        test_idx_arr, range(1, 6), **func_kwargs
+    )
+    for k_neighbours in range(1, 6):
+        np.testing.assert_array_equal(
+            knn_labels_dict[k_neighbours], changed_knn_labels_dict[k_neighbours]
+        )